@@ -0,0 +1,94 @@
+"""
+Batch execution for the AI pipeline's ``/batch`` endpoints.
+
+Every item of a batch is validated and processed on its own, so one bad item
+is reported on its own line and never fails the rest of the batch. Models
+with a vectorized implementation process all valid items in one call; the
+others run item by item with bounded concurrency. Results are streamed back
+as NDJSON, one line per item as soon as it is done, tagged with the item's
+index in the request, followed by a summary line.
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+Process = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+# Returns one result per item, or the exception raised for that item
+ProcessMany = Callable[[List[Dict[str, Any]]], Awaitable[List[Any]]]
+
+
+class BatchModel:
+    """How the items of one endpoint's batch are validated and processed."""
+
+    def __init__(self, request_model: Type[BaseModel], process: Process,
+                 process_many: Optional[ProcessMany] = None):
+        self.request_model = request_model
+        self.process = process
+        self.process_many = process_many
+
+
+def error_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in error.errors()
+        )
+    return str(error) or type(error).__name__
+
+
+def result_line(index: int, result: Any) -> str:
+    if isinstance(result, Exception):
+        line = {"index": index, "status": "error", "error": error_message(result)}
+    else:
+        line = {"index": index, "status": "ok", "result": result}
+    return json.dumps(line, default=str) + "\n"
+
+
+async def stream_batch(model: BatchModel, items: List[Any], concurrency: int = 32) -> AsyncIterator[str]:
+    """Process a batch and yield one NDJSON line per item, then a summary line."""
+    counts = {"succeeded": 0, "failed": 0}
+
+    def finish(index: int, result: Any) -> str:
+        counts["failed" if isinstance(result, Exception) else "succeeded"] += 1
+        return result_line(index, result)
+
+    valid: List[Tuple[int, Dict[str, Any]]] = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            yield finish(index, TypeError("item must be an object"))
+            continue
+        try:
+            valid.append((index, model.request_model(**item).model_dump()))
+        except ValidationError as e:
+            yield finish(index, e)
+
+    if model.process_many is not None and valid:
+        try:
+            results = await model.process_many([data for _, data in valid])
+        except Exception as e:
+            results = [e] * len(valid)
+        for (index, _), result in zip(valid, results):
+            yield finish(index, result)
+    elif valid:
+        slots = asyncio.Semaphore(concurrency)
+
+        async def run(index: int, data: Dict[str, Any]) -> Tuple[int, Any]:
+            async with slots:
+                try:
+                    return index, await model.process(data)
+                except Exception as e:
+                    return index, e
+
+        tasks = [asyncio.ensure_future(run(index, data)) for index, data in valid]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, result = await next_done
+                yield finish(index, result)
+        finally:
+            # The client went away; do not keep computing results nobody reads
+            for task in tasks:
+                task.cancel()
+
+    yield json.dumps({"summary": {"total": len(items), **counts}}) + "\n"
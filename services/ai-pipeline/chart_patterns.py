@@ -0,0 +1,260 @@
+"""
+Chart pattern detection for the AI pipeline.
+
+A whole price series is scanned with NumPy in three steps:
+
+1. Rolling extrema: a bar is a candidate swing high (low) if its high (low)
+   is the extreme of the ``order`` bars on either side, found with sliding
+   windows over the series.
+2. Zig-zag: candidates are reduced to alternating pivots, keeping the more
+   extreme of consecutive same-side candidates and dropping swings smaller
+   than ``threshold``.
+3. Template matching: every run of consecutive pivots is compared at once
+   against the pattern templates (head and shoulders, double tops and
+   bottoms, triangles), and flags are matched from the pivots that end a
+   strong move and the bars after them.
+
+Every occurrence is reported with its bar positions, not only the latest.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+HIGH, LOW = 1, -1
+
+DEFAULT_ORDER = 5
+DEFAULT_TOLERANCE = 0.1  # Largest difference between "equal" levels, as a share of the pattern height
+FLAG_RETRACEMENT = 0.5  # Largest share of the pole a flag may give back
+
+
+def rolling_extrema(high: np.ndarray, low: np.ndarray, order: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices of bars whose high (low) is the extreme within `order` bars either side."""
+    window = 2 * order + 1
+    if len(high) < window:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    centre = np.arange(order, len(high) - order)
+    highs = centre[high[order:len(high) - order] >= sliding_window_view(high, window).max(axis=1)]
+    lows = centre[low[order:len(low) - order] <= sliding_window_view(low, window).min(axis=1)]
+    return highs, lows
+
+
+def default_threshold(high: np.ndarray, low: np.ndarray) -> float:
+    """Twice the median bar range, relative to price."""
+    if len(high) == 0:
+        return 0.0
+    return 2 * float(np.median((high - low) / np.maximum(low, 1e-12)))
+
+
+def zigzag(high: np.ndarray, low: np.ndarray, order: int = DEFAULT_ORDER,
+           threshold: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Alternating swing pivots as (bar indices, prices, HIGH/LOW kinds).
+
+    Without a threshold, swings must exceed twice the median bar range.
+    """
+    if threshold is None:
+        threshold = default_threshold(high, low)
+    high_idx, low_idx = rolling_extrema(high, low, order)
+    index = np.concatenate([high_idx, low_idx])
+    kind = np.concatenate([np.full(len(high_idx), HIGH), np.full(len(low_idx), LOW)])
+    price = np.concatenate([high[high_idx], low[low_idx]])
+    sort = np.lexsort((-kind, index))
+
+    pivots: List[List[float]] = []
+    for i, k, p in zip(index[sort].tolist(), kind[sort].tolist(), price[sort].tolist()):
+        if not pivots:
+            pivots.append([i, k, p])
+            continue
+        last = pivots[-1]
+        if k == last[1]:
+            # Same side again: keep the more extreme swing
+            if (p > last[2]) if k == HIGH else (p < last[2]):
+                last[0], last[2] = i, p
+        elif abs(p / last[2] - 1) >= threshold:
+            pivots.append([i, k, p])
+    if not pivots:
+        return np.array([], dtype=int), np.array([]), np.array([], dtype=int)
+    i, k, p = zip(*pivots)
+    return np.array(i, dtype=int), np.array(p, dtype=float), np.array(k, dtype=int)
+
+
+def _confidence(mismatch: np.ndarray, tolerance: float) -> np.ndarray:
+    return np.round(0.5 + 0.45 * np.clip(1 - mismatch / tolerance, 0, 1), 2)
+
+
+def _occurrences(name: str, direction: str, hits: np.ndarray, size: int, index: np.ndarray,
+                 confidence: np.ndarray, target: np.ndarray, stop: np.ndarray) -> List[Dict[str, Any]]:
+    return [
+        {
+            "pattern": name,
+            "direction": direction,
+            "start_index": int(index[start]),
+            "end_index": int(index[start + size - 1]),
+            "pivots": index[start:start + size].tolist(),
+            "confidence": float(confidence[start]),
+            "target_price": float(target[start]),
+            "stop_loss": float(stop[start]),
+        }
+        for start in np.flatnonzero(hits).tolist()
+    ]
+
+
+def _head_and_shoulders(index, price, kind, tolerance) -> List[Dict[str, Any]]:
+    if len(price) < 5:
+        return []
+    left, neck1, head, neck2, right = sliding_window_view(price, 5).T
+    first = kind[:len(left)]
+    neckline = (neck1 + neck2) / 2
+    height = np.abs(head - neckline)
+    # Level differences are measured against the height of the pattern; flat
+    # runs have none and never match
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shoulders = np.abs(left - right) / height
+        necks = np.abs(neck1 - neck2) / height
+    # The head must stand out from both shoulders
+    top = (first == HIGH) & (head - np.maximum(left, right) > tolerance * height)
+    bottom = (first == LOW) & (np.minimum(left, right) - head > tolerance * height)
+    matched = (height > 0) & (shoulders <= tolerance) & (necks <= 2 * tolerance)
+    confidence = _confidence(shoulders, tolerance)
+    return (
+        _occurrences("head_and_shoulders", "bearish", matched & top, 5, index, confidence,
+                     neckline - height, head)
+        + _occurrences("inverse_head_and_shoulders", "bullish", matched & bottom, 5, index, confidence,
+                       neckline + height, head)
+    )
+
+
+def _double_tops_bottoms(index, price, kind, tolerance) -> List[Dict[str, Any]]:
+    if len(price) < 3:
+        return []
+    first_peak, trough, second_peak = sliding_window_view(price, 3).T
+    first = kind[:len(first_peak)]
+    height = np.abs((first_peak + second_peak) / 2 - trough)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mismatch = np.abs(first_peak - second_peak) / height
+    matched = (height > 0) & (mismatch <= tolerance)
+    confidence = _confidence(mismatch, tolerance)
+    return (
+        _occurrences("double_top", "bearish", matched & (first == HIGH), 3, index, confidence,
+                     trough - height, np.maximum(first_peak, second_peak))
+        + _occurrences("double_bottom", "bullish", matched & (first == LOW), 3, index, confidence,
+                       trough + height, np.minimum(first_peak, second_peak))
+    )
+
+
+def _triangles(index, price, kind, tolerance) -> List[Dict[str, Any]]:
+    if len(price) < 5:
+        return []
+    p = sliding_window_view(price, 5)
+    starts_high = kind[:len(p)] == HIGH
+    # Three pivots on the starting side, two on the other (last one repeated)
+    outer, inner = p[:, [0, 2, 4]], p[:, [1, 3, 3]]
+    highs = np.where(starts_high[:, None], outer, inner)
+    lows = np.where(starts_high[:, None], inner, outer)
+    height = highs[:, 0] - lows[:, 0]
+
+    # Flat within the tolerance, or converging by more than it, relative to the opening height
+    flat_top = highs.max(axis=1) - highs.min(axis=1) <= tolerance * height
+    flat_bottom = lows.max(axis=1) - lows.min(axis=1) <= tolerance * height
+    falling_top = (np.diff(highs, axis=1) <= 0).all(axis=1) & (highs[:, 0] - highs[:, 2] > tolerance * height)
+    rising_bottom = (np.diff(lows, axis=1) >= 0).all(axis=1) & (lows[:, 2] - lows[:, 0] > tolerance * height)
+    confidence = np.full(len(p), 0.7)
+    return (
+        _occurrences("ascending_triangle", "bullish", flat_top & rising_bottom, 5, index, confidence,
+                     highs.max(axis=1) + height, lows[:, 2])
+        + _occurrences("descending_triangle", "bearish", falling_top & flat_bottom, 5, index, confidence,
+                       lows.min(axis=1) - height, highs[:, 2])
+        + _occurrences("symmetrical_triangle", "neutral", falling_top & rising_bottom, 5, index, confidence,
+                       np.where(starts_high, lows[:, 2] - height, highs[:, 2] + height),
+                       np.where(starts_high, highs[:, 2], lows[:, 2]))
+    )
+
+
+def _flags(close, index, price, threshold, flag_bars) -> List[Dict[str, Any]]:
+    """A strong move (pole) between two pivots, then a shallow channel against it."""
+    if len(price) < 2 or len(close) <= flag_bars:
+        return []
+    move = price[1:] / price[:-1] - 1
+    end = index[1:]
+    # Poles at least three swing thresholds long and no longer than the flag,
+    # with room for the flag after them
+    candidates = np.flatnonzero(
+        (np.abs(move) >= 3 * threshold) & (np.diff(index) <= flag_bars) & (end + flag_bars < len(close))
+    )
+    if len(candidates) == 0:
+        return []
+    windows = sliding_window_view(close, flag_bars)[end[candidates] + 1]
+    pole_start, pole_end = price[candidates], price[candidates + 1]
+    pole = pole_end - pole_start
+    # Least-squares slope of each flag window
+    x = np.arange(flag_bars) - (flag_bars - 1) / 2
+    slope = windows @ x / (x @ x)
+    bull = pole > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        retrace = np.where(bull, pole_end - windows.min(axis=1), windows.max(axis=1) - pole_end) / np.abs(pole)
+    against = np.where(bull, slope <= 0, slope >= 0)
+    matched = (pole != 0) & against & (retrace <= FLAG_RETRACEMENT)
+
+    occurrences = []
+    for hit in np.flatnonzero(matched).tolist():
+        position = candidates[hit]
+        flag_end = int(end[position] + flag_bars)
+        breakout = float(windows[hit, -1])
+        occurrences.append({
+            "pattern": "bull_flag" if bull[hit] else "bear_flag",
+            "direction": "bullish" if bull[hit] else "bearish",
+            "start_index": int(index[position]),
+            "end_index": flag_end,
+            "pivots": [int(index[position]), int(end[position])],
+            "confidence": float(np.round(0.5 + 0.45 * (1 - retrace[hit] / FLAG_RETRACEMENT), 2)),
+            "target_price": breakout + float(pole[hit]),
+            "stop_loss": float(windows[hit].min() if bull[hit] else windows[hit].max()),
+        })
+    return occurrences
+
+
+def detect_patterns(high: np.ndarray, low: np.ndarray, close: np.ndarray, order: int = DEFAULT_ORDER,
+                    threshold: Optional[float] = None, tolerance: float = DEFAULT_TOLERANCE,
+                    flag_bars: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Every pattern occurrence in the series, ordered by where it ends."""
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    if order < 1:
+        raise ValueError("order must be at least 1")
+    if tolerance <= 0 or (threshold is not None and threshold <= 0):
+        raise ValueError("threshold and tolerance must be positive")
+    # Swings are measured relative to price
+    if not (np.isfinite(low).all() and np.isfinite(high).all() and np.isfinite(close).all()) or \
+            (len(low) and low.min() <= 0):
+        raise ValueError("Prices must be positive and finite")
+    if threshold is None:
+        threshold = default_threshold(high, low)
+    index, price, kind = zigzag(high, low, order, threshold)
+
+    patterns = (
+        _head_and_shoulders(index, price, kind, tolerance)
+        + _double_tops_bottoms(index, price, kind, tolerance)
+        + _triangles(index, price, kind, tolerance)
+        + _flags(close, index, price, threshold, flag_bars or 2 * order)
+    )
+    patterns.sort(key=lambda pattern: (pattern["end_index"], pattern["start_index"]))
+    return patterns
+
+
+def series_arrays(price_data: List[Dict[str, float]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """High, low and close arrays from OHLC bars; bars without high/low use the close."""
+    close = np.array([bar["close"] for bar in price_data], dtype=float)
+    high = np.array([bar.get("high", bar["close"]) for bar in price_data], dtype=float)
+    low = np.array([bar.get("low", bar["close"]) for bar in price_data], dtype=float)
+    return high, low, close
+
+
+def scan_symbols(series: Dict[str, Dict[str, List[float]]], **params) -> Dict[str, List[Dict[str, Any]]]:
+    """Patterns for many symbols, each given as columns of high, low and close."""
+    results = {}
+    for symbol, columns in series.items():
+        close = columns["close"]
+        results[symbol] = detect_patterns(columns.get("high", close), columns.get("low", close), close, **params)
+    return results
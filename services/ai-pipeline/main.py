@@ -5,16 +5,26 @@ Handles AI-powered trading insights, strategy analysis, and market predictions.
 
 from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import uvicorn
 import os
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 import json
 import asyncio
-from pydantic import BaseModel
+import numpy as np
+from pydantic import BaseModel, Field
 import openai
 from dotenv import load_dotenv
 
+from batch_runner import BatchModel, stream_batch
+from chart_patterns import detect_patterns, scan_symbols, series_arrays
+from market_analytics import (DEFAULT_MA_PERIOD, PREDICTION_HORIZON, evaluate_strategy, grid_search,
+                              portfolio_insights, predict, price_array)
+from portfolio_optimizer import CovarianceCache, optimize
+from result_cache import ResultCache
+from sentiment_lexicon import NEWS_LEXICON, SOCIAL_LEXICON, sentiment_score
+
 # Load environment variables
 load_dotenv()
 
@@ -32,6 +42,9 @@ except ImportError:
     OPENAI_AVAILABLE = False
     print("OpenAI library not available. Some AI features will be limited.")
 
+# Covariance estimates shared by portfolio optimizations, per asset universe and window
+covariance_cache = CovarianceCache(int(os.getenv("AI_COVARIANCE_CACHE_SIZE", "128")))
+
 app = FastAPI(
     title="DoleSe Wonderland FX - AI Pipeline Service",
     description="AI-powered trading insights and analysis",
@@ -77,12 +90,18 @@ class AutomatedStrategyRequest(BaseModel):
     investment_amount: float
     preferred_assets: List[str]
     trading_style: str  # 'scalping', 'day_trading', 'swing_trading', 'position_trading'
+    historical_data: Optional[List[Dict[str, Any]]] = None  # Bars to backtest the strategy on
 
 class PortfolioOptimizationRequest(BaseModel):
     user_id: int
     current_portfolio: List[Dict[str, Any]]
     target_allocation: Optional[Dict[str, float]] = None
     risk_free_rate: float = 0.02
+    return_history: Dict[str, List[float]]  # Periodic returns per symbol, over the same window
+    objective: str = "max_sharpe"  # 'max_sharpe', 'min_variance', 'risk_parity'
+    periods_per_year: int = 252
+    min_weight: float = 0.0
+    max_weight: float = 1.0
 
 class SentimentAnalysisRequest(BaseModel):
     symbol: str
@@ -93,6 +112,16 @@ class PatternRecognitionRequest(BaseModel):
     symbol: str
     price_data: List[Dict[str, float]]
     timeframe: str
+    order: Optional[int] = Field(default=None, ge=1)  # Bars either side a swing must dominate (default 5)
+    threshold: Optional[float] = Field(default=None, gt=0)  # Smallest swing, relative to price (default: 2x median bar range)
+    tolerance: Optional[float] = Field(default=None, gt=0)  # Largest gap between "equal" levels, share of pattern height (default 0.1)
+
+class PatternScanRequest(BaseModel):
+    timeframe: str
+    series: Dict[str, Dict[str, List[float]]]  # symbol -> {"high": [...], "low": [...], "close": [...]}
+    order: Optional[int] = Field(default=None, ge=1)
+    threshold: Optional[float] = Field(default=None, gt=0)
+    tolerance: Optional[float] = Field(default=None, gt=0)
 
 class BacktestOptimizationRequest(BaseModel):
     strategy_config: Dict[str, Any]
@@ -100,81 +129,75 @@ class BacktestOptimizationRequest(BaseModel):
     optimization_params: Dict[str, List[Any]]
     fitness_function: str  # 'sharpe_ratio', 'max_drawdown', 'total_return'
 
-# Mock AI functions (replace with actual AI/ML models)
+class BatchRequest(BaseModel):
+    items: List[Any]  # Request bodies of the single-item endpoint, validated one by one
+
+# AI model functions
 async def analyze_strategy(strategy_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Analyze trading strategy using AI."""
-    await asyncio.sleep(1)  # Simulate processing time
+    """Backtest a trading strategy's parameters on its history and score the result."""
+    prices = price_array(strategy_data["historical_data"])
+    evaluation = evaluate_strategy(prices, strategy_data.get("parameters"))
 
-    # Mock analysis result
     return {
         "strategy_id": strategy_data["strategy_id"],
-        "performance_score": 0.85,
-        "risk_level": "medium",
-        "recommendations": [
-            "Consider adjusting stop loss to 2% of entry price",
-            "Strategy performs better in trending markets",
-            "Reduce position size during high volatility periods"
-        ],
-        "confidence": 0.78,
+        **evaluation,
         "analyzed_at": datetime.utcnow().isoformat()
     }
 
 async def predict_market(market_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate market predictions using AI."""
-    await asyncio.sleep(1.5)  # Simulate processing time
+    """Predict market direction from the recent trend and the requested indicators."""
+    prices = price_array(market_data["historical_data"])
+    prediction = predict(prices, market_data["indicators"])
 
-    # Mock prediction result
     return {
         "symbol": market_data["symbol"],
         "timeframe": market_data["timeframe"],
-        "prediction": "bullish",
-        "confidence": 0.72,
-        "price_target": 1.0850,
-        "time_horizon": "24h",
-        "key_factors": [
-            "Strong support at current levels",
-            "Positive economic data expected",
-            "Technical indicators showing bullish divergence"
-        ],
+        **prediction,
+        "time_horizon": f"{PREDICTION_HORIZON} x {market_data['timeframe']}",
         "predicted_at": datetime.utcnow().isoformat()
     }
 
 async def generate_insights(user_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate personalized trading insights."""
-    await asyncio.sleep(1)  # Simulate processing time
-
-    # Mock insights
+    """Generate trading insights from a user's open positions and market conditions."""
     return {
         "user_id": user_data["user_id"],
-        "insights": [
-            {
-                "type": "opportunity",
-                "title": "EUR/USD Long Opportunity",
-                "description": "Based on your trading history, consider a long position in EUR/USD",
-                "confidence": 0.8,
-                "action_required": "Monitor support levels"
-            },
-            {
-                "type": "warning",
-                "title": "Portfolio Diversification",
-                "description": "Your portfolio is heavily weighted in EUR pairs",
-                "confidence": 0.9,
-                "action_required": "Consider adding GBP or JPY pairs"
-            }
-        ],
+        "insights": portfolio_insights(user_data["portfolio_data"], user_data["market_conditions"]),
         "generated_at": datetime.utcnow().isoformat()
     }
 
 async def assess_risk(risk_data: Dict[str, Any]) -> Dict[str, Any]:
     """Assess trading risk using AI."""
-    await asyncio.sleep(0.5)  # Simulate processing time
-
     # Calculate risk metrics
     position_size_pct = risk_data["position_size"] / 10000  # Assuming $10k account
     risk_reward_ratio = risk_data["take_profit"] / risk_data["stop_loss"]
 
     risk_score = min(1.0, (position_size_pct * 2) + (risk_data["market_volatility"] * 0.3))
 
+    return risk_result(risk_data, risk_score, position_size_pct, risk_reward_ratio)
+
+async def assess_risk_many(items: List[Dict[str, Any]]) -> List[Any]:
+    """Assess the risk of many positions in one vectorized pass."""
+    position_size = np.array([item["position_size"] for item in items], dtype=float)
+    stop_loss = np.array([item["stop_loss"] for item in items], dtype=float)
+    take_profit = np.array([item["take_profit"] for item in items], dtype=float)
+    volatility = np.array([item["market_volatility"] for item in items], dtype=float)
+
+    position_size_pct = position_size / 10000  # Assuming $10k account
+    with np.errstate(divide="ignore", invalid="ignore"):
+        risk_reward_ratio = take_profit / stop_loss
+    risk_score = np.minimum(1.0, position_size_pct * 2 + volatility * 0.3)
+
+    results = []
+    for index, item in enumerate(items):
+        if stop_loss[index] == 0:
+            results.append(ZeroDivisionError("float division by zero"))
+            continue
+        results.append(risk_result(item, float(risk_score[index]), float(position_size_pct[index]),
+                                   float(risk_reward_ratio[index])))
+    return results
+
+def risk_result(risk_data: Dict[str, Any], risk_score: float, position_size_pct: float,
+                risk_reward_ratio: float) -> Dict[str, Any]:
     return {
         "strategy_id": risk_data["strategy_id"],
         "risk_score": risk_score,
@@ -189,8 +212,6 @@ async def assess_risk(risk_data: Dict[str, Any]) -> Dict[str, Any]:
 
 async def generate_automated_strategy(strategy_data: Dict[str, Any]) -> Dict[str, Any]:
     """Generate an automated trading strategy based on user preferences."""
-    await asyncio.sleep(2)  # Simulate complex AI processing
-
     risk_tolerance = strategy_data["risk_tolerance"]
     trading_style = strategy_data["trading_style"]
 
@@ -242,17 +263,17 @@ async def generate_automated_strategy(strategy_data: Dict[str, Any]) -> Dict[str
 
     strategy = strategies.get(risk_tolerance, {}).get(trading_style, strategies["moderate"]["swing_trading"])
 
-    return {
+    result = {
         "user_id": strategy_data["user_id"],
-        "strategy": strategy,
-        "backtest_results": {
-            "win_rate": 0.65,
-            "avg_win": 45,
-            "avg_loss": -25,
-            "profit_factor": 1.8,
-            "max_drawdown": 0.08,
-            "sharpe_ratio": 1.2
-        },
+        "strategy": strategy
+    }
+    # Backtest results only when there is a history to run them on
+    if strategy_data.get("historical_data"):
+        prices = price_array(strategy_data["historical_data"])
+        result["backtest_results"] = evaluate_strategy(prices)["metrics"]
+
+    return {
+        **result,
         "risk_metrics": {
             "value_at_risk": 0.02,  # 2% VaR
             "expected_shortfall": 0.035,
@@ -261,128 +282,101 @@ async def generate_automated_strategy(strategy_data: Dict[str, Any]) -> Dict[str
         "generated_at": datetime.utcnow().isoformat()
     }
 
+def allocation_recommendations(current: Dict[str, float], optimized: Dict[str, float],
+                                limit: int = 3) -> List[str]:
+    """The largest allocation changes, as rebalancing suggestions."""
+    changes = sorted(((optimized[asset] - current.get(asset, 0.0), asset) for asset in optimized),
+                     key=lambda change: -abs(change[0]))
+    recommendations = [
+        f"{'Increase' if change > 0 else 'Reduce'} {asset} from {current.get(asset, 0.0):.1%} to {optimized[asset]:.1%}"
+        for change, asset in changes[:limit] if abs(change) >= 0.01
+    ]
+    return recommendations + ["Consider rebalancing quarterly"]
+
 async def optimize_portfolio(portfolio_data: Dict[str, Any]) -> Dict[str, Any]:
     """Optimize portfolio allocation using Modern Portfolio Theory."""
-    await asyncio.sleep(1.5)  # Simulate optimization processing
-
     current_portfolio = portfolio_data["current_portfolio"]
-    risk_free_rate = portfolio_data["risk_free_rate"]
-
-    # Mock portfolio optimization (in production, use scipy.optimize or similar)
+    history = portfolio_data["return_history"]
     assets = [p["symbol"] for p in current_portfolio]
-    current_weights = [p["weight"] for p in current_portfolio]
-
-    # Optimized weights (mock - would use actual optimization)
-    optimized_weights = {}
-    for asset in assets:
-        if "BOND" in asset.upper() or "GOLD" in asset.upper():
-            optimized_weights[asset] = 0.3  # Increase safe assets
-        elif "TECH" in asset.upper() or "CRYPTO" in asset.upper():
-            optimized_weights[asset] = 0.1  # Reduce volatile assets
-        else:
-            optimized_weights[asset] = 0.2  # Balanced allocation
-
-    # Normalize weights
-    total_weight = sum(optimized_weights.values())
-    optimized_weights = {k: v/total_weight for k, v in optimized_weights.items()}
+    duplicates = sorted({asset for asset in assets if assets.count(asset) > 1})
+    if duplicates:
+        raise ValueError(f"Symbols appear more than once in the portfolio: {', '.join(duplicates)}")
+    current_allocation = {p["symbol"]: p.get("weight", 0.0) for p in current_portfolio}
+
+    missing = [asset for asset in assets if asset not in history]
+    if missing:
+        raise ValueError(f"No return history for {', '.join(missing)}")
+    if len({len(history[asset]) for asset in assets}) > 1:
+        raise ValueError("Return histories must cover the same periods")
+    returns = np.array([history[asset] for asset in assets], dtype=float).T
+
+    result = await asyncio.to_thread(
+        optimize, assets, returns, portfolio_data["objective"], portfolio_data["risk_free_rate"],
+        portfolio_data["periods_per_year"], portfolio_data["min_weight"], portfolio_data["max_weight"],
+        covariance_cache,
+    )
 
     return {
         "user_id": portfolio_data["user_id"],
-        "current_allocation": dict(zip(assets, current_weights)),
-        "optimized_allocation": optimized_weights,
-        "expected_return": 0.085,  # 8.5% expected return
-        "expected_volatility": 0.12,  # 12% volatility
-        "sharpe_ratio": 0.625,
-        "recommendations": [
-            "Increase allocation to defensive assets",
-            "Reduce exposure to high-volatility assets",
-            "Consider rebalancing quarterly"
-        ],
+        "objective": portfolio_data["objective"],
+        "current_allocation": current_allocation,
+        "optimized_allocation": result["weights"],
+        "expected_return": result["expected_return"],
+        "expected_volatility": result["expected_volatility"],
+        "sharpe_ratio": result["sharpe_ratio"],
+        "covariance_shrinkage": result["shrinkage"],
+        "recommendations": allocation_recommendations(current_allocation, result["weights"]),
         "optimized_at": datetime.utcnow().isoformat()
     }
 
 async def analyze_sentiment(sentiment_data: Dict[str, Any]) -> Dict[str, Any]:
     """Analyze market sentiment from news and social media."""
-    await asyncio.sleep(1)  # Simulate NLP processing
-
-    symbol = sentiment_data["symbol"]
     news_articles = sentiment_data["news_articles"]
-    social_posts = sentiment_data.get("social_media_posts", [])
-
-    # Mock sentiment analysis (would use NLP models like VADER, BERT)
-    positive_news = sum(1 for article in news_articles if any(word in article.lower() for word in ['bullish', 'gains', 'rally', 'strong']))
-    negative_news = sum(1 for article in news_articles if any(word in article.lower() for word in ['bearish', 'losses', 'decline', 'weak']))
-
-    total_news = len(news_articles)
-    news_sentiment = (positive_news - negative_news) / max(total_news, 1)
-
-    # Social media sentiment
-    positive_social = sum(1 for post in social_posts if any(word in post.lower() for word in ['moon', 'bullish', 'pump', '🚀']))
-    negative_social = sum(1 for post in social_posts if any(word in post.lower() for word in ['dump', 'bearish', 'crash', '📉']))
-
-    total_social = len(social_posts)
-    social_sentiment = (positive_social - negative_social) / max(total_social, 1) if total_social > 0 else 0
-
-    overall_sentiment = (news_sentiment * 0.7 + social_sentiment * 0.3) if total_social > 0 else news_sentiment
+    social_posts = sentiment_data.get("social_media_posts") or []
+
+    news = NEWS_LEXICON.score_many(news_articles)
+    social = SOCIAL_LEXICON.score_many(social_posts)
+    return sentiment_result(sentiment_data, sentiment_score(news, social))
+
+async def analyze_sentiment_many(items: List[Dict[str, Any]]) -> List[Any]:
+    """Score every article and post of a batch in one pass per lexicon."""
+    news_lists = [item["news_articles"] for item in items]
+    social_lists = [item.get("social_media_posts") or [] for item in items]
+    news = NEWS_LEXICON.score_many([text for texts in news_lists for text in texts])
+    social = SOCIAL_LEXICON.score_many([text for texts in social_lists for text in texts])
+
+    news_ends = np.cumsum([len(texts) for texts in news_lists])
+    social_ends = np.cumsum([len(texts) for texts in social_lists])
+    results = []
+    for index, item in enumerate(items):
+        item_news = news[news_ends[index] - len(news_lists[index]):news_ends[index]]
+        item_social = social[social_ends[index] - len(social_lists[index]):social_ends[index]]
+        results.append(sentiment_result(item, sentiment_score(item_news, item_social)))
+    return results
+
+def sentiment_result(sentiment_data: Dict[str, Any], scores: Dict[str, float]) -> Dict[str, Any]:
+    total_news = len(sentiment_data["news_articles"])
+    total_social = len(sentiment_data.get("social_media_posts") or [])
+    overall_sentiment = scores["overall"]
 
     return {
-        "symbol": symbol,
+        "symbol": sentiment_data["symbol"],
         "overall_sentiment": overall_sentiment,
         "sentiment_score": "bullish" if overall_sentiment > 0.2 else "bearish" if overall_sentiment < -0.2 else "neutral",
-        "news_sentiment": news_sentiment,
-        "social_sentiment": social_sentiment,
+        "news_sentiment": scores["news"],
+        "social_sentiment": scores["social"],
         "confidence": min(0.9, (total_news + total_social) / 20),  # Higher confidence with more data
         "key_themes": ["earnings", "economic_data", "technical_analysis"],
         "analyzed_at": datetime.utcnow().isoformat()
     }
 
 async def recognize_patterns(pattern_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Recognize technical patterns in price data."""
-    await asyncio.sleep(1)  # Simulate pattern recognition
-
+    """Recognize technical patterns across the whole price series."""
     symbol = pattern_data["symbol"]
-    price_data = pattern_data["price_data"]
     timeframe = pattern_data["timeframe"]
 
-    # Mock pattern recognition (would use computer vision/ML models)
-    patterns = []
-
-    # Simple pattern detection logic
-    if len(price_data) >= 5:
-        closes = [p["close"] for p in price_data[-5:]]
-
-        # Head and shoulders pattern detection (simplified)
-        if closes[0] < closes[1] > closes[2] < closes[3] > closes[4]:
-            patterns.append({
-                "pattern": "inverse_head_shoulders",
-                "confidence": 0.75,
-                "direction": "bullish",
-                "target_price": max(closes) * 1.05,
-                "stop_loss": min(closes) * 0.98
-            })
-
-        # Double bottom pattern
-        elif closes[0] > closes[1] < closes[2] > closes[3] < closes[4]:
-            patterns.append({
-                "pattern": "double_bottom",
-                "confidence": 0.8,
-                "direction": "bullish",
-                "target_price": max(closes) * 1.08,
-                "stop_loss": min(closes) * 0.95
-            })
-
-        # Ascending triangle
-        highs = [p["high"] for p in price_data[-10:]]
-        lows = [p["low"] for p in price_data[-10:]]
-        if all(highs[i] <= highs[i-1] + 0.001 for i in range(1, len(highs))) and \
-           all(lows[i] >= lows[i-1] - 0.001 for i in range(1, len(lows))):
-            patterns.append({
-                "pattern": "ascending_triangle",
-                "confidence": 0.7,
-                "direction": "bullish",
-                "target_price": highs[-1] + (highs[-1] - lows[0]),
-                "stop_loss": lows[0] * 0.98
-            })
+    high, low, close = series_arrays(pattern_data["price_data"])
+    patterns = await asyncio.to_thread(detect_patterns, high, low, close, **pattern_params(pattern_data))
 
     return {
         "symbol": symbol,
@@ -392,60 +386,32 @@ async def recognize_patterns(pattern_data: Dict[str, Any]) -> Dict[str, Any]:
         "analyzed_at": datetime.utcnow().isoformat()
     }
 
-async def optimize_backtest(backtest_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Optimize trading strategy parameters using genetic algorithms."""
-    await asyncio.sleep(3)  # Simulate intensive optimization
+def pattern_params(pattern_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Detector settings given in a request; unset ones keep the detector defaults."""
+    return {key: pattern_data[key] for key in ("order", "threshold", "tolerance") if pattern_data.get(key) is not None}
 
+async def optimize_backtest(backtest_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Optimize stop loss and take profit by backtesting every combination on the history."""
     strategy_config = backtest_data["strategy_config"]
     optimization_params = backtest_data["optimization_params"]
     fitness_function = backtest_data["fitness_function"]
 
-    # Mock optimization results (would use genetic algorithms or grid search)
-    param_combinations = []
-
-    # Generate parameter combinations
-    if "stop_loss" in optimization_params and "take_profit" in optimization_params:
-        for sl in optimization_params["stop_loss"][:3]:  # Limit for demo
-            for tp in optimization_params["take_profit"][:3]:
-                # Mock backtest result
-                win_rate = 0.55 + (sl / tp) * 0.1  # Better win rate with better risk-reward
-                total_return = 0.25 * win_rate * (tp / sl)
-                max_drawdown = 0.15 / (sl / tp)
-                sharpe_ratio = total_return / max_drawdown if max_drawdown > 0 else 0
-
-                fitness_score = {
-                    "sharpe_ratio": sharpe_ratio,
-                    "max_drawdown": -max_drawdown,  # Negative for minimization
-                    "total_return": total_return
-                }.get(fitness_function, total_return)
-
-                param_combinations.append({
-                    "parameters": {"stop_loss": sl, "take_profit": tp},
-                    "fitness_score": fitness_score,
-                    "metrics": {
-                        "win_rate": win_rate,
-                        "total_return": total_return,
-                        "max_drawdown": max_drawdown,
-                        "sharpe_ratio": sharpe_ratio,
-                        "total_trades": 150
-                    }
-                })
-
-    # Sort by fitness score
-    param_combinations.sort(key=lambda x: x["fitness_score"], reverse=True)
+    if not optimization_params.get("stop_loss") or not optimization_params.get("take_profit"):
+        raise ValueError("optimization_params needs stop_loss and take_profit values")
+    prices = price_array(backtest_data["historical_data"])
+    param_combinations = await asyncio.to_thread(
+        grid_search, prices, optimization_params["stop_loss"], optimization_params["take_profit"],
+        fitness_function, int(strategy_config.get("ma_period", DEFAULT_MA_PERIOD)),
+    )
 
     return {
         "strategy_name": strategy_config.get("name", "Optimized Strategy"),
-        "optimization_method": "genetic_algorithm",
+        "optimization_method": "grid_search",
         "fitness_function": fitness_function,
         "best_parameters": param_combinations[0]["parameters"],
         "best_fitness_score": param_combinations[0]["fitness_score"],
         "optimization_results": param_combinations[:5],  # Top 5 results
-        "convergence_info": {
-            "generations": 50,
-            "population_size": 100,
-            "converged": True
-        },
+        "combinations_evaluated": len(param_combinations),
         "optimized_at": datetime.utcnow().isoformat()
     }
 
@@ -455,12 +421,14 @@ async def analyze_trading_strategy(request: StrategyAnalysisRequest, background_
     """Analyze a trading strategy using AI."""
     try:
         # Start background analysis
-        analysis_result = await analyze_strategy(request.dict())
+        analysis_result = await result_caches["analyze-strategy"](request.model_dump())
 
         # Store result (in a real implementation, save to database)
         background_tasks.add_task(store_analysis_result, analysis_result)
 
         return analysis_result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
@@ -468,12 +436,14 @@ async def analyze_trading_strategy(request: StrategyAnalysisRequest, background_
 async def predict_market_movement(request: MarketPredictionRequest, background_tasks: BackgroundTasks):
     """Generate market predictions using AI."""
     try:
-        prediction_result = await predict_market(request.dict())
+        prediction_result = await result_caches["predict-market"](request.model_dump())
 
         # Store result
         background_tasks.add_task(store_prediction_result, prediction_result)
 
         return prediction_result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
@@ -481,12 +451,14 @@ async def predict_market_movement(request: MarketPredictionRequest, background_t
 async def generate_trading_insights(request: InsightGenerationRequest, background_tasks: BackgroundTasks):
     """Generate personalized trading insights."""
     try:
-        insights_result = await generate_insights(request.dict())
+        insights_result = await result_caches["generate-insights"](request.model_dump())
 
         # Store result
         background_tasks.add_task(store_insights_result, insights_result)
 
         return insights_result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Insight generation failed: {str(e)}")
 
@@ -494,8 +466,10 @@ async def generate_trading_insights(request: InsightGenerationRequest, backgroun
 async def assess_trading_risk(request: RiskAssessmentRequest):
     """Assess trading risk using AI."""
     try:
-        risk_result = await assess_risk(request.dict())
+        risk_result = await result_caches["assess-risk"](request.model_dump())
         return risk_result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Risk assessment failed: {str(e)}")
 
@@ -503,12 +477,14 @@ async def assess_trading_risk(request: RiskAssessmentRequest):
 async def create_automated_strategy(request: AutomatedStrategyRequest, background_tasks: BackgroundTasks):
     """Generate an automated trading strategy."""
     try:
-        strategy_result = await generate_automated_strategy(request.dict())
+        strategy_result = await result_caches["automated-strategy"](request.model_dump())
 
         # Store strategy result
         background_tasks.add_task(store_strategy_result, strategy_result)
 
         return strategy_result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Strategy generation failed: {str(e)}")
 
@@ -516,25 +492,34 @@ async def create_automated_strategy(request: AutomatedStrategyRequest, backgroun
 async def optimize_portfolio_allocation(request: PortfolioOptimizationRequest, background_tasks: BackgroundTasks):
     """Optimize portfolio allocation using AI."""
     try:
-        optimization_result = await optimize_portfolio(request.dict())
+        optimization_result = await result_caches["portfolio-optimization"](request.model_dump())
 
         # Store optimization result
         background_tasks.add_task(store_optimization_result, optimization_result)
 
         return optimization_result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Portfolio optimization failed: {str(e)}")
 
+@app.get("/api/v1/ai/portfolio-optimization/covariance-stats")
+async def get_covariance_stats():
+    """Counters of the portfolio covariance cache."""
+    return covariance_cache.status()
+
 @app.post("/api/v1/ai/sentiment-analysis")
 async def analyze_market_sentiment(request: SentimentAnalysisRequest, background_tasks: BackgroundTasks):
     """Analyze market sentiment from news and social media."""
     try:
-        sentiment_result = await analyze_sentiment(request.dict())
+        sentiment_result = await result_caches["sentiment-analysis"](request.model_dump())
 
         # Store sentiment result
         background_tasks.add_task(store_sentiment_result, sentiment_result)
 
         return sentiment_result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Sentiment analysis failed: {str(e)}")
 
@@ -542,28 +527,63 @@ async def analyze_market_sentiment(request: SentimentAnalysisRequest, background
 async def recognize_chart_patterns(request: PatternRecognitionRequest, background_tasks: BackgroundTasks):
     """Recognize technical patterns in price data."""
     try:
-        pattern_result = await recognize_patterns(request.dict())
+        pattern_result = await result_caches["pattern-recognition"](request.model_dump())
 
         # Store pattern result
         background_tasks.add_task(store_pattern_result, pattern_result)
 
         return pattern_result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Pattern recognition failed: {str(e)}")
 
+@app.post("/api/v1/ai/pattern-recognition/scan")
+async def scan_chart_patterns(request: PatternScanRequest):
+    """Recognize patterns in many symbols' series at once, given as columns."""
+    for symbol, columns in request.series.items():
+        if "close" not in columns:
+            raise HTTPException(status_code=400, detail=f"Series for {symbol} has no close prices")
+        if any(len(values) != len(columns["close"]) for values in columns.values()):
+            raise HTTPException(status_code=400, detail=f"Columns for {symbol} differ in length")
+
+    try:
+        results = await asyncio.to_thread(scan_symbols, request.series, **pattern_params(request.model_dump()))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Pattern scan failed: {str(e)}")
+    return {
+        "timeframe": request.timeframe,
+        "patterns": results,
+        "analysis_summary": f"Found {sum(len(found) for found in results.values())} patterns "
+                            f"in {len(results)} symbols",
+        "analyzed_at": datetime.utcnow().isoformat()
+    }
+
 @app.post("/api/v1/ai/backtest-optimization")
 async def optimize_strategy_backtest(request: BacktestOptimizationRequest, background_tasks: BackgroundTasks):
     """Optimize trading strategy parameters."""
     try:
-        optimization_result = await optimize_backtest(request.dict())
+        optimization_result = await result_caches["backtest-optimization"](request.model_dump())
 
         # Store optimization result
         background_tasks.add_task(store_backtest_optimization_result, optimization_result)
 
         return optimization_result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Backtest optimization failed: {str(e)}")
 
+@app.get("/api/v1/ai/cache-stats")
+async def get_cache_stats():
+    """Counters of each model's result cache, and of the portfolio covariance cache."""
+    return {
+        "models": {endpoint: cache.status() for endpoint, cache in result_caches.items()},
+        "covariance": covariance_cache.status(),
+    }
+
 @app.get("/api/v1/ai/models")
 async def list_available_models():
     """List available AI models and their capabilities."""
@@ -674,5 +694,72 @@ async def store_backtest_optimization_result(result: Dict[str, Any]):
     # TODO: Implement database storage
     print(f"Storing backtest optimization result: {result['strategy_name']}")
 
+# Result caches: repeated requests with the same content are answered from memory for the TTL
+RESULT_CACHE_SIZE = int(os.getenv("AI_RESULT_CACHE_SIZE", "1024"))
+
+RESULT_CACHE_TTLS = {  # Seconds; shorter for results that depend on the live market
+    "analyze-strategy": 3600,
+    "predict-market": 60,
+    "generate-insights": 60,
+    "assess-risk": 60,
+    "automated-strategy": 86400,
+    "portfolio-optimization": 900,
+    "sentiment-analysis": 300,
+    "pattern-recognition": 300,
+    "backtest-optimization": 3600,
+}
+
+result_caches = {
+    endpoint: ResultCache(model, RESULT_CACHE_TTLS[endpoint], RESULT_CACHE_SIZE)
+    for endpoint, model in {
+        "analyze-strategy": analyze_strategy,
+        "predict-market": predict_market,
+        "generate-insights": generate_insights,
+        "assess-risk": assess_risk,
+        "automated-strategy": generate_automated_strategy,
+        "portfolio-optimization": optimize_portfolio,
+        "sentiment-analysis": analyze_sentiment,
+        "pattern-recognition": recognize_patterns,
+        "backtest-optimization": optimize_backtest,
+    }.items()
+}
+
+async def assess_risk_many_cached(items: List[Dict[str, Any]]) -> List[Any]:
+    return await result_caches["assess-risk"].many(items, assess_risk_many)
+
+async def analyze_sentiment_many_cached(items: List[Dict[str, Any]]) -> List[Any]:
+    return await result_caches["sentiment-analysis"].many(items, analyze_sentiment_many)
+
+# Batch endpoints: /api/v1/ai/<endpoint>/batch runs many requests of one endpoint
+BATCH_MAX_ITEMS = int(os.getenv("AI_BATCH_MAX_ITEMS", "10000"))
+BATCH_CONCURRENCY = int(os.getenv("AI_BATCH_CONCURRENCY", "32"))
+
+# Batch results are streamed to the caller and not passed to the store_* tasks, which log one line per result
+batch_models = {
+    "analyze-strategy": BatchModel(StrategyAnalysisRequest, result_caches["analyze-strategy"]),
+    "predict-market": BatchModel(MarketPredictionRequest, result_caches["predict-market"]),
+    "generate-insights": BatchModel(InsightGenerationRequest, result_caches["generate-insights"]),
+    "assess-risk": BatchModel(RiskAssessmentRequest, result_caches["assess-risk"],
+                              process_many=assess_risk_many_cached),
+    "automated-strategy": BatchModel(AutomatedStrategyRequest, result_caches["automated-strategy"]),
+    "portfolio-optimization": BatchModel(PortfolioOptimizationRequest, result_caches["portfolio-optimization"]),
+    "sentiment-analysis": BatchModel(SentimentAnalysisRequest, result_caches["sentiment-analysis"],
+                                     process_many=analyze_sentiment_many_cached),
+    "pattern-recognition": BatchModel(PatternRecognitionRequest, result_caches["pattern-recognition"]),
+    "backtest-optimization": BatchModel(BacktestOptimizationRequest, result_caches["backtest-optimization"]),
+}
+
+@app.post("/api/v1/ai/{endpoint}/batch")
+async def run_batch(endpoint: str, request: BatchRequest):
+    """Run many requests of one endpoint, streaming one NDJSON result line per item."""
+    model = batch_models.get(endpoint)
+    if model is None:
+        raise HTTPException(status_code=404, detail=f"No batch endpoint for {endpoint}")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items")
+
+    return StreamingResponse(stream_batch(model, request.items, BATCH_CONCURRENCY),
+                             media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8003)
\ No newline at end of file
@@ -0,0 +1,260 @@
+"""
+Price-series analytics for the AI pipeline's strategy, prediction, insight
+and backtest models.
+
+Strategies are evaluated with one trade rule: go long when the close is
+above its moving average, exit at the stop loss or take profit, and wait for
+the next bar above the average before entering again. Trades are found one
+after another, but each scans the bars ahead in vectorized chunks.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_MA_PERIOD = 20
+DEFAULT_STOP_LOSS = 0.02
+DEFAULT_TAKE_PROFIT = 0.04
+LOOKAHEAD_CHUNK = 256  # Bars scanned at a time for a trade's exit
+TREND_WINDOW = 50  # Bars in the trend regression of a prediction
+PREDICTION_HORIZON = 24  # Bars ahead of the price target
+
+
+def price_array(historical_data: List[Dict[str, Any]]) -> np.ndarray:
+    """Closes (or prices) of historical bars."""
+    prices = np.array([bar["close"] if "close" in bar else bar["price"] for bar in historical_data], dtype=float)
+    if len(prices) < 2:
+        raise ValueError("Historical data needs at least two prices")
+    if (prices <= 0).any():
+        raise ValueError("Prices must be positive")
+    return prices
+
+
+def moving_average(prices: np.ndarray, period: int) -> np.ndarray:
+    """Trailing mean over `period` bars; NaN until there are enough bars."""
+    average = np.full(len(prices), np.nan)
+    if 0 < period <= len(prices):
+        sums = np.cumsum(np.concatenate([[0.0], prices]))
+        average[period - 1:] = (sums[period:] - sums[:-period]) / period
+    return average
+
+
+def ema(prices: np.ndarray, period: int) -> np.ndarray:
+    alpha = 2 / (period + 1)
+    result = np.empty(len(prices))
+    result[0] = prices[0]
+    for i in range(1, len(prices)):
+        result[i] = alpha * prices[i] + (1 - alpha) * result[i - 1]
+    return result
+
+
+def backtest_trades(prices: np.ndarray, stop_loss: float = DEFAULT_STOP_LOSS,
+                    take_profit: float = DEFAULT_TAKE_PROFIT, ma_period: int = DEFAULT_MA_PERIOD) -> np.ndarray:
+    """Returns of the trades taken by the moving-average rule; an open trade closes at the last bar."""
+    entries = np.flatnonzero(prices > np.nan_to_num(moving_average(prices, ma_period), nan=np.inf))
+    upper, lower = 1 + take_profit, 1 - stop_loss
+    returns = []
+    next_bar = 0
+    while True:
+        position = np.searchsorted(entries, next_bar)
+        if position == len(entries) or entries[position] >= len(prices) - 1:
+            break
+        entry = entries[position]
+        exit_bar = len(prices) - 1
+        for start in range(entry + 1, len(prices), LOOKAHEAD_CHUNK):
+            move = prices[start:start + LOOKAHEAD_CHUNK] / prices[entry]
+            hits = np.flatnonzero((move >= upper) | (move <= lower))
+            if len(hits):
+                exit_bar = start + int(hits[0])
+                break
+        returns.append(prices[exit_bar] / prices[entry] - 1)
+        next_bar = exit_bar + 1
+    return np.array(returns)
+
+
+def trade_metrics(returns: np.ndarray) -> Dict[str, float]:
+    """Win rate, compounded return, drawdown and per-trade Sharpe ratio of a trade sequence."""
+    if len(returns) == 0:
+        return {"total_trades": 0, "win_rate": 0.0, "total_return": 0.0, "max_drawdown": 0.0, "sharpe_ratio": 0.0}
+    equity = np.cumprod(1 + returns)
+    peaks = np.maximum.accumulate(np.concatenate([[1.0], equity]))[1:]
+    deviation = returns.std()
+    return {
+        "total_trades": int(len(returns)),
+        "win_rate": float((returns > 0).mean()),
+        "total_return": float(equity[-1] - 1),
+        "max_drawdown": float(max(0.0, (1 - equity / peaks).max())),
+        "sharpe_ratio": float(returns.mean() / deviation) if deviation > 0 else 0.0,
+    }
+
+
+def evaluate_strategy(prices: np.ndarray, parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Backtest a strategy's stop loss and take profit on the prices, and score the result."""
+    parameters = parameters or {}
+    stop_loss = float(parameters.get("stop_loss", DEFAULT_STOP_LOSS))
+    take_profit = float(parameters.get("take_profit", DEFAULT_TAKE_PROFIT))
+    metrics = trade_metrics(backtest_trades(prices, stop_loss, take_profit,
+                                            int(parameters.get("ma_period", DEFAULT_MA_PERIOD))))
+
+    drawdown = metrics["max_drawdown"]
+    recommendations = []
+    if metrics["total_trades"] == 0:
+        recommendations.append("No trades were triggered; use a longer history or a shorter moving average")
+    if drawdown > 3 * stop_loss:
+        recommendations.append(f"Drawdown of {drawdown:.1%} spans several stops; consider smaller positions")
+    if metrics["total_trades"] and metrics["win_rate"] < take_profit / (take_profit + stop_loss) - 0.05:
+        recommendations.append(f"Win rate of {metrics['win_rate']:.0%} is below break-even for a "
+                               f"{take_profit / stop_loss:.1f}:1 reward-risk; consider adjusting stop loss")
+    if not recommendations:
+        recommendations.append("Strategy parameters look consistent with the price history")
+
+    return {
+        "performance_score": round(float(np.clip(0.5 + metrics["sharpe_ratio"] / 2, 0, 1)), 2),
+        "risk_level": "high" if drawdown > 0.2 else "medium" if drawdown > 0.1 else "low",
+        "recommendations": recommendations,
+        # More trades, more evidence
+        "confidence": round(0.5 + 0.45 * min(1.0, metrics["total_trades"] / 100), 2),
+        "metrics": metrics,
+    }
+
+
+def grid_search(prices: np.ndarray, stop_losses: List[float], take_profits: List[float], fitness_function: str,
+                ma_period: int = DEFAULT_MA_PERIOD) -> List[Dict[str, Any]]:
+    """Every stop loss and take profit combination backtested, best fitness first."""
+    results = []
+    for stop_loss in stop_losses:
+        for take_profit in take_profits:
+            metrics = trade_metrics(backtest_trades(prices, stop_loss, take_profit, ma_period))
+            fitness_score = {
+                "sharpe_ratio": metrics["sharpe_ratio"],
+                "max_drawdown": -metrics["max_drawdown"],  # Negative for minimization
+                "total_return": metrics["total_return"],
+            }.get(fitness_function, metrics["total_return"])
+            results.append({
+                "parameters": {"stop_loss": stop_loss, "take_profit": take_profit},
+                "fitness_score": fitness_score,
+                "metrics": metrics,
+            })
+    results.sort(key=lambda result: result["fitness_score"], reverse=True)
+    return results
+
+
+def predict(prices: np.ndarray, indicators: List[str]) -> Dict[str, Any]:
+    """Direction, confidence and target from the recent trend and the requested indicators."""
+    window = np.log(prices[-TREND_WINDOW:])
+    x = np.arange(len(window), dtype=float)
+    slope, intercept = np.polyfit(x, window, 1)
+    residual = window - (slope * x + intercept)
+    spread = np.sum((window - window.mean()) ** 2)
+    fit = float(1 - residual @ residual / spread) if spread > 0 else 0.0
+
+    signals = [float(np.sign(slope)) * fit]
+    factors = [f"{'Up' if slope > 0 else 'Down'}trend of {abs(slope):.3%} per bar (R² {fit:.2f})"]
+    requested = {indicator.lower() for indicator in indicators}
+
+    if "rsi" in requested and len(prices) > 14:
+        changes = np.diff(prices[-15:])
+        gains, losses = changes.clip(min=0).sum(), -changes.clip(max=0).sum()
+        rsi = 100.0 if losses == 0 else 100 - 100 / (1 + gains / losses)
+        if rsi > 70:
+            signals.append(-0.5)
+            factors.append(f"RSI {rsi:.0f} is overbought")
+        elif rsi < 30:
+            signals.append(0.5)
+            factors.append(f"RSI {rsi:.0f} is oversold")
+        else:
+            factors.append(f"RSI {rsi:.0f} is neutral")
+    if "macd" in requested and len(prices) > 26:
+        macd = ema(prices, 12) - ema(prices, 26)
+        above = macd[-1] > ema(macd, 9)[-1]
+        signals.append(0.5 if above else -0.5)
+        factors.append(f"MACD is {'above' if above else 'below'} its signal line")
+    if "bollinger bands" in requested and len(prices) >= 20:
+        recent = prices[-20:]
+        deviation = recent.std()
+        z = (prices[-1] - recent.mean()) / deviation if deviation > 0 else 0.0
+        if abs(z) > 2:
+            signals.append(-0.5 if z > 0 else 0.5)
+            factors.append(f"Price is outside the {'upper' if z > 0 else 'lower'} Bollinger Band")
+        else:
+            factors.append("Price is inside the Bollinger Bands")
+
+    score = float(np.mean(signals))
+    return {
+        "prediction": "bullish" if score > 0.1 else "bearish" if score < -0.1 else "neutral",
+        "confidence": round(0.5 + 0.45 * min(1.0, abs(score)), 2),
+        "price_target": float(prices[-1] * np.exp(slope * PREDICTION_HORIZON)),
+        "key_factors": factors,
+    }
+
+
+def currency_legs(symbol: str) -> List[str]:
+    if "/" in symbol:
+        return symbol.split("/", 1)
+    if len(symbol) == 6 and symbol.isalpha():
+        return [symbol[:3], symbol[3:]]
+    return [symbol]
+
+
+def portfolio_insights(positions: List[Dict[str, Any]], market_conditions: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Concentration, trend alignment and volatility insights for open positions."""
+    exposure: Dict[str, float] = {}
+    gross = 0.0
+    trend = market_conditions.get("trend")
+    aligned, against = [], []
+    for position in positions:
+        direction = -1 if str(position.get("position", "long")).lower() in ("short", "sell") else 1
+        size = abs(float(position.get("size", 0)))
+        gross += size
+        # Long EUR/USD is long EUR and short USD
+        for leg, sign in zip(currency_legs(position["symbol"]), (direction, -direction)):
+            exposure[leg] = exposure.get(leg, 0.0) + sign * size
+        if trend in ("bullish", "bearish"):
+            (aligned if direction == (1 if trend == "bullish" else -1) else against).append(position["symbol"])
+
+    insights = []
+    if gross > 0 and len(positions) > 1:
+        currency, amount = max(exposure.items(), key=lambda item: abs(item[1]))
+        share = abs(amount) / gross
+        if share > 0.5:
+            insights.append({
+                "type": "warning",
+                "title": "Portfolio Concentration",
+                "description": f"{share:.0%} of your position size is {'long' if amount > 0 else 'short'} {currency}",
+                "confidence": round(min(0.95, share), 2),
+                "action_required": f"Consider positions that do not depend on {currency}",
+            })
+    if against:
+        insights.append({
+            "type": "warning",
+            "title": "Positions Against the Trend",
+            "description": f"Against the {trend} market trend: {', '.join(against)}",
+            "confidence": 0.7,
+            "action_required": "Review stops on counter-trend positions",
+        })
+    if aligned:
+        insights.append({
+            "type": "opportunity",
+            "title": "Positions Aligned With the Trend",
+            "description": f"Following the {trend} market trend: {', '.join(aligned)}",
+            "confidence": 0.7,
+            "action_required": "Consider trailing stops to protect gains",
+        })
+    volatility = float(market_conditions.get("volatility", 0.0))
+    if volatility > 0.2:
+        insights.append({
+            "type": "warning",
+            "title": "Elevated Volatility",
+            "description": f"Market volatility of {volatility:.0%} widens expected price swings",
+            "confidence": round(min(0.95, 0.5 + volatility), 2),
+            "action_required": "Reduce position sizes or widen stops",
+        })
+    if not insights:
+        insights.append({
+            "type": "info",
+            "title": "Portfolio Balanced",
+            "description": "No concentration, trend or volatility concerns were found",
+            "confidence": 0.6,
+            "action_required": "No action required",
+        })
+    return insights
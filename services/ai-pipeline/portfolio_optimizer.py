@@ -0,0 +1,316 @@
+"""
+Mean-variance portfolio optimization for the AI pipeline.
+
+Expected returns and covariances are estimated from periodic return
+histories. The sample covariance is shrunk towards a scaled identity with
+the Ledoit-Wolf intensity, which keeps it well conditioned when there are
+many assets and few observations. Covariance estimates are cached per asset
+universe and return window, so re-optimizing the same universe with other
+objectives or bounds skips the estimation.
+
+Weights are fully invested and kept within per-asset bounds. Min-variance is
+solved with accelerated projected gradient descent on that constraint set;
+max-Sharpe searches the risk aversion of mean-variance portfolios for the
+best Sharpe ratio; risk parity equalizes each asset's risk contribution.
+Everything is NumPy matrix algebra, so 500-asset universes solve in well
+under a second.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+OBJECTIVES = ("max_sharpe", "min_variance", "risk_parity")
+RIDGE = 1e-8  # Diagonal loading, relative to the average variance
+
+
+def ledoit_wolf(returns: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Shrunk covariance of a (periods x assets) return matrix, and the shrinkage intensity."""
+    periods, assets = returns.shape
+    centered = returns - returns.mean(axis=0)
+    sample = centered.T @ centered / periods
+    target = np.trace(sample) / assets
+    distance = np.sum((sample - target * np.eye(assets)) ** 2)
+    if distance == 0:
+        return sample, 0.0
+    # Variance of the sample covariance, from the per-period outer products
+    spread = (np.sum(np.sum(centered ** 2, axis=1) ** 2) / periods - np.sum(sample ** 2)) / periods
+    shrinkage = float(min(max(spread, 0.0), distance) / distance)
+    covariance = (1 - shrinkage) * sample
+    covariance[np.diag_indices(assets)] += shrinkage * target
+    return covariance, shrinkage
+
+
+class CovarianceCache:
+    """Shrunk covariance estimates keyed by asset universe and return window."""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple, Tuple[np.ndarray, np.ndarray, float]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+        # Optimizations run in worker threads
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(symbols: List[str], returns: np.ndarray) -> Tuple:
+        # The window is identified by its content, so overlapping requests with
+        # the same dates share an entry and a different window never does
+        digest = hashlib.blake2b(np.ascontiguousarray(returns).tobytes(), digest_size=16).hexdigest()
+        return tuple(symbols), returns.shape[0], digest
+
+    def estimate(self, symbols: List[str], returns: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float]:
+        """Mean returns, shrunk covariance and shrinkage for one window, per period."""
+        key = self.key(symbols, returns)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.stats["hits"] += 1
+                self.entries.move_to_end(key)
+                return entry
+            self.stats["misses"] += 1
+        covariance, shrinkage = ledoit_wolf(returns)
+        entry = (returns.mean(axis=0), covariance, shrinkage)
+        with self.lock:
+            self.entries[key] = entry
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def status(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "entries": len(self.entries),
+                "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0}
+
+
+def project(values: np.ndarray, lower: float, upper: float) -> np.ndarray:
+    """Closest weights to `values` that sum to 1 within [lower, upper].
+
+    The projection is clip(values - shift, lower, upper) for the shift that
+    makes it sum to 1. That sum is piecewise linear in the shift, with knots
+    where a weight reaches a bound, so it is evaluated at every knot from
+    prefix sums and interpolated on the segment that crosses 1.
+    """
+    ordered = np.sort(values)
+    count = len(ordered)
+    prefix = np.concatenate([[0.0], np.cumsum(ordered)])
+    knots = np.sort(np.concatenate([ordered - upper, ordered - lower]))
+    # Weights at or below the lower bound, and below the upper bound, for each knot
+    floored = np.searchsorted(ordered, knots + lower, side="right")
+    below_cap = np.searchsorted(ordered, knots + upper, side="left")
+    free = below_cap - floored
+    totals = (upper * (count - below_cap) + lower * floored
+              + prefix[below_cap] - prefix[floored] - knots * free)
+    segment = min(int(np.searchsorted(-totals, -1.0, side="right")) - 1, len(knots) - 2)
+    segment = max(segment, 0)
+    start, end = knots[segment], knots[segment + 1]
+    drop = totals[segment] - totals[segment + 1]
+    shift = start + (totals[segment] - 1) / drop * (end - start) if drop > 0 else start
+    return np.clip(values - shift, lower, upper)
+
+
+def _mean_variance(covariance: np.ndarray, mean: np.ndarray, aversion: float, lower: float, upper: float,
+                   start: np.ndarray, step: float, iterations: int = 500, tol: float = 1e-10) -> np.ndarray:
+    """Minimize aversion/2 w'Cw - mean'w over the bounded simplex (FISTA with adaptive restart)."""
+    weights = momentum = start
+    t = 1.0
+    for _ in range(iterations):
+        gradient = aversion * (covariance @ momentum) - mean
+        updated = project(momentum - step * gradient, lower, upper)
+        if (momentum - updated) @ (updated - weights) > 0:
+            # Momentum is carrying the iterate uphill: drop it
+            t = 1.0
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        momentum = updated + (t - 1) / t_next * (updated - weights)
+        converged = np.sum((updated - weights) ** 2) < tol
+        weights, t = updated, t_next
+        if converged:
+            break
+    return weights
+
+
+def min_variance(covariance: np.ndarray, lower: float = 0.0, upper: float = 1.0) -> np.ndarray:
+    start = project(np.full(len(covariance), 1 / len(covariance)), lower, upper)
+    step = 1 / np.linalg.eigvalsh(covariance)[-1]
+    return _mean_variance(covariance, np.zeros(len(covariance)), 1.0, lower, upper, start, step)
+
+
+def max_sharpe(covariance: np.ndarray, mean: np.ndarray, risk_free: float, lower: float = 0.0,
+               upper: float = 1.0) -> np.ndarray:
+    """Best Sharpe ratio among mean-variance portfolios, found by golden-section search on risk aversion."""
+    largest = np.linalg.eigvalsh(covariance)[-1]
+    excess = mean - risk_free
+
+    def solve(log_aversion: float, start: np.ndarray) -> Tuple[float, np.ndarray]:
+        aversion = float(np.exp(log_aversion))
+        weights = _mean_variance(covariance, excess, aversion, lower, upper, start, 1 / (aversion * largest))
+        volatility = np.sqrt(weights @ covariance @ weights)
+        return (excess @ weights / volatility if volatility > 0 else -np.inf), weights
+
+    weights = min_variance(covariance, lower, upper)
+    # Risk aversions between very aggressive and nearly min-variance, relative to the scale of the data
+    scale = np.log(np.abs(excess).max() / max(np.diag(covariance).mean(), 1e-18) + 1e-18)
+    low, high = scale - 4, scale + 8
+    ratio = (np.sqrt(5) - 1) / 2
+    a, b = high - ratio * (high - low), low + ratio * (high - low)
+    score_a, weights_a = solve(a, weights)
+    score_b, weights_b = solve(b, weights)
+    for _ in range(20):
+        if score_a > score_b:
+            high, b, score_b, weights_b = b, a, score_a, weights_a
+            a = high - ratio * (high - low)
+            score_a, weights_a = solve(a, weights_a)
+        else:
+            low, a, score_a, weights_a = a, b, score_b, weights_b
+            b = low + ratio * (high - low)
+            score_b, weights_b = solve(b, weights_b)
+    return weights_a if score_a > score_b else weights_b
+
+
+def _risk_budget(covariance: np.ndarray, level: float, lower: float, upper: float, start: np.ndarray,
+                 iterations: int = 100, tol: float = 1e-18) -> np.ndarray:
+    """Minimize 1/2 w'Cw - level * mean(log w) over the box [lower, upper] with projected Newton steps.
+
+    At the optimum free assets contribute w_i (Cw)_i = level / n, assets held
+    at the upper bound less and at the lower bound more.
+    """
+    budget = level / len(covariance)
+    floor = max(lower, 1e-12)  # The log keeps weights positive
+    weights = np.clip(start, floor, upper)
+
+    def objective(w):
+        return 0.5 * w @ covariance @ w - budget * np.log(w).sum()
+
+    value = objective(weights)
+    for _ in range(iterations):
+        gradient = covariance @ weights - budget / weights
+        held = ((weights <= floor) & (gradient > 0)) | ((weights >= upper) & (gradient < 0))
+        free = np.flatnonzero(~held)
+        if len(free) == 0 or gradient[free] @ gradient[free] < tol:
+            break
+        hessian = covariance[np.ix_(free, free)] + np.diag(budget / weights[free] ** 2)
+        step = np.linalg.solve(hessian, gradient[free])
+        # Backtrack along the projected Newton path
+        scale = 1.0
+        while True:
+            trial = weights.copy()
+            trial[free] = np.clip(weights[free] - scale * step, floor, upper)
+            trial_value = objective(trial)
+            if trial_value <= value - 1e-4 * gradient[free] @ (weights[free] - trial[free]) or scale < 1e-10:
+                break
+            scale /= 2
+        if value - trial_value < 1e-15 * max(1.0, abs(value)):
+            weights = trial
+            break
+        weights, value = trial, trial_value
+    return weights
+
+
+def risk_parity(covariance: np.ndarray, lower: float = 0.0, upper: float = 1.0,
+                iterations: int = 100, tol: float = 1e-12) -> np.ndarray:
+    """Weights with equal risk contributions w_i (Cw)_i, within [lower, upper].
+
+    Minimizes the convex 1/2 y'Cy - sum(log y) / n with Newton steps, whose
+    optimum has y_i (Cy)_i = 1/n for every asset, then rescales y to sum to 1
+    (which keeps the contributions equal). When that violates the bounds,
+    the same objective is minimized over the box instead, scaling the log
+    term until the weights sum to 1: assets inside their bounds then have
+    equal contributions, capped assets smaller ones and floored assets
+    larger ones (constrained risk budgeting, Richard and Roncalli).
+    """
+    budget = 1 / len(covariance)
+    weights = np.sqrt(budget / np.diag(covariance))
+    for _ in range(iterations):
+        gradient = covariance @ weights - budget / weights
+        hessian = covariance + np.diag(budget / weights ** 2)
+        step = np.linalg.solve(hessian, gradient)
+        if gradient @ step < tol:
+            break
+        # Damped so the weights stay positive
+        scale = 1.0
+        while np.any(weights - scale * step <= 0):
+            scale /= 2
+        weights = weights - scale * step
+    weights = weights / weights.sum()
+    if weights.min() >= lower and weights.max() <= upper:
+        return weights
+
+    # The weights grow with the level; search its logarithm for a sum of 1,
+    # starting from the unbounded level (the portfolio variance)
+    def total(log_level: float, start: np.ndarray) -> Tuple[float, np.ndarray]:
+        solved = _risk_budget(covariance, float(np.exp(log_level)), lower, upper, start)
+        return float(np.log(solved.sum())), solved
+
+    x = float(np.log(weights @ covariance @ weights))
+    error, solved = total(x, weights)
+    low, high = -np.inf, np.inf
+    previous = None
+    for _ in range(iterations):
+        if abs(error) < 1e-12:
+            break
+        if error < 0:
+            low = x
+        else:
+            high = x
+        if previous is not None and previous[1] != error:
+            # Secant step on the log of the sum
+            step = error * (x - previous[0]) / (error - previous[1])
+        else:
+            # Unbounded weights scale with the square root of the level
+            step = 2 * error
+        candidate = x - step
+        if not low < candidate < high:
+            candidate = (low + high) / 2 if np.isfinite(low) and np.isfinite(high) else x - 2 * error
+        previous = (x, error)
+        x = candidate
+        error, solved = total(x, solved)
+    return project(solved, lower, upper)
+
+
+def optimize(symbols: List[str], returns: np.ndarray, objective: str = "max_sharpe", risk_free_rate: float = 0.02,
+             periods_per_year: int = 252, min_weight: float = 0.0, max_weight: float = 1.0,
+             cache: Optional[CovarianceCache] = None) -> Dict[str, object]:
+    """Optimal weights and annualized statistics for a (periods x assets) return matrix."""
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective}; expected one of {', '.join(OBJECTIVES)}")
+    assets = len(symbols)
+    if returns.ndim != 2 or returns.shape[1] != assets or returns.shape[0] < 2:
+        raise ValueError("Return history needs at least two periods for every asset")
+    if len(set(symbols)) != assets:
+        raise ValueError("Symbols must be unique")
+    if not np.isfinite(returns).all():
+        raise ValueError("Return history must be finite")
+    if not np.ptp(returns, axis=0).any():
+        raise ValueError("Return history has no variance")
+    if not (min_weight * assets <= 1 <= max_weight * assets and min_weight <= max_weight):
+        raise ValueError("Weight bounds cannot sum to 1")
+
+    if cache is not None:
+        mean, covariance, shrinkage = cache.estimate(symbols, returns)
+    else:
+        covariance, shrinkage = ledoit_wolf(returns)
+        mean = returns.mean(axis=0)
+    mean = mean * periods_per_year
+    covariance = covariance * periods_per_year
+    # A constant or duplicated return series leaves the estimate singular; a
+    # ridge far below the average variance keeps it positive definite
+    covariance = covariance + RIDGE * np.trace(covariance) / assets * np.eye(assets)
+
+    if objective == "min_variance":
+        weights = min_variance(covariance, min_weight, max_weight)
+    elif objective == "max_sharpe":
+        weights = max_sharpe(covariance, mean, risk_free_rate, min_weight, max_weight)
+    else:
+        weights = risk_parity(covariance, min_weight, max_weight)
+
+    expected_return = float(mean @ weights)
+    volatility = float(np.sqrt(weights @ covariance @ weights))
+    return {
+        "weights": dict(zip(symbols, weights.tolist())),
+        "expected_return": expected_return,
+        "expected_volatility": volatility,
+        "sharpe_ratio": (expected_return - risk_free_rate) / volatility if volatility > 0 else 0.0,
+        "shrinkage": shrinkage,
+    }
@@ -0,0 +1,153 @@
+"""
+Model result cache for the AI pipeline.
+
+Results are keyed by a hash of the request content, so repeating an analysis
+of the same symbol, timeframe and data is answered from memory until the
+model's TTL passes. Concurrent requests for the same content share one
+computation (single flight), failures are not cached, and the oldest entry
+is evicted once the cache is full. Cached results are shared between
+callers and must not be modified.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+Model = Callable[[Dict[str, Any]], Awaitable[Any]]
+BatchModel = Callable[[List[Dict[str, Any]]], Awaitable[List[Any]]]
+
+
+def content_key(data: Dict[str, Any]) -> str:
+    """Hash of the request's canonical JSON: key order and whitespace do not matter."""
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+class ResultCache:
+    """Content-addressed TTL cache in front of one model, with single-flight computation."""
+
+    def __init__(self, model: Model, ttl: float = 300.0, max_entries: int = 1024):
+        self.model = model
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.entries: Dict[str, Tuple[float, Any]] = {}  # key -> (computed at, result)
+        self._loads: Dict[str, asyncio.Future] = {}
+
+        self.stats = {"hits": 0, "shared": 0, "misses": 0, "expirations": 0, "evictions": 0}
+
+    async def __call__(self, data: Dict[str, Any]) -> Any:
+        key = content_key(data)
+        found, value = self._lookup(key)
+        if found:
+            return value
+        load = self._loads.get(key)
+        if load is not None:
+            self.stats["shared"] += 1
+        else:
+            self.stats["misses"] += 1
+            load = self._loads[key] = asyncio.ensure_future(self._compute(key, data))
+        return await asyncio.shield(load)
+
+    async def many(self, items: List[Dict[str, Any]], model_many: BatchModel) -> List[Any]:
+        """Results for many requests: cached ones from memory, the rest in one call of `model_many`.
+
+        As with `model_many`, failed items come back as exceptions.
+        """
+        results: List[Any] = [None] * len(items)
+        computing: Dict[str, List[int]] = {}
+        shared: Dict[str, Tuple[asyncio.Future, List[int]]] = {}
+        for index, data in enumerate(items):
+            key = content_key(data)
+            found, value = self._lookup(key)
+            if found:
+                results[index] = value
+            elif key in computing:
+                self.stats["shared"] += 1
+                computing[key].append(index)
+            elif key in shared or key in self._loads:
+                self.stats["shared"] += 1
+                shared.setdefault(key, (self._loads.get(key), []))[1].append(index)
+            else:
+                self.stats["misses"] += 1
+                computing[key] = [index]
+
+        if computing:
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in computing}
+            self._loads.update(futures)
+            try:
+                computed = await model_many([items[indexes[0]] for indexes in computing.values()])
+            except Exception as e:
+                computed = [e] * len(computing)
+            except BaseException:
+                for future in futures.values():
+                    future.cancel()
+                raise
+            finally:
+                for key, future in futures.items():
+                    if self._loads.get(key) is future:
+                        del self._loads[key]
+            for (key, indexes), value in zip(computing.items(), computed):
+                if isinstance(value, Exception):
+                    futures[key].set_exception(value)
+                    futures[key].add_done_callback(self._ignore_error)
+                else:
+                    self._store(key, value)
+                    futures[key].set_result(value)
+                for index in indexes:
+                    results[index] = value
+
+        for future, indexes in shared.values():
+            try:
+                value = await asyncio.shield(future)
+            except Exception as e:
+                value = e
+            for index in indexes:
+                results[index] = value
+        return results
+
+    def _lookup(self, key: str) -> Tuple[bool, Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        if time.monotonic() - entry[0] >= self.ttl:
+            self.stats["expirations"] += 1
+            del self.entries[key]
+            return False, None
+        self.stats["hits"] += 1
+        return True, entry[1]
+
+    async def _compute(self, key: str, data: Dict[str, Any]) -> Any:
+        try:
+            value = await self.model(data)
+        finally:
+            if self._loads.get(key) is asyncio.current_task():
+                del self._loads[key]
+        self._store(key, value)
+        return value
+
+    def _store(self, key: str, value: Any):
+        if key not in self.entries and len(self.entries) >= self.max_entries:
+            # Evict the oldest result
+            del self.entries[next(iter(self.entries))]
+            self.stats["evictions"] += 1
+        self.entries.pop(key, None)
+        self.entries[key] = (time.monotonic(), value)
+
+    @staticmethod
+    def _ignore_error(future: asyncio.Future):
+        # Batch failures are reported in the batch; sharers see them when awaiting
+        if not future.cancelled():
+            future.exception()
+
+    def status(self):
+        lookups = self.stats["hits"] + self.stats["shared"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "ttl": self.ttl,
+            "hit_ratio": (self.stats["hits"] + self.stats["shared"]) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the AI pipeline's sentiment lexicon.
+
+Generates synthetic news articles and social posts from the lexicon terms,
+negators and filler words, then scores them with the compiled single-pass
+matcher and with the previous per-keyword substring scan, and reports
+documents per second for both.
+
+Usage:
+    python sentiment_benchmark.py --documents 20000 --words 120
+    python sentiment_benchmark.py --output report.json
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Dict, List
+
+from sentiment_lexicon import NEGATORS, NEWS_LEXICON, NEWS_TERMS, SOCIAL_LEXICON, SOCIAL_TERMS
+
+FILLER = ("the", "market", "central", "bank", "said", "traders", "expect", "rates", "inflation", "data",
+          "dollar", "euro", "session", "week", "analysts", "shares", "index", "yields", "after", "report")
+
+# Keywords of the substring scan the lexicon replaced
+BASELINE_NEWS = (["bullish", "gains", "rally", "strong"], ["bearish", "losses", "decline", "weak"])
+BASELINE_SOCIAL = (["moon", "bullish", "pump", "🚀"], ["dump", "bearish", "crash", "📉"])
+
+
+def generate(count: int, words: int, terms: List[str], seed: int) -> List[str]:
+    rng = random.Random(seed)
+    vocabulary = list(FILLER) * 8 + terms + list(NEGATORS)
+    return [" ".join(rng.choice(vocabulary) for _ in range(words)).capitalize() + "." for _ in range(count)]
+
+
+def baseline(texts: List[str], keywords) -> float:
+    positive_words, negative_words = keywords
+    positive = sum(1 for text in texts if any(word in text.lower() for word in positive_words))
+    negative = sum(1 for text in texts if any(word in text.lower() for word in negative_words))
+    return (positive - negative) / max(len(texts), 1)
+
+
+def measure(label: str, texts: List[str], run) -> Dict[str, float]:
+    started = time.perf_counter()
+    run(texts)
+    elapsed = time.perf_counter() - started
+    return {"name": label, "documents": len(texts), "seconds": round(elapsed, 4),
+            "documents_per_second": round(len(texts) / elapsed) if elapsed else None}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=20000, help="Articles and posts generated of each kind")
+    parser.add_argument("--words", type=int, default=120, help="Words per article (posts are a quarter)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    articles = generate(args.documents, args.words, list(NEWS_TERMS), args.seed)
+    posts = generate(args.documents, max(1, args.words // 4), list(SOCIAL_TERMS), args.seed + 1)
+
+    results = [
+        measure("news_lexicon", articles, NEWS_LEXICON.score_many),
+        measure("news_substring_baseline", articles, lambda texts: baseline(texts, BASELINE_NEWS)),
+        measure("social_lexicon", posts, SOCIAL_LEXICON.score_many),
+        measure("social_substring_baseline", posts, lambda texts: baseline(texts, BASELINE_SOCIAL)),
+    ]
+    for result in results:
+        print(f"{result['name']:<28} {result['documents']:>8} docs  {result['seconds']:>8.3f}s  "
+              f"{result['documents_per_second']:>10} docs/s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"documents": args.documents, "words": args.words, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
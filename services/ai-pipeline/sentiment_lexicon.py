@@ -0,0 +1,117 @@
+"""
+Lexicon sentiment scoring for the AI pipeline.
+
+All weighted terms and negators are compiled into one regular expression,
+factored as a prefix trie, when the lexicon is built, so a document is lowercased
+once and scored in a single left-to-right pass. Word terms only match whole
+words ("rally" does not match "rallying" unless listed), phrases match across
+spaces, and emoji match anywhere. A negator flips the sign of terms within
+the next few words of the same clause ("not bullish", "no gains").
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Weighted terms: positive is bullish, negative bearish
+NEWS_TERMS = {
+    "bullish": 1.0, "gains": 1.0, "rally": 1.0, "rallies": 1.0, "strong": 0.5, "surge": 1.0, "surges": 1.0,
+    "beat expectations": 1.0, "upgrade": 0.75, "record high": 1.0, "outperform": 0.75,
+    "bearish": -1.0, "losses": -1.0, "decline": -1.0, "declines": -1.0, "weak": -0.5, "plunge": -1.0,
+    "plunges": -1.0, "missed expectations": -1.0, "downgrade": -0.75, "sell-off": -1.0, "underperform": -0.75,
+}
+SOCIAL_TERMS = {
+    "moon": 1.0, "bullish": 1.0, "pump": 1.0, "buy the dip": 0.75, "🚀": 1.0, "📈": 0.75, "💎": 0.5,
+    "dump": -1.0, "bearish": -1.0, "crash": -1.0, "rekt": -1.0, "📉": -1.0, "🩸": -0.75,
+}
+NEGATORS = ("not", "no", "never", "without", "hardly", "isn't", "aren't", "wasn't", "don't", "doesn't",
+            "didn't", "won't", "can't", "cannot")
+NEGATION_WINDOW = 3  # Terms fewer than this many words after a negator are flipped
+
+
+CLAUSE_BREAK = re.compile(r"[.,;:!?]")  # Negation does not carry past these
+
+
+def trie_pattern(entries: List[str]) -> str:
+    """A regex matching any of the entries, with shared prefixes factored out.
+
+    Python's regex engine tries alternatives one by one; as a trie, only the
+    branch for the next character is followed. Longer entries are preferred,
+    and spaces match any run of whitespace.
+    """
+    trie: Dict[str, dict] = {}
+    for entry in entries:
+        node = trie
+        for char in entry:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [(r"\s+" if char == " " else re.escape(char)) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # An entry may also end here
+        return f"(?:{pattern})?" if "" in node else pattern
+
+    return build(trie)
+
+
+class Lexicon:
+    """Weighted terms compiled into a single-pass matcher."""
+
+    def __init__(self, terms: Dict[str, float], negators: Iterable[str] = NEGATORS,
+                 negation_window: int = NEGATION_WINDOW):
+        self.weights = {term.lower(): weight for term, weight in terms.items()}
+        self.negators = frozenset(negator.lower() for negator in negators)
+        self.negation_window = negation_window
+
+        # Words get boundaries so "rally" does not match "rallying"; emoji match anywhere
+        entries = list(self.weights) + list(self.negators)
+        words = [entry for entry in entries if re.match(r"\w", entry) and re.search(r"\w$", entry)]
+        symbols = [entry for entry in entries if entry not in words]
+        alternatives = [rf"\b{trie_pattern(words)}\b"] if words else []
+        if symbols:
+            alternatives.append(trie_pattern(symbols))
+        self.regex = re.compile("|".join(alternatives))
+
+    def score(self, text: str) -> float:
+        """Sum of matched term weights, clipped to [-1, 1]."""
+        text = text.lower()
+        total = 0.0
+        negator_end = None
+        for match in self.regex.finditer(text):
+            entry = " ".join(match.group().split())
+            if entry in self.negators:
+                negator_end = match.end()
+                continue
+            weight = self.weights[entry]
+            if negator_end is not None:
+                gap = text[negator_end:match.start()]
+                if len(gap.split()) < self.negation_window and not CLAUSE_BREAK.search(gap):
+                    weight = -weight
+            total += weight
+        return max(-1.0, min(1.0, total))
+
+    def score_many(self, texts: List[str]) -> np.ndarray:
+        return np.fromiter((self.score(text) for text in texts), dtype=float, count=len(texts))
+
+
+# Built once at import; reused by every request
+NEWS_LEXICON = Lexicon(NEWS_TERMS)
+SOCIAL_LEXICON = Lexicon(SOCIAL_TERMS)
+
+
+def sentiment_score(news: np.ndarray, social: Optional[np.ndarray]) -> Dict[str, float]:
+    """Mean news and social scores, and their 70/30 blend when there are social posts."""
+    news_sentiment = float(news.mean()) if len(news) else 0.0
+    if social is None or len(social) == 0:
+        return {"overall": news_sentiment, "news": news_sentiment, "social": 0.0}
+    social_sentiment = float(social.mean())
+    return {
+        "overall": news_sentiment * 0.7 + social_sentiment * 0.3,
+        "news": news_sentiment,
+        "social": social_sentiment,
+    }
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Order-flow replay benchmark and load generator for the Paper Trading service.
+
+Drives the FastAPI app in-process through httpx's ASGI transport (no network)
+with a mix of order, close, account summary and price tick operations across
+many accounts and symbols, and reports throughput, p50/p99 latency per
+endpoint and memory growth over the run.
+
+Workloads are generated from a seed or replayed from a JSON-lines file, so the
+same order flow can be run before and after a change. With --baseline, the run
+is compared against an earlier report and the script exits non-zero when
+throughput or p99 latency regress by more than --max-regression.
+
+Usage:
+    python benchmark.py --accounts 200 --operations 20000 --output report.json
+    python benchmark.py --record flow.jsonl --operations 50000
+    python benchmark.py --replay flow.jsonl --baseline report.json
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+API = "/api/v1/paper-trading"
+
+# Default share of each operation in a generated workload
+DEFAULT_MIX = {"order": 0.45, "close": 0.3, "summary": 0.2, "tick": 0.05}
+
+DEFAULT_SYMBOLS = ["EUR/USD", "GBP/USD", "USD/JPY", "AAPL", "TSLA", "BTC/USD", "XAU/USD", "SPX"]
+
+
+def load_service(data_dir: str):
+    """Import a fresh copy of the service storing its event log in data_dir."""
+    os.environ["PAPER_TRADING_DATA_DIR"] = data_dir
+    # Ticks come from the workload, not from the simulated feed
+    os.environ.setdefault("PAPER_TRADING_TICK_INTERVAL", "3600")
+    if SERVICE_DIR not in sys.path:
+        sys.path.insert(0, SERVICE_DIR)
+    spec = importlib.util.spec_from_file_location("paper_trading_benchmark_main", os.path.join(SERVICE_DIR, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_workload(operations: int, accounts: int, symbols: List[str],
+                      mix: Dict[str, float], seed: int = 0) -> List[Dict[str, Any]]:
+    """Generate a reproducible operation stream.
+
+    Accounts are referenced by their index in creation order and closes by
+    "oldest open position of the account", so a workload can be replayed
+    against any fresh service regardless of the ids it allocates.
+    """
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    workload = []
+    for _ in range(operations):
+        kind = rng.choices(kinds, weights)[0]
+        op: Dict[str, Any] = {"op": kind}
+        if kind == "tick":
+            op["symbol"] = rng.choice(symbols)
+            op["move"] = rng.uniform(-0.002, 0.002)
+        else:
+            op["account"] = rng.randrange(accounts)
+        if kind == "order":
+            op["symbol"] = rng.choice(symbols)
+            op["side"] = rng.choice(("buy", "sell"))
+            op["quantity"] = rng.choice((0.01, 0.05, 0.1))
+        workload.append(op)
+    return workload
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Latency samples per endpoint and memory samples over the run."""
+
+    def __init__(self, track_memory: bool):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+        self.memory: List[Dict[str, float]] = []
+        self.track_memory = track_memory
+        self.completed = 0
+
+    def add(self, endpoint: str, seconds: float, status_code: int):
+        """Record a call; 400s are counted as rejections, any other non-200 status as an error."""
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        if status_code == 400:
+            self.rejected[endpoint] = self.rejected.get(endpoint, 0) + 1
+        elif status_code != 200:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        self.completed += 1
+
+    def sample_memory(self):
+        if self.track_memory:
+            current, _ = tracemalloc.get_traced_memory()
+            self.memory.append({"operations": self.completed, "bytes": current})
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            endpoints[endpoint] = {
+                "count": len(samples),
+                "errors": self.errors.get(endpoint, 0),
+                "rejected": self.rejected.get(endpoint, 0),
+                "p50_ms": percentile(samples, 0.50) * 1000,
+                "p99_ms": percentile(samples, 0.99) * 1000,
+                "max_ms": samples[-1] * 1000,
+            }
+
+        report = {
+            "operations": self.completed,
+            "elapsed_s": elapsed,
+            "throughput_ops": self.completed / elapsed if elapsed > 0 else 0.0,
+            "endpoints": endpoints,
+        }
+        if self.memory:
+            first, last = self.memory[0], self.memory[-1]
+            operations = max(1, last["operations"] - first["operations"])
+            report["memory"] = {
+                "start_bytes": first["bytes"],
+                "end_bytes": last["bytes"],
+                "growth_bytes_per_op": (last["bytes"] - first["bytes"]) / operations,
+                "samples": self.memory,
+            }
+        return report
+
+
+async def run_workload(service, workload: List[Dict[str, Any]], accounts: int,
+                       concurrency: int = 8, track_memory: bool = True,
+                       memory_samples: int = 20) -> Dict[str, Any]:
+    """Run a workload against the app in-process and return the report."""
+    app = service.app
+    recorder = Recorder(track_memory)
+    open_positions: List[List[str]] = [[] for _ in range(accounts)]
+    sample_every = max(1, len(workload) // memory_samples)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            account_ids = []
+            for index in range(accounts):
+                response = await client.post(f"{API}/accounts", json={"user_id": index, "initial_balance": 1000000.0})
+                account_ids.append(response.json()["account_id"])
+
+            if track_memory:
+                tracemalloc.start()
+            recorder.sample_memory()
+
+            queue: asyncio.Queue = asyncio.Queue()
+            for op in workload:
+                queue.put_nowait(op)
+
+            async def execute(op: Dict[str, Any]):
+                kind = op["op"]
+                if kind == "tick":
+                    base = service.ASSET_TYPES[service.SYMBOL_ASSET_TYPES[op["symbol"]]][op["symbol"]]
+                    started = time.perf_counter()
+                    service.publish_price(op["symbol"], base * (1 + op["move"]))
+                    recorder.add("price_tick", time.perf_counter() - started, 200)
+                    return
+
+                account = op["account"]
+                account_id = account_ids[account]
+                if kind == "order":
+                    started = time.perf_counter()
+                    response = await client.post(f"{API}/orders", json={
+                        "account_id": account_id,
+                        "symbol": op["symbol"],
+                        "order_type": "market",
+                        "side": op["side"],
+                        "quantity": op["quantity"],
+                    })
+                    recorder.add("place_order", time.perf_counter() - started, response.status_code)
+                    if response.status_code == 200:
+                        open_positions[account].append(response.json()["position_id"])
+                elif kind == "close":
+                    if not open_positions[account]:
+                        return
+                    position_id = open_positions[account].pop(0)
+                    started = time.perf_counter()
+                    response = await client.post(f"{API}/positions/{position_id}/close",
+                                                 json={"position_id": position_id})
+                    # A stop-out in between closes the position first and the close is rejected
+                    recorder.add("close_position", time.perf_counter() - started, response.status_code)
+                elif kind == "summary":
+                    started = time.perf_counter()
+                    response = await client.get(f"{API}/accounts/{account_id}")
+                    recorder.add("account_summary", time.perf_counter() - started, response.status_code)
+
+            async def worker():
+                while True:
+                    try:
+                        op = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    await execute(op)
+                    if recorder.completed % sample_every == 0:
+                        recorder.sample_memory()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+            recorder.sample_memory()
+            if track_memory:
+                tracemalloc.stop()
+
+    return recorder.report(elapsed)
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Describe every metric that regressed by more than max_regression (a fraction)."""
+    failures = []
+    if report["throughput_ops"] < baseline["throughput_ops"] * (1 - max_regression):
+        failures.append(
+            f"throughput {report['throughput_ops']:.0f} ops/s < baseline {baseline['throughput_ops']:.0f} ops/s"
+        )
+    for endpoint, stats in report["endpoints"].items():
+        base = baseline["endpoints"].get(endpoint)
+        if base is None:
+            continue
+        if stats["p99_ms"] > base["p99_ms"] * (1 + max_regression):
+            failures.append(f"{endpoint} p99 {stats['p99_ms']:.2f} ms > baseline {base['p99_ms']:.2f} ms")
+    return failures
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{report['operations']} operations in {report['elapsed_s']:.2f}s "
+          f"({report['throughput_ops']:.0f} ops/s)")
+    print(f"{'endpoint':<18}{'count':>8}{'errors':>8}{'rejected':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:<18}{stats['count']:>8}{stats['errors']:>8}{stats['rejected']:>10}"
+              f"{stats['p50_ms']:>10.3f}{stats['p99_ms']:>10.3f}{stats['max_ms']:>10.3f}")
+    memory = report.get("memory")
+    if memory:
+        print(f"memory {memory['start_bytes'] / 1e6:.1f} MB -> {memory['end_bytes'] / 1e6:.1f} MB "
+              f"({memory['growth_bytes_per_op']:.0f} bytes/op)")
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        kind, weight = part.split("=")
+        if kind not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown operation: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmark from the command line and return the exit code."""
+    parser = argparse.ArgumentParser(description="Paper trading order-flow replay benchmark")
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--operations", type=int, default=10000)
+    parser.add_argument("--symbols", default=",".join(DEFAULT_SYMBOLS))
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="operation weights, e.g. order=0.5,close=0.3,summary=0.2")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--replay", help="replay operations from a JSON-lines file")
+    parser.add_argument("--record", help="write the generated operations to a JSON-lines file and exit")
+    parser.add_argument("--no-memory", action="store_true", help="skip memory tracking (tracemalloc slows the run)")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="compare against an earlier JSON report")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed throughput drop / p99 increase against the baseline (fraction)")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        with open(args.replay) as f:
+            workload = [json.loads(line) for line in f if line.strip()]
+        accounts = max((op["account"] for op in workload if "account" in op), default=-1) + 1
+        accounts = max(accounts, args.accounts)
+    else:
+        accounts = args.accounts
+        workload = generate_workload(args.operations, accounts, args.symbols.split(","), args.mix, args.seed)
+
+    if args.record:
+        with open(args.record, "w") as f:
+            for op in workload:
+                f.write(json.dumps(op) + "\n")
+        print(f"Recorded {len(workload)} operations to {args.record}")
+        return 0
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        service = load_service(data_dir)
+        report = asyncio.run(run_workload(service, workload, accounts, args.concurrency, not args.no_memory))
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = compare(report, baseline, args.max_regression)
+        if failures:
+            print("\nRegression against baseline:")
+            for failure in failures:
+                print(f"  - {failure}")
+            return 1
+        print("\nNo regression against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Fill event bus for the Paper Trading service.
+
+Every fill is published as an event with a sequential offset so other
+services (social trading) can consume fills in batches instead of receiving
+one HTTP callback per trade. Consumers track their own committed offset, so
+delivery is at-least-once: a consumer that restarts resumes after the last
+batch it committed.
+
+Two backends share the same interface:
+
+- ``MemoryFillBus`` keeps recent events in memory for consumers running in
+  the same process (single node).
+- ``SQLiteFillBus`` appends events to a SQLite file that consumers in other
+  processes read, with consumer offsets stored in the same file. Offsets are
+  assigned by SQLite when a batch is written, so several workers can append
+  to one file.
+
+Publishing never blocks the request: events are buffered and written in
+batches by a background task, like the event log, with the SQLite writes
+in a worker thread. A batch that fails to write is put back and retried with
+backoff, so a locked database delays fills but never drops them.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[int, Dict[str, Any]]  # (offset, payload)
+
+# AUTOINCREMENT never reuses an offset, even after the fills holding it are pruned
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fills (
+    offset INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    published_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS consumer_offsets (
+    consumer TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL
+);
+"""
+
+
+class MemoryFillBus:
+    """In-process fill log with consumer offsets.
+
+    At most `max_events` events are kept; beyond that the oldest are dropped
+    even if a consumer has not committed them. Dropped events are counted, and
+    a consumer sees them as a gap in the offsets it reads.
+    """
+
+    def __init__(self, max_events: int = 100000):
+        self.max_events = max_events
+        self.events: Deque[Event] = deque()
+        self.offsets: Dict[str, int] = {}
+        self.last_offset = 0
+        self.dropped = 0  # Events evicted before every consumer committed them
+        self._published: Optional[asyncio.Event] = None
+
+    async def start(self):
+        self._published = asyncio.Event()
+
+    async def stop(self):
+        pass
+
+    def publish(self, payload: Dict[str, Any]) -> int:
+        self.last_offset += 1
+        self.events.append((self.last_offset, payload))
+        # Drop what every consumer has committed, then the oldest if still over the bound
+        committed = min(self.offsets.values(), default=0)
+        while self.events and (self.events[0][0] <= committed or len(self.events) > self.max_events):
+            if self.events.popleft()[0] > committed:
+                self.dropped += 1
+        if self._published is not None:
+            self._published.set()
+        return self.last_offset
+
+    def read(self, after: int, limit: int) -> List[Event]:
+        if not self.events or after >= self.last_offset:
+            return []
+        start = max(0, after + 1 - self.events[0][0])
+        return [self.events[index] for index in range(start, min(start + limit, len(self.events)))]
+
+    async def wait(self, after: int, timeout: float):
+        """Return once an event after `after` exists, or after `timeout` seconds."""
+        if self.last_offset > after:
+            return
+        if self._published is None:
+            self._published = asyncio.Event()
+        self._published.clear()
+        try:
+            await asyncio.wait_for(self._published.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def committed(self, consumer: str) -> int:
+        return self.offsets.get(consumer, 0)
+
+    def commit(self, consumer: str, offset: int):
+        self.offsets[consumer] = offset
+
+
+class SQLiteFillBus:
+    """Fill log in a SQLite file shared with consumers in other processes."""
+
+    def __init__(self, path: str, flush_interval: float = 0.05, poll_interval: float = 0.1,
+                 max_backoff: float = 5.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # Batches are written from a worker thread on their own connection, so
+        # reads on the event loop never land inside a write transaction
+        self.write_conn = sqlite3.connect(path, check_same_thread=False)
+        self.write_conn.execute("PRAGMA synchronous=NORMAL")
+
+        self._buffer: List[Tuple[str, float]] = []
+        self._writer_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self):
+        self._stopping = False
+        self._writer_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._writer_task is not None:
+            # Let an in-flight write finish rather than cancelling it mid-thread
+            self._stopping = True
+            await self._writer_task
+            self._writer_task = None
+        delay = self.flush_interval
+        while not await self.flush() and delay <= self.max_backoff:
+            await asyncio.sleep(delay)
+            delay *= 2
+        if self._buffer:
+            logger.error("Stopped with %d fill events not written to %s", len(self._buffer), self.path)
+        self.write_conn.close()
+        self.conn.close()
+
+    def publish(self, payload: Dict[str, Any]):
+        """Buffer an event; its offset is assigned when the batch is written."""
+        self._buffer.append((json.dumps(payload), time.time()))
+
+    async def flush(self) -> bool:
+        """Write the buffered events; returns False if the write failed and they were put back."""
+        if not self._buffer:
+            return True
+        rows, self._buffer = self._buffer, []
+        try:
+            await asyncio.to_thread(self._write, rows)
+        except sqlite3.Error:
+            logger.exception("Failed to write %d fill events to %s", len(rows), self.path)
+            # Ahead of anything published meanwhile, so fills keep their order
+            self._buffer[:0] = rows
+            return False
+        return True
+
+    def _write(self, rows: List[Tuple[str, float]]):
+        with self.write_conn:
+            self.write_conn.executemany("INSERT INTO fills (payload, published_at) VALUES (?, ?)", rows)
+            # Events every consumer has committed are no longer needed
+            self.write_conn.execute(
+                "DELETE FROM fills WHERE offset <= (SELECT MIN(offset) FROM consumer_offsets)"
+            )
+
+    async def _run(self):
+        delay = self.flush_interval
+        while not self._stopping:
+            await asyncio.sleep(delay)
+            # Back off while writes fail, e.g. while another process holds the lock
+            delay = self.flush_interval if await self.flush() else min(delay * 2, self.max_backoff)
+
+    def read(self, after: int, limit: int) -> List[Event]:
+        rows = self.conn.execute(
+            "SELECT offset, payload FROM fills WHERE offset > ? ORDER BY offset LIMIT ?", (after, limit)
+        )
+        return [(offset, json.loads(payload)) for offset, payload in rows]
+
+    async def wait(self, after: int, timeout: float):
+        """Poll until an event after `after` is stored, or `timeout` seconds pass."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            row = self.conn.execute("SELECT 1 FROM fills WHERE offset > ? LIMIT 1", (after,)).fetchone()
+            if row is not None:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    def committed(self, consumer: str) -> int:
+        row = self.conn.execute("SELECT offset FROM consumer_offsets WHERE consumer = ?", (consumer,)).fetchone()
+        return row[0] if row else 0
+
+    def commit(self, consumer: str, offset: int):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO consumer_offsets VALUES (?, ?) "
+                "ON CONFLICT (consumer) DO UPDATE SET offset = excluded.offset",
+                (consumer, offset)
+            )
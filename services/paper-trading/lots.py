@@ -0,0 +1,118 @@
+"""
+FIFO lot queues for netting positions in the Paper Trading service.
+
+In netting mode an account holds one position per symbol. Every fill in the
+position's direction adds a lot (quantity, price, margin) to the back of the
+queue and every opposite fill consumes lots from the front, so realized P&L
+and released margin follow first-in, first-out. Lots are kept in typed arrays
+with a moving head, so scaling in and out thousands of times does not create
+thousands of position objects. Running quantity and cost totals make the
+average entry price O(1) after every fill.
+"""
+
+from array import array
+from typing import Any, List, Optional, Tuple
+
+
+class LotQueue:
+    """First-in, first-out queue of open lots."""
+
+    __slots__ = ("quantities", "prices", "margins", "head", "quantity", "cost")
+
+    def __init__(self):
+        self.quantities = array("d")
+        self.prices = array("d")
+        self.margins = array("d")
+        self.head = 0
+        # Totals of the remaining lots: quantity and quantity times price
+        self.quantity = 0.0
+        self.cost = 0.0
+
+    def __len__(self):
+        return len(self.quantities) - self.head
+
+    def push(self, quantity: float, price: float, margin: float):
+        self.quantities.append(quantity)
+        self.prices.append(price)
+        self.margins.append(margin)
+        self.quantity += quantity
+        self.cost += quantity * price
+
+    def consume(self, quantity: float) -> Tuple[List[Tuple[float, float, float]], List[Any]]:
+        """Take `quantity` from the oldest lots.
+
+        Returns the consumed (quantity, price, margin) parts; a partly consumed
+        lot keeps the rest of its quantity and a proportional share of margin.
+        Also returns the change as [whole lots taken, [quantity, margin] left
+        in a partly consumed lot or None], which `drop` replays.
+        """
+        consumed = []
+        remainder = None
+        while quantity > 1e-12 and self.head < len(self.quantities):
+            head = self.head
+            lot_quantity = self.quantities[head]
+            if lot_quantity <= quantity + 1e-12:
+                consumed.append((lot_quantity, self.prices[head], self.margins[head]))
+                quantity -= lot_quantity
+                self.head += 1
+            else:
+                margin = self.margins[head] * quantity / lot_quantity
+                consumed.append((quantity, self.prices[head], margin))
+                self.quantities[head] = lot_quantity - quantity
+                self.margins[head] -= margin
+                remainder = [self.quantities[head], self.margins[head]]
+                quantity = 0.0
+
+        for lot_quantity, lot_price, _ in consumed:
+            self.quantity -= lot_quantity
+            self.cost -= lot_quantity * lot_price
+        self._compact()
+        return consumed, [len(consumed) - (remainder is not None), remainder]
+
+    def drop(self, count: int, remainder: Optional[List[float]]):
+        """Replay a consume: take `count` whole lots and leave `remainder` in the next."""
+        head = self.head
+        for lot_quantity, lot_price in zip(self.quantities[head:head + count], self.prices[head:head + count]):
+            self.quantity -= lot_quantity
+            self.cost -= lot_quantity * lot_price
+        self.head = head = head + count
+        if remainder is not None:
+            taken = self.quantities[head] - remainder[0]
+            self.quantity -= taken
+            self.cost -= taken * self.prices[head]
+            self.quantities[head], self.margins[head] = remainder
+        self._compact()
+
+    def _compact(self):
+        # Drop consumed lots once they make up most of the arrays
+        if self.head > 32 and self.head * 2 > len(self.quantities):
+            self.quantities = self.quantities[self.head:]
+            self.prices = self.prices[self.head:]
+            self.margins = self.margins[self.head:]
+            self.head = 0
+            # Re-sum while compacting anyway, so rounding in the totals cannot build up
+            self._recount()
+        elif self.head == len(self.quantities):
+            self.quantity = self.cost = 0.0
+
+    def _recount(self):
+        head = self.head
+        self.quantity = sum(self.quantities[head:])
+        self.cost = sum(q * p for q, p in zip(self.quantities[head:], self.prices[head:]))
+
+    def average_price(self) -> float:
+        """Quantity-weighted entry price of the remaining lots."""
+        return self.cost / self.quantity if self.quantity > 1e-12 else 0.0
+
+    def to_state(self) -> List[List[float]]:
+        head = self.head
+        return [self.quantities[head:].tolist(), self.prices[head:].tolist(), self.margins[head:].tolist()]
+
+    @classmethod
+    def from_state(cls, state: List[Any]) -> "LotQueue":
+        lots = cls()
+        lots.quantities = array("d", state[0])
+        lots.prices = array("d", state[1])
+        lots.margins = array("d", state[2])
+        lots._recount()
+        return lots
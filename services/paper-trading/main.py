@@ -3,7 +3,7 @@ Paper Trading service for DoleSe Wonderland FX platform.
 Provides risk-free trading simulation and strategy testing.
 """
 
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
@@ -11,11 +11,25 @@ from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 import json
 import asyncio
-import uuid
-from pydantic import BaseModel
+import logging
+import heapq
+import time
+from pydantic import BaseModel, Field, ValidationError
+import numpy as np
 import sqlite3
 from contextlib import contextmanager
 
+from fill_bus import MemoryFillBus, SQLiteFillBus
+from ledger import SymbolTable, TradeLedger, to_epoch, to_iso
+from lots import LotQueue
+from models import Account, Exposure, Order, Position
+from persistence import EventLog
+from replay import PriceReplay, parse_speed
+from shards import ShardedExecutor, WorkerPartition
+from valuation import PositionBook
+
+logger = logging.getLogger(__name__)
+
 app = FastAPI(
     title="DoleSe Wonderland FX - Paper Trading Service",
     description="Risk-free trading simulation and strategy testing",
@@ -38,13 +52,14 @@ class CreateAccountRequest(BaseModel):
     account_currency: str = "USD"
     leverage: Optional[int] = None  # Will be set based on asset type if not provided
     allowed_asset_types: List[str] = ["forex", "stock", "crypto", "commodity", "index"]
+    position_mode: str = "hedging"  # 'hedging' or 'netting'
 
 class PlaceOrderRequest(BaseModel):
     account_id: str
     symbol: str
-    order_type: str  # 'market', 'limit', 'stop'
-    side: str  # 'buy', 'sell'
-    quantity: float
+    order_type: str = Field(..., pattern="^(market|limit|stop)$")
+    side: str = Field(..., pattern="^(buy|sell)$")
+    quantity: float = Field(..., gt=0)
     price: Optional[float] = None
     stop_loss: Optional[float] = None
     take_profit: Optional[float] = None
@@ -53,11 +68,29 @@ class ClosePositionRequest(BaseModel):
     position_id: str
     quantity: Optional[float] = None  # Partial close support
 
+class BatchOrderRequest(BaseModel):
+    orders: List[Any]  # PlaceOrderRequest bodies, validated one by one
+    atomic: bool = True  # All-or-nothing per account
+
+class BatchCloseRequest(BaseModel):
+    positions: List[ClosePositionRequest]
+    atomic: bool = True  # All-or-nothing per account
+
+class AccountLookupRequest(BaseModel):
+    account_ids: List[str]
+
+class ReplayRequest(BaseModel):
+    file: str  # CSV file inside the replay directory
+    speed: str = "1"  # Multiplier such as '1', '100', or 'max'
+
 class AccountSummaryRequest(BaseModel):
     account_id: str
     include_positions: bool = True
     include_history: bool = False
 
+# Largest number of items accepted by the batch endpoints
+MAX_BATCH_SIZE = int(os.getenv("PAPER_TRADING_MAX_BATCH_SIZE", "10000"))
+
 # Database connection
 @contextmanager
 def get_db():
@@ -185,121 +218,474 @@ CONTRACT_SIZES = {
     }
 }
 
-# In-memory storage for demo (use database in production)
-paper_accounts = {}
-paper_positions = {}
-paper_orders = {}
-trade_history = {}
-
-async def get_current_price(symbol: str) -> Dict[str, float]:
-    """Get current market price for a symbol."""
-    # Determine asset type
-    asset_type = None
-    base_price = None
-
-    for type_name, price_dict in ASSET_TYPES.items():
-        if symbol in price_dict:
-            asset_type = type_name
-            base_price = price_dict[symbol]
-            break
+# In-memory storage, made durable by the event log below
+paper_accounts: Dict[int, Account] = {}
+paper_positions: Dict[int, Position] = {}
+paper_orders: Dict[int, Order] = {}
+trade_history: Dict[int, TradeLedger] = {}
+trade_symbols = SymbolTable()
+
+# Worker processes each own a stripe of ids; every worker keeps its own state
+WORKER_COUNT = int(os.getenv("PAPER_TRADING_WORKERS", "1"))
+WORKER_INDEX = int(os.getenv("PAPER_TRADING_WORKER_INDEX", "0"))
+partition = WorkerPartition(WORKER_COUNT, WORKER_INDEX)
+
+# Mutations of an account run on the actor task of the account's shard
+SHARD_COUNT = int(os.getenv("PAPER_TRADING_SHARDS", "16"))
+shards = ShardedExecutor(SHARD_COUNT)
+
+# Integer id sequences, moved past the recovered ids on startup
+next_ids = {kind: partition.next_id() for kind in ("account", "order", "position")}
+
+def new_id(kind: str) -> int:
+    """Allocate the next integer id for an account, order or position."""
+    value = next_ids[kind]
+    next_ids[kind] = value + WORKER_COUNT
+    return value
+
+def parse_id(value: str) -> Optional[int]:
+    """Parse an id received through the API; malformed ids match nothing."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def restore_id_sequences():
+    """Continue id sequences after the largest recovered ids."""
+    next_ids["account"] = partition.next_id(max(paper_accounts, default=0))
+    next_ids["order"] = partition.next_id(max(paper_orders, default=0))
+    next_ids["position"] = partition.next_id(max(paper_positions, default=0))
+
+def check_owner(entity_id: Optional[int]):
+    """Reject ids that belong to another worker process."""
+    if entity_id is not None and WORKER_COUNT > 1 and not partition.owns(entity_id):
+        raise HTTPException(
+            status_code=421,
+            detail=f"Id {entity_id} is served by worker {partition.owner(entity_id)}"
+        )
 
-    if base_price is None:
-        raise HTTPException(status_code=400, detail=f"Symbol {symbol} not found")
+# Write-ahead log and snapshots for the in-memory state
+DATA_DIR = os.getenv(
+    "PAPER_TRADING_DATA_DIR",
+    os.path.join(os.path.dirname(__file__), "../../data/paper-trading")
+)
+if WORKER_COUNT > 1:
+    DATA_DIR = os.path.join(DATA_DIR, f"worker-{WORKER_INDEX}")
+SNAPSHOT_EVERY = int(os.getenv("PAPER_TRADING_SNAPSHOT_EVERY", "100000"))
+
+event_log = EventLog(DATA_DIR, snapshot_every=SNAPSHOT_EVERY)
+
+# Fills are published for other services when a bus is configured: in memory
+# for consumers in this process, or to a SQLite log for consumers in other
+# processes. Without consumers a bus would only retain fills, so none is the default.
+FILL_BUS = os.getenv("PAPER_TRADING_FILL_BUS", "none")
+FILL_LOG = os.getenv(
+    "PAPER_TRADING_FILL_LOG",
+    os.path.join(os.path.dirname(__file__), "../../data/events/fills.db")
+)
+if FILL_BUS == "sqlite":
+    fill_bus = SQLiteFillBus(FILL_LOG)
+elif FILL_BUS == "memory":
+    fill_bus = MemoryFillBus()
+elif FILL_BUS == "none":
+    fill_bus = None
+else:
+    raise ValueError(f"PAPER_TRADING_FILL_BUS must be none, memory or sqlite, not {FILL_BUS!r}")
+
+def snapshot_state() -> Dict[str, Any]:
+    """Copy the in-memory state for a snapshot."""
+    return {
+        "accounts": [account.to_state() for account in paper_accounts.values()],
+        "orders": [order.to_state() for order in paper_orders.values()],
+        "positions": [position.to_state() for position in paper_positions.values()],
+        "trade_history": {str(account_id): ledger.to_state() for account_id, ledger in trade_history.items()}
+    }
 
-    # Get spread for this asset
-    spread = SPREADS.get(asset_type, {}).get(symbol, base_price * 0.0002)
+def restore_snapshot(state: Dict[str, Any]):
+    """Rebuild the in-memory state from a snapshot."""
+    paper_accounts.clear()
+    paper_orders.clear()
+    paper_positions.clear()
+    trade_history.clear()
+
+    for account_state in state["accounts"]:
+        account = Account.from_state(account_state)
+        paper_accounts[account.id] = account
+    for order_state in state["orders"]:
+        order = Order.from_state(order_state)
+        paper_orders[order.id] = order
+    for position_state in state["positions"]:
+        position = Position.from_state(position_state)
+        paper_positions[position.id] = position
+    for account_id, ledger_state in state["trade_history"].items():
+        trade_history[int(account_id)] = TradeLedger.from_state(trade_symbols, ledger_state)
+
+def apply_event(event_type: str, data: Any):
+    """Apply a logged event to the in-memory state during recovery."""
+    if event_type == "account":
+        account = Account.from_state(data)
+        paper_accounts[account.id] = account
+    elif event_type == "order":
+        order = Order.from_state(data)
+        paper_orders[order.id] = order
+    elif event_type == "position":
+        position = Position.from_state(data)
+        previous = paper_positions.get(position.id)
+        if position.lots is None and previous is not None:
+            # Fills of a netting position log its lots as "lots" deltas
+            position.lots = previous.lots
+        paper_positions[position.id] = position
+    elif event_type == "lots":
+        lots = paper_positions[data["position_id"]].lots
+        if "push" in data:
+            lots.push(*data["push"])
+        else:
+            lots.drop(*data["consume"])
+    elif event_type == "trade":
+        append_trade(data["account_id"], data)
+
+def append_trade(account_id: int, record: Dict[str, Any]) -> int:
+    """Add a trade record to the account's ledger."""
+    ledger = trade_history.get(account_id)
+    if ledger is None:
+        ledger = trade_history[account_id] = TradeLedger(trade_symbols)
+    return ledger.append(record)
+
+def record_trade(record: Dict[str, Any]):
+    """Store a trade in its account's ledger and the event log, and publish the fill."""
+    index = append_trade(record["account_id"], record)
+    event_log.append("trade", record)
+    if fill_bus is not None:
+        fill = dict(record)
+        # Ledger index, as in the trade history: with the account it identifies the fill
+        fill["id"] = index
+        fill["timestamp"] = to_iso(to_epoch(record["timestamp"]))
+        fill_bus.publish(trade_to_response(record["account_id"], fill))
+
+def trade_to_response(account_id: int, trade: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the fields derived from the account and symbol to a ledger trade."""
+    trade["account_id"] = str(account_id)
+    trade["order_id"] = str(trade["order_id"])
+    trade["position_id"] = str(trade["position_id"])
+    trade["asset_type"] = SYMBOL_ASSET_TYPES.get(trade["symbol"], "unknown")
+    return trade
+
+def get_account(account_id: str) -> Account:
+    """Look up an account by its API id."""
+    parsed = parse_id(account_id)
+    check_owner(parsed)
+    account = paper_accounts.get(parsed)
+    if account is None:
+        raise HTTPException(status_code=404, detail="Paper trading account not found")
+    return account
 
-    # Add some random movement for realism
-    import random
-    variation = random.uniform(-0.001, 0.001)
-    current_price = base_price * (1 + variation)
+# Symbol -> asset type lookup built once from the price tables
+SYMBOL_ASSET_TYPES = {
+    symbol: type_name
+    for type_name, price_dict in ASSET_TYPES.items()
+    for symbol in price_dict
+}
 
+def get_contract_size(symbol: str) -> float:
+    """Get contract size for a symbol."""
+    contract_size = CONTRACT_SIZES.get(SYMBOL_ASSET_TYPES.get(symbol), 1)
+    if isinstance(contract_size, dict):
+        return contract_size.get(symbol, 1)
+    return contract_size
+
+# Seconds between simulated price ticks
+PRICE_TICK_INTERVAL = float(os.getenv("PAPER_TRADING_TICK_INTERVAL", "1.0"))
+
+# Latest quote per symbol; orders, closes and valuations all read from here
+latest_quotes = {}
+
+# Incremental valuation indexes, rebuilt from open positions on startup
+account_exposure: Dict[int, Dict[str, Exposure]] = {}  # account_id -> symbol -> exposure
+symbol_holders: Dict[str, set] = {}                    # symbol -> account_ids with open exposure
+open_positions: Dict[int, set] = {}                    # account_id -> ids of open positions
+net_positions: Dict[tuple, int] = {}                   # (account_id, symbol) -> netting position id
+
+# Open positions as NumPy columns for marking many positions at once
+position_book = PositionBook(SYMBOL_ASSET_TYPES)
+
+# Margin levels (equity / margin used, in percent)
+MARGIN_CALL_LEVEL = float(os.getenv("PAPER_TRADING_MARGIN_CALL_LEVEL", "100"))
+STOP_OUT_LEVEL = float(os.getenv("PAPER_TRADING_STOP_OUT_LEVEL", "50"))
+
+class StopOutQueue:
+    """Accounts with open margin ordered by margin level, lowest first.
+
+    An entry is pushed whenever an account's level changes and superseded
+    entries are skipped lazily, so a tick only inspects the accounts at the
+    top of the heap that are actually at or below the stop-out level.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._levels = {}  # account_id -> current margin level
+
+    def push(self, account_id: int, level: float):
+        if self._levels.get(account_id) == level:
+            return
+        self._levels[account_id] = level
+        heapq.heappush(self._heap, (level, account_id))
+
+        # Rebuild once superseded entries dominate the heap
+        if len(self._heap) > 2 * len(self._levels) + 1024:
+            self._heap = [(lvl, acc_id) for acc_id, lvl in self._levels.items()]
+            heapq.heapify(self._heap)
+
+    def discard(self, account_id: int):
+        self._levels.pop(account_id, None)
+
+    def pop_breached(self, threshold: float) -> List[int]:
+        """Remove and return the accounts whose current level is at or below threshold."""
+        breached = []
+        while self._heap and self._heap[0][0] <= threshold:
+            level, account_id = heapq.heappop(self._heap)
+            if self._levels.get(account_id) == level:
+                del self._levels[account_id]
+                breached.append(account_id)
+        return breached
+
+    def __len__(self):
+        return len(self._levels)
+
+stop_out_queue = StopOutQueue()
+
+def make_quote(symbol: str, mid_price: float, timestamp: Optional[str] = None) -> Dict[str, Any]:
+    """Build a bid/ask quote around a mid price."""
+    asset_type = SYMBOL_ASSET_TYPES[symbol]
+    spread = SPREADS.get(asset_type, {}).get(symbol, mid_price * 0.0002)
     return {
-        "bid": current_price - spread/2,
-        "ask": current_price + spread/2,
+        "bid": mid_price - spread/2,
+        "ask": mid_price + spread/2,
         "spread": spread,
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": timestamp or datetime.utcnow().isoformat(),
         "asset_type": asset_type
     }
 
-async def get_contract_size(symbol: str) -> float:
-    """Get contract size for a symbol."""
-    for type_name, price_dict in ASSET_TYPES.items():
-        if symbol in price_dict:
-            if type_name == "commodity":
-                return CONTRACT_SIZES[type_name].get(symbol, 1)
-            elif type_name == "index":
-                return CONTRACT_SIZES[type_name].get(symbol, 1)
-            else:
-                return CONTRACT_SIZES[type_name]
-    return 1
-
-async def get_asset_type(symbol: str) -> str:
-    """Get asset type for a symbol."""
-    for type_name, price_dict in ASSET_TYPES.items():
-        if symbol in price_dict:
-            return type_name
-    return "unknown"
-
-async def get_default_leverage(asset_type: str) -> int:
-    """Get default leverage for asset type."""
-    return DEFAULT_LEVERAGE.get(asset_type, 10)
-
-async def calculate_pnl(position: Dict[str, Any], current_price: float) -> Dict[str, float]:
-    """Calculate profit/loss for a position."""
-    entry_price = position["entry_price"]
-    quantity = position["quantity"]
-    side = position["side"]
-    symbol = position["symbol"]
-
-    # Get contract size for proper calculation
-    contract_size = await get_contract_size(symbol)
-
-    # Calculate P&L based on asset type
-    asset_type = await get_asset_type(symbol)
-
-    if asset_type == "forex":
-        # Forex: P&L = (current - entry) * quantity * contract_size
-        if side == "buy":
-            pnl = (current_price - entry_price) * quantity * contract_size
-        else:  # sell
-            pnl = (entry_price - current_price) * quantity * contract_size
-    elif asset_type in ["stock", "crypto"]:
-        # Stocks/Crypto: P&L = (current - entry) * quantity
-        if side == "buy":
-            pnl = (current_price - entry_price) * quantity
-        else:  # sell (short selling)
-            pnl = (entry_price - current_price) * quantity
-    elif asset_type == "commodity":
-        # Commodities: P&L = (current - entry) * quantity * contract_size
-        if side == "buy":
-            pnl = (current_price - entry_price) * quantity * contract_size
-        else:
-            pnl = (entry_price - current_price) * quantity * contract_size
-    elif asset_type == "index":
-        # Indices: P&L = (current - entry) * quantity * contract_size
-        if side == "buy":
-            pnl = (current_price - entry_price) * quantity * contract_size
-        else:
-            pnl = (entry_price - current_price) * quantity * contract_size
+def publish_price(symbol: str, mid_price: float):
+    """Publish a price tick and revalue every account holding the symbol."""
+    publish_quote(symbol, make_quote(symbol, mid_price))
+
+def publish_quote(symbol: str, quote: Dict[str, Any]):
+    """Make a quote the latest price of its symbol, revalue every account holding it and queue its stop-outs.
+
+    Revaluation runs on the caller's task rather than on the accounts' shards;
+    see `shards.py` for why ticks may bypass them.
+    """
+    latest_quotes[symbol] = quote
+    position_book.set_quote(symbol, quote["bid"], quote["ask"])
+
+    for account_id in symbol_holders.get(symbol, ()):
+        revalue_exposure(paper_accounts[account_id], account_exposure[account_id][symbol], quote)
+
+    process_stop_outs()
+
+async def run_price_feed():
+    """Simulate market ticks with small random moves around the base prices."""
+    import random
+    while True:
+        for symbol, asset_type in SYMBOL_ASSET_TYPES.items():
+            base_price = ASSET_TYPES[asset_type][symbol]
+            try:
+                publish_price(symbol, base_price * (1 + random.uniform(-0.001, 0.001)))
+            except Exception:
+                # One bad tick must not stop the feed for every symbol
+                logger.exception("Failed to publish a price tick for %s", symbol)
+        await asyncio.sleep(PRICE_TICK_INTERVAL)
+
+# Historical replay: PAPER_TRADING_PRICE_SOURCE=replay streams PAPER_TRADING_REPLAY_FILE
+PRICE_SOURCE = os.getenv("PAPER_TRADING_PRICE_SOURCE", "simulated")
+REPLAY_DIR = os.getenv(
+    "PAPER_TRADING_REPLAY_DIR",
+    os.path.join(os.path.dirname(__file__), "../../data/replay")
+)
+REPLAY_FILE = os.getenv("PAPER_TRADING_REPLAY_FILE")
+REPLAY_SPEED = os.getenv("PAPER_TRADING_REPLAY_SPEED", "1")
+
+price_feed_task: Optional[asyncio.Task] = None
+price_replay: Optional[PriceReplay] = None
+
+def publish_replay_tick(timestamp: float, symbol: str, bid: float, ask: Optional[float]) -> bool:
+    """Publish a recorded tick or bar price; symbols without a quote table entry are skipped."""
+    if symbol not in SYMBOL_ASSET_TYPES:
+        return False
+    market_time = to_iso(timestamp)
+    if ask is None:
+        quote = make_quote(symbol, bid, market_time)
     else:
-        # Default calculation
-        if side == "buy":
-            pnl = (current_price - entry_price) * quantity
-        else:
-            pnl = (entry_price - current_price) * quantity
+        quote = {
+            "bid": bid,
+            "ask": ask,
+            "spread": ask - bid,
+            "timestamp": market_time,
+            "asset_type": SYMBOL_ASSET_TYPES[symbol]
+        }
+    publish_quote(symbol, quote)
+    return True
+
+def resolve_replay_file(name: str) -> str:
+    """Resolve a replay file name inside the replay directory."""
+    root = os.path.realpath(REPLAY_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Replay file {name} not found")
+    return path
+
+async def start_price_source(replay: Optional[PriceReplay] = None):
+    """Replace the running price source with a replay, or the simulated feed when replay is None."""
+    global price_feed_task, price_replay
+    if price_feed_task is not None:
+        price_feed_task.cancel()
+        try:
+            await price_feed_task
+        except asyncio.CancelledError:
+            pass
+    price_replay = replay
+    price_feed_task = asyncio.create_task(replay.run() if replay is not None else run_price_feed())
+
+for _symbol, _asset_type in SYMBOL_ASSET_TYPES.items():
+    latest_quotes[_symbol] = make_quote(_symbol, ASSET_TYPES[_asset_type][_symbol])
+    position_book.set_quote(_symbol, latest_quotes[_symbol]["bid"], latest_quotes[_symbol]["ask"])
+
+def fill_time(quote: Dict[str, Any]) -> float:
+    """Time to stamp a fill at a quote: its market time while replaying, otherwise now."""
+    if price_replay is not None:
+        return to_epoch(quote["timestamp"])
+    return time.time()
+
+def mark_price(position: Position) -> float:
+    """Price a position would close at now: the bid for longs, the ask for shorts."""
+    quote = latest_quotes[position.symbol]
+    return quote["bid"] if position.side == "buy" else quote["ask"]
+
+def refresh_equity(account: Account):
+    """Recompute equity, free margin and margin level from the account aggregates."""
+    account.equity = account.balance + account.unrealized_pnl
+    account.free_margin = account.equity - account.margin_used
+
+    if account.margin_used > 1e-9:
+        level = account.equity / account.margin_used * 100
+        account.margin_level = level
+        account.margin_call = level <= MARGIN_CALL_LEVEL
+        stop_out_queue.push(account.id, level)
+    else:
+        account.margin_level = None
+        account.margin_call = False
+        stop_out_queue.discard(account.id)
 
-    return {
-        "unrealized_pnl": pnl,
-        "current_price": current_price,
-        "pnl_percentage": (pnl / position["margin_used"]) * 100 if position["margin_used"] > 0 else 0
-    }
+def process_stop_outs():
+    """Queue a liquidation of every account whose margin level fell to the stop-out level.
+
+    Each liquidation runs on the account's own shard, after the work already
+    queued there, rather than on the shard or tick that noticed the breach.
+    """
+    for account_id in stop_out_queue.pop_breached(STOP_OUT_LEVEL):
+        shards.dispatch(account_id, stop_out, account_id).add_done_callback(log_stop_out_failure)
+
+def stop_out(account_id: int):
+    """Liquidate an account if it is still at or below the stop-out level; runs on the account's shard."""
+    account = paper_accounts[account_id]
+    if account.margin_level is not None and account.margin_level <= STOP_OUT_LEVEL:
+        liquidate_account(account)
+
+def log_stop_out_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Stop-out failed", exc_info=future.exception())
+
+def liquidate_account(account: Account):
+    """Close positions, largest loss first, until the margin level recovers."""
+    level = account.margin_level
+
+    position_ids = list(open_positions.get(account.id, ()))
+    pnls = position_book.pnls(position_book.rows(position_ids))
+    for row in pnls.argsort():
+        position = paper_positions[position_ids[row]]
+        if account.margin_level is None or account.margin_level > STOP_OUT_LEVEL:
+            break
+        execute_close(position, position.quantity, reason="stop_out")
+
+    logger.info("Stop-out on account %s at margin level %.1f%%", account.id, level)
+
+def revalue_exposure(account: Account, exposure: Exposure, quote: Dict[str, Any]):
+    """Re-mark one symbol's exposure and roll the change into the account totals."""
+    # Longs are marked at the bid and shorts at the ask, as when closing
+    pnl = (exposure.long_units * quote["bid"] - exposure.long_cost) + \
+          (exposure.short_cost - exposure.short_units * quote["ask"])
+
+    account.unrealized_pnl += pnl - exposure.unrealized_pnl
+    exposure.unrealized_pnl = pnl
+    refresh_equity(account)
+
+def update_exposure(position: Position, quantity: float, cost: float):
+    """Add (positive quantity) or remove (negative quantity) part of a position from its account's exposure.
+
+    `cost` is the quantity times its entry price, so lots entered at different
+    prices can be removed at their own cost basis.
+    """
+    account_id = position.account_id
+    symbol = position.symbol
+    account = paper_accounts[account_id]
+
+    exposures = account_exposure.setdefault(account_id, {})
+    exposure = exposures.get(symbol)
+    if exposure is None:
+        exposure = exposures[symbol] = Exposure()
+        symbol_holders.setdefault(symbol, set()).add(account_id)
+
+    units = quantity * position.contract_size
+    if position.side == "buy":
+        exposure.long_units += units
+        exposure.long_cost += cost * position.contract_size
+    else:
+        exposure.short_units += units
+        exposure.short_cost += cost * position.contract_size
+
+    if abs(exposure.long_units) < 1e-9 and abs(exposure.short_units) < 1e-9:
+        account.unrealized_pnl -= exposure.unrealized_pnl
+        del exposures[symbol]
+        symbol_holders[symbol].discard(account_id)
+        if not exposures:
+            # Drop accumulated rounding once the account is flat
+            account.unrealized_pnl = 0.0
+        refresh_equity(account)
+    else:
+        revalue_exposure(account, exposure, latest_quotes[symbol])
+
+def rebuild_valuation_indexes():
+    """Rebuild exposures and open-position indexes from the positions table."""
+    account_exposure.clear()
+    symbol_holders.clear()
+    open_positions.clear()
+    net_positions.clear()
+    position_book.clear()
+
+    for account in paper_accounts.values():
+        account.unrealized_pnl = 0.0
+        refresh_equity(account)
+
+    for position in paper_positions.values():
+        if position.status == "open":
+            open_positions.setdefault(position.account_id, set()).add(position.id)
+            if position.lots is not None:
+                net_positions[(position.account_id, position.symbol)] = position.id
+            add_to_book(position)
+            update_exposure(position, position.quantity, position.quantity * position.entry_price)
+
+def add_to_book(position: Position):
+    position_book.add(
+        position.id, position.account_id, position.symbol, position.side, position.quantity,
+        position.entry_price, position.contract_size, position.margin_used
+    )
 
 # API endpoints
 @app.post("/api/v1/paper-trading/accounts")
 async def create_paper_account(request: CreateAccountRequest):
     """Create a new paper trading account."""
-    account_id = str(uuid.uuid4())
+    if request.position_mode not in ("hedging", "netting"):
+        raise HTTPException(status_code=400, detail="position_mode must be 'hedging' or 'netting'")
 
     # Set default leverage if not provided
     leverage = request.leverage
@@ -307,57 +693,44 @@ async def create_paper_account(request: CreateAccountRequest):
         # Use forex leverage as default, but can be overridden per trade
         leverage = DEFAULT_LEVERAGE["forex"]
 
-    account = {
-        "id": account_id,
-        "user_id": request.user_id,
-        "balance": request.initial_balance,
-        "initial_balance": request.initial_balance,
-        "account_currency": request.account_currency,
-        "leverage": leverage,
-        "margin_used": 0.0,
-        "equity": request.initial_balance,
-        "free_margin": request.initial_balance,
-        "total_pnl": 0.0,
-        "created_at": datetime.utcnow().isoformat(),
-        "status": "active",
-        "allowed_asset_types": request.allowed_asset_types,
-        "trading_stats": {
-            "total_trades": 0,
-            "winning_trades": 0,
-            "losing_trades": 0,
-            "win_rate": 0.0,
-            "avg_win": 0.0,
-            "avg_loss": 0.0,
-            "largest_win": 0.0,
-            "largest_loss": 0.0
-        }
-    }
+    account = Account(
+        id=new_id("account"),
+        user_id=request.user_id,
+        initial_balance=request.initial_balance,
+        account_currency=request.account_currency,
+        leverage=leverage,
+        allowed_asset_types=request.allowed_asset_types,
+        created_at=time.time(),
+        position_mode=request.position_mode
+    )
 
-    paper_accounts[account_id] = account
+    paper_accounts[account.id] = account
+    event_log.append("account", account.to_state())
 
     return {
-        "account_id": account_id,
+        "account_id": str(account.id),
         "message": "Paper trading account created successfully",
-        "account": account
+        "account": account.to_dict()
     }
 
-@app.post("/api/v1/paper-trading/orders")
-async def place_order(request: PlaceOrderRequest, background_tasks: BackgroundTasks):
-    """Place a trading order."""
-    if request.account_id not in paper_accounts:
-        raise HTTPException(status_code=404, detail="Paper trading account not found")
+def price_order(request: PlaceOrderRequest, quotes: Dict[str, Dict[str, Any]], free_margin: float) -> Dict[str, Any]:
+    """Validate an order against its account and price it from a quote snapshot.
 
-    account = paper_accounts[request.account_id]
-    if account["status"] != "active":
+    Side, order type and quantity are already checked by the request model.
+    """
+    account = get_account(request.account_id)
+    if account.status != "active":
         raise HTTPException(status_code=400, detail="Account is not active")
 
     # Validate asset type
-    asset_type = await get_asset_type(request.symbol)
-    if asset_type not in account["allowed_asset_types"]:
+    asset_type = SYMBOL_ASSET_TYPES.get(request.symbol, "unknown")
+    if asset_type not in account.allowed_asset_types:
         raise HTTPException(status_code=400, detail=f"Asset type '{asset_type}' not allowed for this account")
 
     # Get current market price
-    price_data = await get_current_price(request.symbol)
+    price_data = quotes.get(request.symbol)
+    if price_data is None:
+        raise HTTPException(status_code=400, detail=f"Symbol {request.symbol} not found")
     execution_price = price_data["ask"] if request.side == "buy" else price_data["bid"]
 
     if request.order_type == "limit" and request.price:
@@ -366,233 +739,592 @@ async def place_order(request: PlaceOrderRequest, background_tasks: BackgroundTa
         execution_price = request.price
 
     # Get contract size and leverage for this asset type
-    contract_size = await get_contract_size(request.symbol)
-    asset_leverage = await get_default_leverage(asset_type)
-
-    # Calculate required margin based on asset type
-    if asset_type == "forex":
-        notional_value = execution_price * request.quantity * contract_size
-    elif asset_type == "stock":
-        notional_value = execution_price * request.quantity
-    elif asset_type == "crypto":
-        notional_value = execution_price * request.quantity
-    elif asset_type == "commodity":
-        notional_value = execution_price * request.quantity * contract_size
-    elif asset_type == "index":
-        notional_value = execution_price * request.quantity * contract_size
-    else:
-        notional_value = execution_price * request.quantity
+    contract_size = get_contract_size(request.symbol)
+    asset_leverage = DEFAULT_LEVERAGE.get(asset_type, 10)
 
-    required_margin = notional_value / asset_leverage
-
-    if required_margin > account["free_margin"]:
-        raise HTTPException(status_code=400, detail="Insufficient margin")
+    # Stocks and crypto have a contract size of one, so this covers every asset type
+    margin_per_unit = execution_price * contract_size / asset_leverage
 
-    # Create order
-    order_id = str(uuid.uuid4())
-    order = {
-        "id": order_id,
-        "account_id": request.account_id,
-        "symbol": request.symbol,
-        "asset_type": asset_type,
-        "order_type": request.order_type,
-        "side": request.side,
-        "quantity": request.quantity,
-        "price": execution_price,
-        "stop_loss": request.stop_loss,
-        "take_profit": request.take_profit,
-        "status": "filled",
-        "filled_at": datetime.utcnow().isoformat(),
-        "required_margin": required_margin,
-        "contract_size": contract_size,
-        "leverage_used": asset_leverage
-    }
+    # In netting mode an opposite order first reduces the open position; only
+    # the quantity beyond it opens new exposure and needs margin
+    opening_quantity = request.quantity
+    position = netting_position(account, request.symbol)
+    if position is not None and position.side != request.side:
+        opening_quantity = max(0.0, request.quantity - position.quantity)
+    required_margin = opening_quantity * margin_per_unit
 
-    paper_orders[order_id] = order
+    if required_margin > free_margin:
+        raise HTTPException(status_code=400, detail="Insufficient margin")
 
-    # Create position
-    position_id = str(uuid.uuid4())
-    position = {
-        "id": position_id,
-        "account_id": request.account_id,
-        "order_id": order_id,
-        "symbol": request.symbol,
+    return {
+        "account": account,
         "asset_type": asset_type,
-        "side": request.side,
-        "quantity": request.quantity,
-        "entry_price": execution_price,
-        "current_price": execution_price,
-        "stop_loss": request.stop_loss,
-        "take_profit": request.take_profit,
-        "margin_used": required_margin,
-        "unrealized_pnl": 0.0,
+        "execution_price": execution_price,
         "contract_size": contract_size,
         "leverage_used": asset_leverage,
-        "opened_at": datetime.utcnow().isoformat(),
-        "status": "open"
+        "margin_per_unit": margin_per_unit,
+        "required_margin": required_margin,
+        "filled_at": fill_time(price_data)
     }
 
-    paper_positions[position_id] = position
+def netting_position(account: Account, symbol: str) -> Optional[Position]:
+    """The open position of a netting account in a symbol, if any."""
+    if account.position_mode != "netting":
+        return None
+    position_id = net_positions.get((account.id, symbol))
+    return paper_positions[position_id] if position_id is not None else None
+
+def open_lot(account: Account, order: Order, quantity: float, margin: float,
+             position: Optional[Position] = None) -> Position:
+    """Open a position for a fill, or add the fill as a lot of a netting position."""
+    if position is None:
+        position = Position(
+            id=new_id("position"),
+            account_id=account.id,
+            order_id=order.id,
+            symbol=order.symbol,
+            asset_type=order.asset_type,
+            side=order.side,
+            quantity=quantity,
+            entry_price=order.price,
+            stop_loss=order.stop_loss,
+            take_profit=order.take_profit,
+            margin_used=margin,
+            contract_size=order.contract_size,
+            leverage_used=order.leverage_used,
+            opened_at=order.filled_at,
+            lots=LotQueue() if account.position_mode == "netting" else None
+        )
+        paper_positions[position.id] = position
+        open_positions.setdefault(account.id, set()).add(position.id)
+        if position.lots is not None:
+            position.lots.push(quantity, order.price, margin)
+            net_positions[(account.id, order.symbol)] = position.id
+        add_to_book(position)
+        event_log.append("position", position.to_state())
+    else:
+        position.lots.push(quantity, order.price, margin)
+        position.quantity += quantity
+        position.margin_used += margin
+        position.entry_price = position.lots.average_price()
+        position_book.update(position.id, position.quantity, position.entry_price, position.margin_used)
+        # Log the added lot rather than the whole queue
+        event_log.append("lots", {"position_id": position.id, "push": [quantity, order.price, margin]})
+        event_log.append("position", position.to_state(lots=False))
 
     # Update account
-    account["margin_used"] += required_margin
-    account["free_margin"] = account["equity"] - account["margin_used"]
+    account.margin_used += margin
+    update_exposure(position, quantity, quantity * order.price)
 
     # Store trade in history
-    trade_record = {
-        "id": str(uuid.uuid4()),
-        "account_id": request.account_id,
-        "order_id": order_id,
-        "position_id": position_id,
-        "symbol": request.symbol,
-        "asset_type": asset_type,
-        "side": request.side,
-        "quantity": request.quantity,
-        "price": execution_price,
-        "timestamp": datetime.utcnow().isoformat(),
+    record_trade({
+        "account_id": account.id,
+        "order_id": order.id,
+        "position_id": position.id,
+        "symbol": order.symbol,
+        "side": order.side,
+        "quantity": quantity,
+        "price": order.price,
+        "timestamp": order.filled_at,
         "type": "open"
-    }
+    })
+    return position
+
+def reduce_position(position: Position, quantity: float, price: float, order_id: int,
+                    closed_at: float, reason: str = "close") -> float:
+    """Close part or all of a position at `price` and settle it against its account.
+
+    Netting positions give up their oldest lots first; a hedging position is a
+    single lot and releases a proportional share of its margin. The fill is
+    stamped `closed_at` and the position is closed once nothing is left.
+    Returns the realized P&L.
+    """
+    account = paper_accounts[position.account_id]
+
+    if position.lots is None:
+        cost = quantity * position.entry_price
+        margin = position.margin_used * min(1.0, quantity / position.quantity)
+    else:
+        consumed, delta = position.lots.consume(quantity)
+        event_log.append("lots", {"position_id": position.id, "consume": delta})
+        cost = sum(lot_quantity * lot_price for lot_quantity, lot_price, _ in consumed)
+        margin = sum(lot_margin for _, _, lot_margin in consumed)
+    pnl = position.direction * (quantity * price - cost) * position.contract_size
+
+    position.realized_pnl = (position.realized_pnl or 0.0) + pnl
+    if position.quantity - quantity <= 1e-9:
+        # Update position; quantity and margin keep their last open values
+        position.status = "closed"
+        position.close_price = price
+        position.closed_at = closed_at
+        if reason != "close":
+            position.close_reason = reason
+
+        open_positions[account.id].discard(position.id)
+        if position.lots is not None:
+            net_positions.pop((account.id, position.symbol), None)
+        position_book.remove(position.id)
+    else:
+        position.quantity -= quantity
+        position.margin_used -= margin
+        if position.lots is not None:
+            position.entry_price = position.lots.average_price()
+        position_book.update(position.id, position.quantity, position.entry_price, position.margin_used)
 
-    if request.account_id not in trade_history:
-        trade_history[request.account_id] = []
-    trade_history[request.account_id].append(trade_record)
+    # Update account
+    account.balance += pnl
+    account.margin_used -= margin
+    account.total_pnl += pnl
+    update_exposure(position, -quantity, -cost)
 
-    # Background task to update positions
-    background_tasks.add_task(update_positions, request.account_id)
+    # Update trading statistics
+    account.stats.record(pnl)
 
-    return {
+    event_log.append("position", position.to_state(lots=False))
+    event_log.append("account", account.to_state())
+
+    # Store trade in history
+    trade_record = {
+        "account_id": account.id,
         "order_id": order_id,
-        "position_id": position_id,
-        "execution_price": execution_price,
-        "required_margin": required_margin,
-        "asset_type": asset_type,
-        "leverage_used": asset_leverage,
-        "message": "Order placed successfully"
+        "position_id": position.id,
+        "symbol": position.symbol,
+        "side": position.side,
+        "quantity": quantity,
+        "price": price,
+        "pnl": pnl,
+        "timestamp": closed_at,
+        "type": "close"
     }
+    if reason != "close":
+        trade_record["reason"] = reason
+    record_trade(trade_record)
+
+    return pnl
+
+def execute_order(request: PlaceOrderRequest, pricing: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill a priced order against the account's positions.
+
+    In hedging mode every order opens its own position. In netting mode the
+    order adds a lot to the symbol's position, or reduces it first when it is
+    on the opposite side and opens the remainder the other way.
+    """
+    account = pricing["account"]
+
+    order = Order(
+        id=new_id("order"),
+        account_id=account.id,
+        symbol=request.symbol,
+        asset_type=pricing["asset_type"],
+        order_type=request.order_type,
+        side=request.side,
+        quantity=request.quantity,
+        price=pricing["execution_price"],
+        stop_loss=request.stop_loss,
+        take_profit=request.take_profit,
+        filled_at=pricing["filled_at"],
+        required_margin=0.0,
+        contract_size=pricing["contract_size"],
+        leverage_used=pricing["leverage_used"]
+    )
+    paper_orders[order.id] = order
+
+    result = {"order_id": str(order.id)}
+    opening_quantity = request.quantity
+    position = netting_position(account, request.symbol)
+    if position is not None and position.side != request.side:
+        reduced = min(request.quantity, position.quantity)
+        result["realized_pnl"] = reduce_position(position, reduced, order.price, order.id, order.filled_at)
+        opening_quantity = request.quantity - reduced
+        if opening_quantity > 1e-9:
+            # The position is flat now; the remainder opens the other way
+            position = None
+
+    if opening_quantity > 1e-9:
+        order.required_margin = opening_quantity * pricing["margin_per_unit"]
+        position = open_lot(account, order, opening_quantity, order.required_margin, position)
+
+    event_log.append("order", order.to_state())
+    event_log.append("account", account.to_state())
 
-@app.post("/api/v1/paper-trading/positions/{position_id}/close")
-async def close_position(position_id: str, request: ClosePositionRequest, background_tasks: BackgroundTasks):
-    """Close a trading position."""
-    if position_id not in paper_positions:
-        raise HTTPException(status_code=404, detail="Position not found")
-
-    position = paper_positions[position_id]
-    account = paper_accounts[position["account_id"]]
+    return {
+        **result,
+        "position_id": str(position.id),
+        "execution_price": order.price,
+        "required_margin": order.required_margin,
+        "asset_type": order.asset_type,
+        "leverage_used": order.leverage_used
+    }
 
-    if position["status"] != "open":
-        raise HTTPException(status_code=400, detail="Position is not open")
+@app.post("/api/v1/paper-trading/orders")
+async def place_order(request: PlaceOrderRequest):
+    """Place a trading order."""
+    account = get_account(request.account_id)
+    result = await shards.submit(account.id, fill_order, request)
+
+    return {**result, "message": "Order placed successfully"}
+
+def fill_order(request: PlaceOrderRequest) -> Dict[str, Any]:
+    """Price and fill one order; runs on the account's shard."""
+    account = get_account(request.account_id)
+    pricing = price_order(request, latest_quotes, account.free_margin)
+    return execute_order(request, pricing)
+
+def fill_account_orders(account_id: int, orders: List[Optional[PlaceOrderRequest]], indexes: List[int],
+                        quotes: Dict[str, Dict[str, Any]], atomic: bool) -> List[Dict[str, Any]]:
+    """Validate, then fill, one account's orders of a batch; runs on the account's shard.
+
+    Only errors raised while pricing, before anything changes, reject an
+    order; a failure while filling propagates.
+    """
+    # Validate the whole group first, reserving margin as we go
+    account = paper_accounts.get(account_id)
+    free_margin = account.free_margin if account is not None else 0.0
+    results = []
+    priced = []
+    failed = False
+    for index in indexes:
+        try:
+            pricing = price_order(orders[index], quotes, free_margin)
+        except HTTPException as e:
+            results.append({"index": index, "status": "rejected", "error": e.detail})
+            failed = True
+            continue
+        except ValueError as e:
+            results.append({"index": index, "status": "rejected", "error": str(e)})
+            failed = True
+            continue
+        free_margin -= pricing["required_margin"]
+        priced.append((index, pricing))
+
+    if failed and atomic:
+        for index, _ in priced:
+            results.append({"index": index, "status": "rejected", "error": "Batch rejected for this account"})
+        return results
+
+    for index, pricing in priced:
+        results.append({"index": index, "status": "filled", **execute_order(orders[index], pricing)})
+    return results
+
+def merge_batch_groups(results: List[Optional[Dict[str, Any]]], groups: List[Any]):
+    """Place each account's batch results.
+
+    Every account's shard call has finished by now; if one failed after it
+    may have changed state, its error is raised instead of reported per item.
+    """
+    for group in groups:
+        if isinstance(group, BaseException):
+            raise group
+    for group in groups:
+        for result in group:
+            results[result["index"]] = result
+
+def validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'order'}: {detail['msg']}" for detail in error.errors()
+    )
+
+@app.post("/api/v1/paper-trading/orders/batch")
+async def place_orders_batch(request: BatchOrderRequest):
+    """Place many orders against one price snapshot.
+
+    Orders are validated per account before any of them fill; with `atomic`
+    set, one rejected order rejects the rest of that account's orders.
+    """
+    if len(request.orders) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {MAX_BATCH_SIZE} orders")
+
+    quotes = dict(latest_quotes)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(request.orders)
+
+    # Each order is validated on its own, so one malformed order is rejected alone
+    orders: List[Optional[PlaceOrderRequest]] = [None] * len(request.orders)
+    by_account: Dict[int, List[int]] = {}
+    for index, item in enumerate(request.orders):
+        try:
+            orders[index] = PlaceOrderRequest.model_validate(item)
+        except ValidationError as e:
+            results[index] = {"index": index, "status": "rejected", "error": validation_error(e)}
+            continue
+        account_id = parse_id(orders[index].account_id)
+        if account_id is None:
+            # Malformed ids match no account, as on the single order endpoint
+            results[index] = {"index": index, "status": "rejected", "error": "Paper trading account not found"}
+            continue
+        by_account.setdefault(account_id, []).append(index)
 
-    # Get current price
-    price_data = await get_current_price(position["symbol"])
-    close_price = price_data["bid"] if position["side"] == "buy" else price_data["ask"]
+    # Accounts are filled in parallel, each on its own shard; a failing
+    # account rejects its own orders and not the rest of the batch
+    groups = await asyncio.gather(*(
+        shards.submit(account_id, fill_account_orders, account_id, orders, indexes, quotes, request.atomic)
+        for account_id, indexes in by_account.items()
+    ), return_exceptions=True)
 
-    close_quantity = request.quantity or position["quantity"]
+    # One margin check for the whole batch
+    process_stop_outs()
+    merge_batch_groups(results, groups)
 
-    # Calculate P&L using the proper calculation function
-    pnl_data = await calculate_pnl(position, close_price)
-    pnl = pnl_data["unrealized_pnl"] * (close_quantity / position["quantity"])
+    filled = sum(1 for result in results if result["status"] == "filled")
+    return {
+        "results": results,
+        "filled": filled,
+        "rejected": len(results) - filled
+    }
 
-    # Update position
-    position["status"] = "closed"
-    position["close_price"] = close_price
-    position["closed_at"] = datetime.utcnow().isoformat()
-    position["realized_pnl"] = pnl
+def execute_close(position: Position, close_quantity: float, reason: str = "close") -> Dict[str, Any]:
+    """Close part or all of a position at the latest quote."""
+    close_price = mark_price(position)
+    closed_at = fill_time(latest_quotes[position.symbol])
+    pnl = reduce_position(position, close_quantity, close_price, position.order_id, closed_at, reason)
 
-    # Update account
-    account["balance"] += pnl
-    account["equity"] = account["balance"]
-    account["margin_used"] -= position["margin_used"] * (close_quantity / position["quantity"])
-    account["free_margin"] = account["equity"] - account["margin_used"]
-    account["total_pnl"] += pnl
+    return {
+        "position_id": str(position.id),
+        "close_price": close_price,
+        "closed_quantity": close_quantity,
+        "remaining_quantity": position.quantity if position.status == "open" else 0.0,
+        "realized_pnl": pnl,
+        "asset_type": position.asset_type
+    }
 
-    # Update trading statistics
-    account["trading_stats"]["total_trades"] += 1
-    if pnl > 0:
-        account["trading_stats"]["winning_trades"] += 1
-        account["trading_stats"]["avg_win"] = (
-            (account["trading_stats"]["avg_win"] * (account["trading_stats"]["winning_trades"] - 1) + pnl) /
-            account["trading_stats"]["winning_trades"]
-        )
-        account["trading_stats"]["largest_win"] = max(account["trading_stats"]["largest_win"], pnl)
-    else:
-        account["trading_stats"]["losing_trades"] += 1
-        account["trading_stats"]["avg_loss"] = (
-            (account["trading_stats"]["avg_loss"] * (account["trading_stats"]["losing_trades"] - 1) + abs(pnl)) /
-            account["trading_stats"]["losing_trades"]
-        )
-        account["trading_stats"]["largest_loss"] = max(account["trading_stats"]["largest_loss"], abs(pnl))
+def check_close_quantity(position: Position, quantity: Optional[float]) -> Optional[str]:
+    """Error message for an invalid close quantity, or None."""
+    if position.status != "open":
+        return "Position is not open"
+    if quantity is not None and (quantity <= 0 or quantity > position.quantity + 1e-9):
+        return "Close quantity must be positive and at most the position quantity"
+    return None
 
-    # Calculate win rate
-    total_trades = account["trading_stats"]["total_trades"]
-    winning_trades = account["trading_stats"]["winning_trades"]
-    account["trading_stats"]["win_rate"] = (winning_trades / total_trades) * 100 if total_trades > 0 else 0
+@app.post("/api/v1/paper-trading/positions/{position_id}/close")
+async def close_position(position_id: str, request: ClosePositionRequest):
+    """Close a trading position."""
+    parsed = parse_id(position_id)
+    check_owner(parsed)
+    position = paper_positions.get(parsed)
+    if position is None:
+        raise HTTPException(status_code=404, detail="Position not found")
 
-    # Store trade in history
-    trade_record = {
-        "id": str(uuid.uuid4()),
-        "account_id": position["account_id"],
-        "order_id": position["order_id"],
-        "position_id": position_id,
-        "symbol": position["symbol"],
-        "asset_type": position["asset_type"],
-        "side": position["side"],
-        "quantity": close_quantity,
-        "price": close_price,
-        "pnl": pnl,
-        "timestamp": datetime.utcnow().isoformat(),
-        "type": "close"
-    }
+    result = await shards.submit(position.account_id, close_one, position, request.quantity)
+
+    return {**result, "message": "Position closed successfully"}
+
+def close_one(position: Position, quantity: Optional[float]) -> Dict[str, Any]:
+    """Validate and close one position; runs on the account's shard."""
+    error = check_close_quantity(position, quantity)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+    close_quantity = min(quantity or position.quantity, position.quantity)
+    result = execute_close(position, close_quantity)
+    process_stop_outs()
+    return result
+
+def close_account_positions(closes: List[ClosePositionRequest], items: List[tuple],
+                            atomic: bool) -> List[Dict[str, Any]]:
+    """Validate, then close, one account's part of a batch; runs on the account's shard."""
+    results = []
+    valid = []
+    seen = set()
+    failed = False
+    for index, position in items:
+        error = check_close_quantity(position, closes[index].quantity)
+        if error is None and position.id in seen:
+            error = "Position appears more than once in the batch"
+        if error is None:
+            seen.add(position.id)
+            valid.append((index, position))
+        else:
+            results.append({"index": index, "status": "rejected", "error": error})
+            failed = True
+
+    if failed and atomic:
+        for index, _ in valid:
+            results.append({"index": index, "status": "rejected", "error": "Batch rejected for this account"})
+        return results
+
+    for index, position in valid:
+        quantity = min(closes[index].quantity or position.quantity, position.quantity)
+        results.append({"index": index, "status": "closed", **execute_close(position, quantity)})
+    return results
+
+@app.post("/api/v1/paper-trading/positions/close-batch")
+async def close_positions_batch(request: BatchCloseRequest):
+    """Close many positions against one price snapshot.
+
+    With `atomic` set, one invalid close rejects the rest of that account's closes.
+    """
+    if len(request.positions) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {MAX_BATCH_SIZE} closes")
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(request.positions)
+
+    by_account: Dict[int, List[tuple]] = {}
+    for index, close in enumerate(request.positions):
+        position = paper_positions.get(parse_id(close.position_id))
+        if position is None:
+            results[index] = {"index": index, "status": "rejected", "error": "Position not found"}
+            continue
+        by_account.setdefault(position.account_id, []).append((index, position))
 
-    if position["account_id"] not in trade_history:
-        trade_history[position["account_id"]] = []
-    trade_history[position["account_id"]].append(trade_record)
+    groups = await asyncio.gather(*(
+        shards.submit(account_id, close_account_positions, request.positions, items, request.atomic)
+        for account_id, items in by_account.items()
+    ), return_exceptions=True)
 
-    # Background task to update remaining positions
-    background_tasks.add_task(update_positions, position["account_id"])
+    process_stop_outs()
+    merge_batch_groups(results, groups)
 
+    closed = sum(1 for result in results if result["status"] == "closed")
     return {
-        "position_id": position_id,
-        "close_price": close_price,
-        "realized_pnl": pnl,
-        "asset_type": position["asset_type"],
-        "message": "Position closed successfully"
+        "results": results,
+        "closed": closed,
+        "rejected": len(results) - closed
     }
 
 @app.get("/api/v1/paper-trading/accounts/{account_id}")
 async def get_account_summary(account_id: str, include_positions: bool = True, include_history: bool = False):
     """Get paper trading account summary."""
-    if account_id not in paper_accounts:
-        raise HTTPException(status_code=404, detail="Paper trading account not found")
-
-    account = paper_accounts[account_id]
+    account = get_account(account_id)
 
     response = {
-        "account": account,
+        "account": account.to_dict(),
         "positions": [],
         "recent_trades": []
     }
 
+    response["exposure"] = {
+        symbol: exposure.long_units - exposure.short_units
+        for symbol, exposure in account_exposure.get(account.id, {}).items()
+    }
+
     if include_positions:
-        # Get open positions
-        account_positions = [
-            pos for pos in paper_positions.values()
-            if pos["account_id"] == account_id and pos["status"] == "open"
+        # Mark all of the account's positions in one vectorized pass
+        position_ids = list(open_positions.get(account.id, ()))
+        rows = position_book.rows(position_ids)
+        marks = position_book.marks(rows)
+        pnls = position_book.pnls(rows, marks)
+        response["positions"] = [
+            paper_positions[position_id].to_dict(current_price=mark, unrealized_pnl=pnl)
+            for position_id, mark, pnl in zip(position_ids, marks.tolist(), pnls.tolist())
         ]
 
-        # Update P&L for positions
-        for position in account_positions:
-            price_data = await get_current_price(position["symbol"])
-            current_price = price_data["bid"] if position["side"] == "buy" else price_data["ask"]
-            pnl_data = await calculate_pnl(position, current_price)
-            position.update(pnl_data)
-
-        response["positions"] = account_positions
-
     if include_history:
-        response["recent_trades"] = trade_history.get(account_id, [])[-10:]  # Last 10 trades
+        ledger = trade_history.get(account.id)
+        if ledger is not None:
+            response["recent_trades"] = [
+                trade_to_response(account.id, trade) for trade in ledger.recent(10)  # Last 10 trades
+            ]
 
     return response
 
+@app.post("/api/v1/paper-trading/accounts/lookup")
+async def lookup_accounts(request: AccountLookupRequest):
+    """Equity and margin of many accounts in one call; unknown ids are left out.
+
+    Used to size copy trades for all of a trader's followers at once.
+    """
+    if len(request.account_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Lookup exceeds {MAX_BATCH_SIZE} accounts")
+
+    accounts = {}
+    for account_id in request.account_ids:
+        parsed = parse_id(account_id)
+        if parsed is None or (WORKER_COUNT > 1 and not partition.owns(parsed)):
+            continue
+        account = paper_accounts.get(parsed)
+        if account is not None:
+            accounts[account_id] = {
+                "equity": account.equity,
+                "free_margin": account.free_margin,
+                "leverage": account.leverage,
+                "status": account.status,
+                "allowed_asset_types": list(account.allowed_asset_types)
+            }
+    return {"accounts": accounts}
+
+@app.get("/api/v1/paper-trading/accounts/{account_id}/trades")
+async def get_trade_history(
+    account_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[int] = None,
+    from_time: Optional[datetime] = Query(None, alias="from"),
+    to_time: Optional[datetime] = Query(None, alias="to")
+):
+    """Page through an account's trades, newest first, optionally within a time range."""
+    account = get_account(account_id)
+
+    ledger = trade_history.get(account.id)
+    if ledger is None:
+        return {"account_id": account_id, "trades": [], "next_cursor": None}
+
+    page = ledger.page(
+        limit=limit,
+        cursor=cursor,
+        start=to_epoch(from_time) if from_time else None,
+        end=to_epoch(to_time) if to_time else None
+    )
+    page["trades"] = [trade_to_response(account.id, trade) for trade in page["trades"]]
+    return {"account_id": account_id, **page}
+
+@app.get("/api/v1/paper-trading/accounts/{account_id}/trades/aggregate")
+async def get_trade_aggregates(
+    account_id: str,
+    group_by: str = Query("day", pattern="^(day|symbol)$"),
+    from_time: Optional[datetime] = Query(None, alias="from"),
+    to_time: Optional[datetime] = Query(None, alias="to")
+):
+    """Realized P&L, trade count and win rate of closed trades by day or symbol."""
+    account = get_account(account_id)
+
+    ledger = trade_history.get(account.id)
+    groups = []
+    if ledger is not None:
+        groups = ledger.aggregate(
+            group_by=group_by,
+            start=to_epoch(from_time) if from_time else None,
+            end=to_epoch(to_time) if to_time else None
+        )
+    return {"account_id": account_id, "group_by": group_by, "groups": groups}
+
+@app.get("/api/v1/paper-trading/risk/report")
+async def get_risk_report(limit: int = Query(100, ge=1, le=10000), max_margin_level: Optional[float] = None):
+    """Revalue every open position at once and rank accounts by margin level.
+
+    Unrealized P&L and margin per account are computed from the position book
+    in a single vectorized pass; accounts without margin in use are left out.
+    """
+    unrealized, margin = position_book.account_totals(max(paper_accounts, default=0) + 1)
+    account_ids = np.flatnonzero(margin > 1e-9)
+
+    balances = np.array([paper_accounts[account_id].balance for account_id in account_ids.tolist()])
+    equity = balances + unrealized[account_ids]
+    levels = equity / margin[account_ids] * 100
+
+    selected = np.argsort(levels)
+    if max_margin_level is not None:
+        selected = selected[levels[selected] <= max_margin_level]
+
+    accounts = [
+        {
+            "account_id": str(account_ids[i]),
+            "equity": float(equity[i]),
+            "unrealized_pnl": float(unrealized[account_ids[i]]),
+            "margin_used": float(margin[account_ids[i]]),
+            "margin_level": float(levels[i]),
+            "margin_call": bool(levels[i] <= MARGIN_CALL_LEVEL)
+        }
+        for i in selected[:limit].tolist()
+    ]
+
+    return {
+        "open_positions": len(position_book),
+        "accounts_with_margin": len(account_ids),
+        "margin_calls": int(np.count_nonzero(levels <= MARGIN_CALL_LEVEL)),
+        "total_unrealized_pnl": float(unrealized.sum()),
+        "total_margin_used": float(margin.sum()),
+        "symbol_exposure": position_book.symbol_exposure(),
+        "accounts": accounts
+    }
+
 @app.get("/api/v1/paper-trading/market/prices")
 async def get_market_prices(symbols: Optional[str] = None):
     """Get current market prices."""
@@ -604,16 +1336,36 @@ async def get_market_prices(symbols: Optional[str] = None):
         for price_dict in ASSET_TYPES.values():
             symbol_list.extend(price_dict.keys())
 
-    prices = {}
-    for symbol in symbol_list:
-        try:
-            prices[symbol] = await get_current_price(symbol)
-        except HTTPException:
-            # Skip symbols that can't be found
-            continue
+    # Quotes are kept current by the price feed; unknown symbols are skipped
+    prices = {symbol: latest_quotes[symbol] for symbol in symbol_list if symbol in latest_quotes}
 
     return {"prices": prices}
 
+@app.get("/api/v1/paper-trading/market/instruments")
+async def get_instruments(symbols: str):
+    """Quote, contract size and margin per unit of quantity for each symbol."""
+    instruments = {}
+    for symbol in symbols.split(","):
+        quote = latest_quotes.get(symbol)
+        if quote is None:
+            continue
+        asset_type = SYMBOL_ASSET_TYPES.get(symbol, "unknown")
+        contract_size = get_contract_size(symbol)
+        leverage = DEFAULT_LEVERAGE.get(asset_type, 10)
+        instruments[symbol] = {
+            "asset_type": asset_type,
+            "bid": quote["bid"],
+            "ask": quote["ask"],
+            "contract_size": contract_size,
+            "leverage": leverage,
+            # Same formula as order pricing, at the side's execution price
+            "margin_per_unit": {
+                "buy": quote["ask"] * contract_size / leverage,
+                "sell": quote["bid"] * contract_size / leverage
+            }
+        }
+    return {"instruments": instruments}
+
 @app.get("/api/v1/paper-trading/market/symbols")
 async def get_available_symbols(asset_type: Optional[str] = None):
     """Get available trading symbols, optionally filtered by asset type."""
@@ -653,32 +1405,70 @@ async def get_asset_types():
         "details": asset_info
     }
 
+@app.post("/api/v1/paper-trading/replay")
+async def start_replay(request: ReplayRequest):
+    """Replace the simulated feed with a recorded price file at the given speed."""
+    try:
+        speed = parse_speed(request.speed)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="speed must be a positive number or 'max'")
+
+    replay = PriceReplay(resolve_replay_file(request.file), speed, publish_replay_tick)
+    await start_price_source(replay)
+    return {"message": "Replay started", "replay": replay.status()}
+
+@app.get("/api/v1/paper-trading/replay")
+async def get_replay_status():
+    """Progress of the current replay."""
+    if price_replay is None:
+        return {"source": "simulated", "replay": None}
+    return {"source": "replay", "replay": price_replay.status()}
+
+@app.delete("/api/v1/paper-trading/replay")
+async def stop_replay():
+    """Stop the replay and resume the simulated feed."""
+    await start_price_source(None)
+    return {"message": "Replay stopped", "source": "simulated"}
+
+@app.get("/api/v1/paper-trading/shards")
+async def get_shard_stats():
+    """Queue depth and processed mutations per account shard of this worker."""
+    return {
+        "worker_index": WORKER_INDEX,
+        "worker_count": WORKER_COUNT,
+        "shards": shards.stats()
+    }
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
     return {"status": "healthy", "service": "paper-trading"}
 
-# Background tasks
-async def update_positions(account_id: str):
-    """Update all positions for an account."""
-    if account_id not in paper_accounts:
-        return
-
-    account = paper_accounts[account_id]
-    total_unrealized_pnl = 0
-
-    # Update all open positions
-    for position in paper_positions.values():
-        if position["account_id"] == account_id and position["status"] == "open":
-            price_data = await get_current_price(position["symbol"])
-            current_price = price_data["bid"] if position["side"] == "buy" else price_data["ask"]
-            pnl_data = await calculate_pnl(position, current_price)
-            position.update(pnl_data)
-            total_unrealized_pnl += pnl_data["unrealized_pnl"]
-
-    # Update account equity
-    account["equity"] = account["balance"] + total_unrealized_pnl
-    account["free_margin"] = account["equity"] - account["margin_used"]
+@app.on_event("startup")
+async def startup_event():
+    """Recover state from the event log and start the log writer and price feed."""
+    replayed = event_log.recover(restore_snapshot, apply_event)
+    restore_id_sequences()
+    rebuild_valuation_indexes()
+    logger.info("Recovered %d paper accounts (%d events replayed)", len(paper_accounts), replayed)
+    await event_log.start(snapshot_state)
+    if fill_bus is not None:
+        await fill_bus.start()
+
+    replay = None
+    if PRICE_SOURCE == "replay" and REPLAY_FILE:
+        replay = PriceReplay(REPLAY_FILE, parse_speed(REPLAY_SPEED), publish_replay_tick)
+    await start_price_source(replay)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the price feed, drain the shard queues and flush pending events to disk."""
+    if price_feed_task is not None:
+        price_feed_task.cancel()
+    await shards.stop()
+    await event_log.stop()
+    if fill_bus is not None:
+        await fill_bus.stop()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8005)
\ No newline at end of file
@@ -0,0 +1,311 @@
+"""
+Compact records for paper trading accounts, orders and positions.
+
+Records use __slots__, integer ids and epoch timestamps. They are turned into
+JSON-ready dicts only at the API boundary (`to_dict`), and into flat lists for
+the event log and snapshots (`to_state` / `from_state`).
+"""
+
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+from ledger import to_iso
+from lots import LotQueue
+
+# Accounts mostly share the same few asset-type selections, so share the sets too
+_asset_type_sets: Dict[FrozenSet[str], FrozenSet[str]] = {}
+
+
+def shared_asset_types(asset_types: Iterable[str]) -> FrozenSet[str]:
+    key = frozenset(asset_types)
+    return _asset_type_sets.setdefault(key, key)
+
+
+class Record:
+    """Base for slotted records whose state is the list of their slot values.
+
+    Slots added later go at the end with a value in `_defaults`, so states
+    written before they existed still load.
+    """
+
+    __slots__ = ()
+    _defaults: Dict[str, Any] = {}
+
+    def to_state(self) -> List[Any]:
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_state(cls, state: List[Any]):
+        record = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, state):
+            setattr(record, name, value)
+        for name in cls.__slots__[len(state):]:
+            setattr(record, name, cls._defaults[name])
+        return record
+
+
+class TradingStats(Record):
+    __slots__ = (
+        "total_trades", "winning_trades", "losing_trades",
+        "avg_win", "avg_loss", "largest_win", "largest_loss",
+    )
+
+    def __init__(self):
+        self.total_trades = 0
+        self.winning_trades = 0
+        self.losing_trades = 0
+        self.avg_win = 0.0
+        self.avg_loss = 0.0
+        self.largest_win = 0.0
+        self.largest_loss = 0.0
+
+    @property
+    def win_rate(self) -> float:
+        return (self.winning_trades / self.total_trades) * 100 if self.total_trades > 0 else 0.0
+
+    def record(self, pnl: float):
+        """Fold a realized P&L into the running statistics."""
+        self.total_trades += 1
+        if pnl > 0:
+            self.winning_trades += 1
+            self.avg_win = (self.avg_win * (self.winning_trades - 1) + pnl) / self.winning_trades
+            self.largest_win = max(self.largest_win, pnl)
+        else:
+            self.losing_trades += 1
+            self.avg_loss = (self.avg_loss * (self.losing_trades - 1) + abs(pnl)) / self.losing_trades
+            self.largest_loss = max(self.largest_loss, abs(pnl))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_trades": self.total_trades,
+            "winning_trades": self.winning_trades,
+            "losing_trades": self.losing_trades,
+            "win_rate": self.win_rate,
+            "avg_win": self.avg_win,
+            "avg_loss": self.avg_loss,
+            "largest_win": self.largest_win,
+            "largest_loss": self.largest_loss,
+        }
+
+
+class Account(Record):
+    __slots__ = (
+        "id", "user_id", "balance", "initial_balance", "account_currency", "leverage",
+        "margin_used", "equity", "free_margin", "unrealized_pnl", "margin_level",
+        "margin_call", "total_pnl", "created_at", "status", "allowed_asset_types", "stats",
+        "position_mode",
+    )
+    _defaults = {"position_mode": "hedging"}
+
+    def __init__(self, id: int, user_id: int, initial_balance: float, account_currency: str,
+                 leverage: int, allowed_asset_types: Iterable[str], created_at: float,
+                 position_mode: str = "hedging"):
+        self.id = id
+        self.user_id = user_id
+        self.balance = initial_balance
+        self.initial_balance = initial_balance
+        self.account_currency = account_currency
+        self.leverage = leverage
+        self.margin_used = 0.0
+        self.equity = initial_balance
+        self.free_margin = initial_balance
+        self.unrealized_pnl = 0.0
+        self.margin_level: Optional[float] = None
+        self.margin_call = False
+        self.total_pnl = 0.0
+        self.created_at = created_at
+        self.status = "active"
+        self.allowed_asset_types = shared_asset_types(allowed_asset_types)
+        self.stats = TradingStats()
+        self.position_mode = position_mode
+
+    def to_state(self) -> List[Any]:
+        state = super().to_state()
+        state[self.__slots__.index("allowed_asset_types")] = sorted(self.allowed_asset_types)
+        state[self.__slots__.index("stats")] = self.stats.to_state()
+        return state
+
+    @classmethod
+    def from_state(cls, state: List[Any]) -> "Account":
+        account = super().from_state(state)
+        account.allowed_asset_types = shared_asset_types(account.allowed_asset_types)
+        account.stats = TradingStats.from_state(account.stats)
+        return account
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": str(self.id),
+            "user_id": self.user_id,
+            "balance": self.balance,
+            "initial_balance": self.initial_balance,
+            "account_currency": self.account_currency,
+            "leverage": self.leverage,
+            "margin_used": self.margin_used,
+            "equity": self.equity,
+            "free_margin": self.free_margin,
+            "unrealized_pnl": self.unrealized_pnl,
+            "margin_level": self.margin_level,
+            "margin_call": self.margin_call,
+            "total_pnl": self.total_pnl,
+            "created_at": to_iso(self.created_at),
+            "status": self.status,
+            "allowed_asset_types": sorted(self.allowed_asset_types),
+            "trading_stats": self.stats.to_dict(),
+            "position_mode": self.position_mode,
+        }
+
+
+class Order(Record):
+    __slots__ = (
+        "id", "account_id", "symbol", "asset_type", "order_type", "side", "quantity",
+        "price", "stop_loss", "take_profit", "status", "filled_at", "required_margin",
+        "contract_size", "leverage_used",
+    )
+
+    def __init__(self, id: int, account_id: int, symbol: str, asset_type: str, order_type: str,
+                 side: str, quantity: float, price: float, stop_loss: Optional[float],
+                 take_profit: Optional[float], filled_at: float, required_margin: float,
+                 contract_size: float, leverage_used: int):
+        self.id = id
+        self.account_id = account_id
+        self.symbol = symbol
+        self.asset_type = asset_type
+        self.order_type = order_type
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.status = "filled"
+        self.filled_at = filled_at
+        self.required_margin = required_margin
+        self.contract_size = contract_size
+        self.leverage_used = leverage_used
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": str(self.id),
+            "account_id": str(self.account_id),
+            "symbol": self.symbol,
+            "asset_type": self.asset_type,
+            "order_type": self.order_type,
+            "side": self.side,
+            "quantity": self.quantity,
+            "price": self.price,
+            "stop_loss": self.stop_loss,
+            "take_profit": self.take_profit,
+            "status": self.status,
+            "filled_at": to_iso(self.filled_at),
+            "required_margin": self.required_margin,
+            "contract_size": self.contract_size,
+            "leverage_used": self.leverage_used,
+        }
+
+
+class Position(Record):
+    __slots__ = (
+        "id", "account_id", "order_id", "symbol", "asset_type", "side", "quantity",
+        "entry_price", "stop_loss", "take_profit", "margin_used", "contract_size",
+        "leverage_used", "opened_at", "status", "close_price", "closed_at",
+        "realized_pnl", "close_reason", "lots",
+    )
+    _defaults = {"lots": None}
+
+    def __init__(self, id: int, account_id: int, order_id: int, symbol: str, asset_type: str,
+                 side: str, quantity: float, entry_price: float, stop_loss: Optional[float],
+                 take_profit: Optional[float], margin_used: float, contract_size: float,
+                 leverage_used: int, opened_at: float, lots: Optional[LotQueue] = None):
+        self.id = id
+        self.account_id = account_id
+        self.order_id = order_id
+        self.symbol = symbol
+        self.asset_type = asset_type
+        self.side = side
+        self.quantity = quantity
+        self.entry_price = entry_price
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.margin_used = margin_used
+        self.contract_size = contract_size
+        self.leverage_used = leverage_used
+        self.opened_at = opened_at
+        self.status = "open"
+        self.close_price: Optional[float] = None
+        self.closed_at: Optional[float] = None
+        self.realized_pnl: Optional[float] = None
+        self.close_reason: Optional[str] = None
+        # FIFO lots of a netting position; hedging positions are a single lot
+        self.lots = lots
+
+    def to_state(self, lots: bool = True) -> List[Any]:
+        """Flat state; with `lots` False the lots are left out, as in per-fill log records."""
+        state = super().to_state()
+        state[-1] = self.lots.to_state() if lots and self.lots is not None else None
+        return state
+
+    @classmethod
+    def from_state(cls, state: List[Any]) -> "Position":
+        position = super().from_state(state)
+        if position.lots is not None:
+            position.lots = LotQueue.from_state(position.lots)
+        return position
+
+    @property
+    def direction(self) -> int:
+        return 1 if self.side == "buy" else -1
+
+    def pnl_at(self, price: float) -> float:
+        """Unrealized P&L of the position at the given price."""
+        return self.direction * (price - self.entry_price) * self.quantity * self.contract_size
+
+    def to_dict(self, current_price: Optional[float] = None,
+                unrealized_pnl: Optional[float] = None) -> Dict[str, Any]:
+        """Serialize the position, marking it at current_price when given.
+
+        A P&L already computed for that price (e.g. vectorized) can be passed in.
+        """
+        position = {
+            "id": str(self.id),
+            "account_id": str(self.account_id),
+            "order_id": str(self.order_id),
+            "symbol": self.symbol,
+            "asset_type": self.asset_type,
+            "side": self.side,
+            "quantity": self.quantity,
+            "entry_price": self.entry_price,
+            "stop_loss": self.stop_loss,
+            "take_profit": self.take_profit,
+            "margin_used": self.margin_used,
+            "contract_size": self.contract_size,
+            "leverage_used": self.leverage_used,
+            "opened_at": to_iso(self.opened_at),
+            "status": self.status,
+        }
+        if current_price is not None:
+            pnl = self.pnl_at(current_price) if unrealized_pnl is None else unrealized_pnl
+            position["current_price"] = current_price
+            position["unrealized_pnl"] = pnl
+            position["pnl_percentage"] = (pnl / self.margin_used) * 100 if self.margin_used > 0 else 0
+        if self.lots is not None:
+            position["lots"] = len(self.lots)
+        if self.realized_pnl is not None:
+            # Partial closes realize P&L while the position stays open
+            position["realized_pnl"] = self.realized_pnl
+        if self.status != "open":
+            position["close_price"] = self.close_price
+            position["closed_at"] = to_iso(self.closed_at)
+            if self.close_reason:
+                position["close_reason"] = self.close_reason
+        return position
+
+
+class Exposure:
+    """Per-account, per-symbol long and short units with their cost basis."""
+
+    __slots__ = ("long_units", "long_cost", "short_units", "short_cost", "unrealized_pnl")
+
+    def __init__(self):
+        self.long_units = 0.0
+        self.long_cost = 0.0
+        self.short_units = 0.0
+        self.short_cost = 0.0
+        self.unrealized_pnl = 0.0
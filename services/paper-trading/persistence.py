@@ -0,0 +1,189 @@
+"""
+Durable state for the Paper Trading service.
+
+Every state change is appended to a write-ahead log (WAL) made of JSON lines.
+Appends only buffer the encoded event in memory; a background writer task
+flushes the buffer in batches and fsyncs once per batch, so requests never
+wait on disk I/O. The full state is snapshotted periodically and the log is
+rotated at the snapshot sequence number, so recovery replays at most
+``snapshot_every`` events on top of the latest snapshot.
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+SNAPSHOT_PREFIX = "snapshot-"
+SEGMENT_PREFIX = "wal-"
+
+
+class EventLog:
+    """Append-only event log with batched fsync and periodic snapshots."""
+
+    def __init__(
+        self,
+        data_dir: str,
+        flush_interval: float = 0.05,
+        batch_size: int = 1000,
+        snapshot_every: int = 100000,
+    ):
+        self.data_dir = data_dir
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.snapshot_every = snapshot_every
+
+        self._seq = 0
+        self._buffer: List[str] = []
+        self._segment = None
+        self._events_since_snapshot = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._snapshot_provider: Optional[Callable[[], Dict[str, Any]]] = None
+        self._stopping = False
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the last appended event."""
+        return self._seq
+
+    def append(self, event_type: str, data: Dict[str, Any]) -> int:
+        """Record an event. Encoding happens now, I/O happens in the writer task."""
+        self._seq += 1
+        self._buffer.append(json.dumps({"seq": self._seq, "type": event_type, "data": data}))
+        if self._wakeup is not None and len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        return self._seq
+
+    def recover(self, apply_snapshot: Callable[[Dict[str, Any]], None],
+                apply_event: Callable[[str, Dict[str, Any]], None]) -> int:
+        """Load the latest snapshot and replay the log written after it.
+
+        Returns the number of events replayed.
+        """
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        snapshot_seq = 0
+        snapshots = self._list_files(SNAPSHOT_PREFIX)
+        if snapshots:
+            snapshot_seq, path = snapshots[-1]
+            with open(path, "r") as f:
+                apply_snapshot(json.load(f)["state"])
+
+        replayed = 0
+        last_seq = snapshot_seq
+        for _, path in self._list_files(SEGMENT_PREFIX):
+            with open(path, "rb+") as f:
+                good_bytes = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated line")
+                        event = json.loads(line)
+                    except ValueError:
+                        # A torn write at the tail of the last segment; cut it
+                        # off, or events appended to the segment after restart
+                        # would follow it and be lost on the next recovery
+                        f.truncate(good_bytes)
+                        break
+                    good_bytes += len(line)
+                    if event["seq"] <= last_seq:
+                        continue
+                    apply_event(event["type"], event["data"])
+                    last_seq = event["seq"]
+                    replayed += 1
+
+        self._seq = last_seq
+        self._events_since_snapshot = replayed
+        return replayed
+
+    async def start(self, snapshot_provider: Callable[[], Dict[str, Any]]):
+        """Start the background writer."""
+        os.makedirs(self.data_dir, exist_ok=True)
+        self._snapshot_provider = snapshot_provider
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._open_segment(self._seq + 1)
+        self._writer_task = asyncio.create_task(self._run_writer())
+
+    async def stop(self):
+        """Flush pending events and stop the background writer."""
+        if self._writer_task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._writer_task
+        self._writer_task = None
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    async def _run_writer(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            if self._buffer:
+                batch, self._buffer = self._buffer, []
+                await asyncio.to_thread(self._write_batch, batch)
+                self._events_since_snapshot += len(batch)
+
+            if self._events_since_snapshot >= self.snapshot_every:
+                await self._snapshot()
+
+            if self._stopping and not self._buffer:
+                return
+
+    def _write_batch(self, batch: List[str]):
+        self._segment.write("\n".join(batch) + "\n")
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+
+    async def _snapshot(self):
+        # The sequence number, the pending events and the state copy are taken
+        # together before any await, so events appended while the flush runs
+        # land after the snapshot (in the next segment) and not also inside it.
+        # Serialization and disk I/O run in a worker thread.
+        seq = self._seq
+        pending, self._buffer = self._buffer, []
+        state = self._snapshot_provider()
+        if pending:
+            await asyncio.to_thread(self._write_batch, pending)
+        self._segment.close()
+        self._open_segment(seq + 1)
+        self._events_since_snapshot = 0
+        await asyncio.to_thread(self._write_snapshot, seq, state)
+
+    def _write_snapshot(self, seq: int, state: Dict[str, Any]):
+        path = os.path.join(self.data_dir, f"{SNAPSHOT_PREFIX}{seq:020d}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"seq": seq, "state": state}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        # Everything at or below the snapshot is now redundant
+        for snapshot_seq, old_path in self._list_files(SNAPSHOT_PREFIX):
+            if snapshot_seq < seq:
+                os.remove(old_path)
+        for first_seq, old_path in self._list_files(SEGMENT_PREFIX):
+            if first_seq <= seq:
+                os.remove(old_path)
+
+    def _open_segment(self, first_seq: int):
+        path = os.path.join(self.data_dir, f"{SEGMENT_PREFIX}{first_seq:020d}.log")
+        self._segment = open(path, "a")
+
+    def _list_files(self, prefix: str):
+        files = []
+        for name in os.listdir(self.data_dir):
+            if name.startswith(prefix) and not name.endswith(".tmp"):
+                number = name[len(prefix):].split(".", 1)[0]
+                if number.isdigit():
+                    files.append((int(number), os.path.join(self.data_dir, name)))
+        files.sort()
+        return files
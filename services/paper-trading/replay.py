@@ -0,0 +1,158 @@
+"""
+Historical price replay for the Paper Trading service.
+
+Recorded ticks or bars are streamed from CSV files and published through the
+same quote path the simulated feed uses, so orders, valuations and stop-outs
+behave as they would live. Files are memory-mapped and read line by line,
+so multi-gigabyte tick files are never loaded into memory.
+
+Supported columns (header row required, any order, extra columns ignored):
+
+- ticks: ``timestamp,symbol,bid,ask``
+- bars:  ``timestamp,symbol,close`` with optional ``open,high,low``
+
+Timestamps are epoch seconds or ISO 8601. Bars are replayed as their
+open, intrabar extremes and close, so stop-outs see the bar's range.
+"""
+
+import asyncio
+import logging
+import mmap
+import time
+from typing import Callable, Iterator, Optional, Tuple
+
+from ledger import to_epoch, to_iso
+
+# (timestamp, symbol, bid, ask); ask is None when only a mid price is known
+Tick = Tuple[float, str, float, Optional[float]]
+
+logger = logging.getLogger(__name__)
+
+
+def parse_speed(value) -> float:
+    """Replay speed multiplier; 'max' (or 0) replays as fast as possible."""
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ("max", "0", ""):
+            return 0.0
+        if value.endswith("x"):
+            value = value[:-1]
+    speed = float(value)
+    if speed < 0:
+        raise ValueError("Replay speed must be positive or 'max'")
+    return speed
+
+
+def _parse_time(value: bytes) -> float:
+    text = value.decode()
+    try:
+        return float(text)
+    except ValueError:
+        return to_epoch(text)
+
+
+def iter_ticks(path: str) -> Iterator[Tick]:
+    """Stream ticks from a tick or bar CSV file without reading it into memory."""
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return
+        with data:
+            header = [name.strip().lower() for name in data.readline().decode().split(",")]
+            columns = {name: index for index, name in enumerate(header)}
+            if "timestamp" not in columns or "symbol" not in columns:
+                raise ValueError(f"{path}: header must include timestamp and symbol")
+
+            time_col, symbol_col = columns["timestamp"], columns["symbol"]
+            if "bid" in columns and "ask" in columns:
+                bid_col, ask_col = columns["bid"], columns["ask"]
+                for line in iter(data.readline, b""):
+                    fields = line.rstrip(b"\r\n").split(b",")
+                    if len(fields) < len(header):
+                        continue
+                    yield (_parse_time(fields[time_col]), fields[symbol_col].decode(),
+                           float(fields[bid_col]), float(fields[ask_col]))
+            elif "close" in columns:
+                price_cols = [columns[name] for name in ("open", "high", "low") if name in columns]
+                open_col = columns.get("open")
+                close_col = columns["close"]
+                for line in iter(data.readline, b""):
+                    fields = line.rstrip(b"\r\n").split(b",")
+                    if len(fields) < len(header):
+                        continue
+                    timestamp = _parse_time(fields[time_col])
+                    symbol = fields[symbol_col].decode()
+                    close = float(fields[close_col])
+                    if price_cols:
+                        prices = [float(fields[col]) for col in price_cols]
+                        first = float(fields[open_col]) if open_col is not None else prices[0]
+                        low, high = min(prices + [close]), max(prices + [close])
+                        # Bullish bars are assumed to dip first, bearish bars to spike first
+                        path_prices = (first, low, high) if close >= first else (first, high, low)
+                        for price in path_prices:
+                            yield (timestamp, symbol, price, None)
+                    yield (timestamp, symbol, close, None)
+            else:
+                raise ValueError(f"{path}: header must include bid and ask, or close")
+
+
+class PriceReplay:
+    """Publishes a recorded price file at a multiple of its original pace."""
+
+    def __init__(self, path: str, speed: float, publish: Callable[[float, str, float, Optional[float]], bool],
+                 yield_every: int = 1000):
+        self.path = path
+        self.speed = speed
+        self.publish = publish
+        self.yield_every = yield_every
+
+        self.published = 0
+        self.skipped = 0
+        self.market_time: Optional[float] = None
+        self.finished = False
+        self.error: Optional[str] = None
+
+    async def run(self):
+        start_wall = None
+        start_market = None
+        try:
+            for timestamp, symbol, bid, ask in iter_ticks(self.path):
+                if start_wall is None:
+                    start_wall, start_market = time.monotonic(), timestamp
+
+                delay = 0.0
+                if self.speed > 0:
+                    delay = (timestamp - start_market) / self.speed - (time.monotonic() - start_wall)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif (self.published + self.skipped) % self.yield_every == 0:
+                    # Let requests in between ticks when replaying flat out or behind schedule
+                    await asyncio.sleep(0)
+
+                self.market_time = timestamp
+                if self.publish(timestamp, symbol, bid, ask):
+                    self.published += 1
+                else:
+                    self.skipped += 1
+        except (OSError, ValueError) as e:
+            # Missing, unreadable or malformed price files
+            self.error = str(e)
+            logger.error("Replay of %s stopped: %s", self.path, e)
+        except Exception as e:
+            # A tick the quote path could not publish
+            self.error = f"{type(e).__name__}: {e}"
+            logger.exception("Replay of %s stopped at market time %s", self.path, self.market_time)
+        self.finished = True
+
+    def status(self):
+        return {
+            "file": self.path,
+            "speed": self.speed or "max",
+            "published": self.published,
+            "skipped": self.skipped,
+            "market_time": to_iso(self.market_time) if self.market_time is not None else None,
+            "finished": self.finished,
+            "error": self.error,
+        }
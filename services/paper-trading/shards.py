@@ -0,0 +1,141 @@
+"""
+Account sharding for the Paper Trading service.
+
+Accounts are hashed onto a fixed number of shards. Each shard is an actor: a
+single asyncio task draining its own queue, so every mutation of an account
+runs to completion before the next one on the same shard starts, while
+different shards make progress independently and no global lock is needed.
+Work that touches another account, such as a stop-out found while handling
+an order, is dispatched to that account's shard instead of run in place.
+
+Price ticks are the one exception: they re-mark every holder's unrealized
+P&L, equity and margin level directly, without queueing on the holders'
+shards. Shard work items are plain functions that run to completion without
+awaiting, and ticks are published on the same event loop, so a tick always
+lands between two work items and never inside one. Queueing a job per holder
+per tick would instead put every account's orders behind a backlog of
+revaluations. Anything that acts on a revaluation, such as a stop-out, still
+goes through the account's shard.
+
+The same integer ids can also be partitioned across worker processes: each
+worker allocates ids from its own stripe (id % worker_count), so the worker
+owning any account, order or position follows from the id alone and a load
+balancer can route requests by id.
+"""
+
+import asyncio
+from typing import Any, Callable, List, Optional
+
+_MASK = (1 << 64) - 1
+
+
+def stable_hash(key: int) -> int:
+    """Mix an integer id (splitmix64 finalizer) so striped ids spread over shards."""
+    key = (key + 0x9E3779B97F4A7C15) & _MASK
+    key = ((key ^ (key >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    key = ((key ^ (key >> 27)) * 0x94D049BB133111EB) & _MASK
+    return key ^ (key >> 31)
+
+
+class ShardedExecutor:
+    """Runs submitted functions on the actor task of the key's shard."""
+
+    def __init__(self, shard_count: int):
+        self.shard_count = shard_count
+        self._queues: List[Optional[asyncio.Queue]] = [None] * shard_count
+        self._tasks: List[Optional[asyncio.Task]] = [None] * shard_count
+        self.processed = [0] * shard_count
+
+    def shard_of(self, key: int) -> int:
+        return stable_hash(key) % self.shard_count
+
+    async def submit(self, key: int, fn: Callable[..., Any], *args) -> Any:
+        """Run fn(*args) on the key's shard and return its result or raise its error."""
+        return await self.dispatch(key, fn, *args)
+
+    def dispatch(self, key: int, fn: Callable[..., Any], *args) -> asyncio.Future:
+        """Queue fn(*args) on the key's shard without waiting; returns the future of its result.
+
+        Must be called from the event loop, e.g. from a function running on another shard.
+        """
+        return self._enqueue(self.shard_of(key), fn, args)
+
+    def _enqueue(self, shard: int, fn: Callable[..., Any], args: tuple) -> asyncio.Future:
+        queue = self._queues[shard]
+        if queue is None:
+            # Actors start on first use, inside the running event loop
+            queue = self._queues[shard] = asyncio.Queue()
+            self._tasks[shard] = asyncio.create_task(self._run(shard, queue))
+
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((fn, args, future))
+        return future
+
+    def shard_task(self, key: int) -> Optional[asyncio.Task]:
+        """The actor task of the key's shard, if it has started."""
+        return self._tasks[self.shard_of(key)]
+
+    async def drain(self):
+        """Wait until every queue is empty, including work queued by work that ran meanwhile."""
+        while any(queue is not None and queue.qsize() for queue in self._queues):
+            await asyncio.gather(*(
+                self._enqueue(shard, lambda: None, ())
+                for shard, queue in enumerate(self._queues) if queue is not None
+            ))
+
+    async def _run(self, shard: int, queue: asyncio.Queue):
+        while True:
+            fn, args, future = await queue.get()
+            if fn is None:
+                return
+            try:
+                result = fn(*args)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+            self.processed[shard] += 1
+
+    def stats(self) -> List[dict]:
+        return [
+            {
+                "shard": shard,
+                "queued": queue.qsize() if queue is not None else 0,
+                "processed": self.processed[shard]
+            }
+            for shard, queue in enumerate(self._queues)
+        ]
+
+    async def stop(self):
+        """Let every actor finish its queued work, then stop it."""
+        for shard, queue in enumerate(self._queues):
+            if queue is not None:
+                queue.put_nowait((None, (), None))
+        tasks = [task for task in self._tasks if task is not None]
+        if tasks:
+            await asyncio.gather(*tasks)
+        self._queues = [None] * self.shard_count
+        self._tasks = [None] * self.shard_count
+
+
+class WorkerPartition:
+    """Striped id ownership across worker processes."""
+
+    def __init__(self, worker_count: int = 1, worker_index: int = 0):
+        if not 0 <= worker_index < worker_count:
+            raise ValueError("worker_index must be in [0, worker_count)")
+        self.worker_count = worker_count
+        self.worker_index = worker_index
+
+    def owner(self, entity_id: int) -> int:
+        return (entity_id - 1) % self.worker_count
+
+    def owns(self, entity_id: int) -> bool:
+        return self.owner(entity_id) == self.worker_index
+
+    def next_id(self, after: int = 0) -> int:
+        """Smallest id owned by this worker that is greater than `after`."""
+        candidate = after + 1
+        return candidate + (self.worker_index - self.owner(candidate)) % self.worker_count
@@ -0,0 +1,128 @@
+"""
+Vectorized revaluation of open positions for the Paper Trading service.
+
+Open positions are held as parallel NumPy columns (symbol index, side sign,
+quantity, entry price, contract size, margin, account id) next to bid/ask
+price vectors indexed by symbol. Marking any set of positions, an account
+with hundreds of positions or the whole book, is one gather from the price
+vectors and one multiply instead of a Python loop per position.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+class PositionBook:
+    """Columnar store of open positions with per-symbol bid/ask vectors."""
+
+    def __init__(self, symbols: Iterable[str], capacity: int = 1024):
+        self.symbols: List[str] = list(symbols)
+        self.symbol_index: Dict[str, int] = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.bids = np.zeros(len(self.symbols))
+        self.asks = np.zeros(len(self.symbols))
+
+        self.size = 0
+        self.position_ids = np.zeros(capacity, dtype=np.int64)
+        self.account_ids = np.zeros(capacity, dtype=np.int64)
+        self.symbol_ids = np.zeros(capacity, dtype=np.int32)
+        self.signs = np.zeros(capacity, dtype=np.int8)
+        self.quantities = np.zeros(capacity)
+        self.entry_prices = np.zeros(capacity)
+        self.contract_sizes = np.zeros(capacity)
+        self.margins = np.zeros(capacity)
+        self._rows: Dict[int, int] = {}  # position_id -> row
+
+    _columns = (
+        "position_ids", "account_ids", "symbol_ids", "signs",
+        "quantities", "entry_prices", "contract_sizes", "margins",
+    )
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, position_id: int):
+        return position_id in self._rows
+
+    def set_quote(self, symbol: str, bid: float, ask: float):
+        index = self.symbol_index[symbol]
+        self.bids[index] = bid
+        self.asks[index] = ask
+
+    def clear(self):
+        self.size = 0
+        self._rows.clear()
+
+    def add(self, position_id: int, account_id: int, symbol: str, side: str, quantity: float,
+            entry_price: float, contract_size: float, margin: float):
+        if self.size == len(self.position_ids):
+            self._grow()
+        row = self.size
+        self.position_ids[row] = position_id
+        self.account_ids[row] = account_id
+        self.symbol_ids[row] = self.symbol_index[symbol]
+        self.signs[row] = 1 if side == "buy" else -1
+        self.quantities[row] = quantity
+        self.entry_prices[row] = entry_price
+        self.contract_sizes[row] = contract_size
+        self.margins[row] = margin
+        self._rows[position_id] = row
+        self.size += 1
+
+    def update(self, position_id: int, quantity: float, entry_price: float, margin: float):
+        """Apply a partial close or an added lot to an open position."""
+        row = self._rows[position_id]
+        self.quantities[row] = quantity
+        self.entry_prices[row] = entry_price
+        self.margins[row] = margin
+
+    def remove(self, position_id: int):
+        """Drop a position by moving the last row into its slot."""
+        row = self._rows.pop(position_id)
+        last = self.size - 1
+        if row != last:
+            for name in self._columns:
+                column = getattr(self, name)
+                column[row] = column[last]
+            self._rows[int(self.position_ids[row])] = row
+        self.size = last
+
+    def rows(self, position_ids: Iterable[int]) -> np.ndarray:
+        return np.fromiter((self._rows[position_id] for position_id in position_ids), dtype=np.int64)
+
+    def marks(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Close-out prices: the bid for longs and the ask for shorts."""
+        rows = slice(0, self.size) if rows is None else rows
+        symbol_ids = self.symbol_ids[rows]
+        return np.where(self.signs[rows] > 0, self.bids[symbol_ids], self.asks[symbol_ids])
+
+    def pnls(self, rows: Optional[np.ndarray] = None, marks: Optional[np.ndarray] = None) -> np.ndarray:
+        """Unrealized P&L of the given rows (all open positions by default)."""
+        rows = slice(0, self.size) if rows is None else rows
+        if marks is None:
+            marks = self.marks(rows)
+        return self.signs[rows] * (marks - self.entry_prices[rows]) * self.quantities[rows] * self.contract_sizes[rows]
+
+    def account_totals(self, account_count: int):
+        """Unrealized P&L and margin used per account id, as arrays indexed by id."""
+        n = self.size
+        account_ids = self.account_ids[:n]
+        unrealized = np.bincount(account_ids, weights=self.pnls(), minlength=account_count)
+        margin = np.bincount(account_ids, weights=self.margins[:n], minlength=account_count)
+        return unrealized, margin
+
+    def symbol_exposure(self) -> Dict[str, float]:
+        """Net units (long minus short) per symbol across the whole book."""
+        n = self.size
+        units = self.signs[:n] * self.quantities[:n] * self.contract_sizes[:n]
+        net = np.bincount(self.symbol_ids[:n], weights=units, minlength=len(self.symbols))
+        held = np.bincount(self.symbol_ids[:n], minlength=len(self.symbols))
+        return {self.symbols[i]: float(net[i]) for i in np.flatnonzero(held)}
+
+    def _grow(self):
+        capacity = len(self.position_ids) * 2
+        for name in self._columns:
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
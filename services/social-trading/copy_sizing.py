@@ -0,0 +1,55 @@
+"""
+Copy-trade sizing for the Social Trading service.
+
+Copiers of a trader are grouped into cohorts of followers with the same
+sizing rule for the traded symbol. Each cohort is sized in one vectorized
+pass over its followers' equity and free margin, as reported by paper
+trading, so copy orders that could not be margined are cut down or dropped
+before they are sent instead of being rejected one by one.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from follow_graph import CopySettings
+
+CohortKey = Tuple[Any, ...]
+
+
+def group_cohorts(copiers: Iterable[Tuple[str, CopySettings]], symbol: str) -> Dict[CohortKey, List[str]]:
+    """Follower ids grouped by their sizing rule for `symbol`."""
+    cohorts: Dict[CohortKey, List[str]] = {}
+    for follower_id, settings in copiers:
+        cohorts.setdefault(settings.cohort_key(symbol), []).append(follower_id)
+    return cohorts
+
+
+def size_cohort(key: CohortKey, leader_quantity: float, equity: np.ndarray, free_margin: np.ndarray,
+                leader_equity: Optional[float] = None, margin_per_unit: Optional[float] = None,
+                margin_buffer: float = 1.0, lot_step: Optional[float] = None) -> np.ndarray:
+    """Copy quantity for every follower of a cohort; 0 where nothing can be copied.
+
+    The copy percentage of the leader's quantity is scaled by follower equity
+    over leader equity for equity sizing, then capped by what `margin_buffer`
+    of the follower's free margin and their maximum exposure can carry and by
+    the symbol limit, and rounded down to a multiple of `lot_step`.
+    """
+    sizing, copy_percentage, max_exposure, symbol_limit = key
+    quantity = np.full(len(equity), leader_quantity * copy_percentage / 100.0)
+    if sizing == "equity" and leader_equity:
+        quantity *= equity / leader_equity
+
+    if margin_per_unit:
+        cap = free_margin * margin_buffer / margin_per_unit
+        if max_exposure is not None:
+            cap = np.minimum(cap, equity * (max_exposure / 100.0) / margin_per_unit)
+        quantity = np.minimum(quantity, cap)
+    if symbol_limit is not None:
+        quantity = np.minimum(quantity, symbol_limit)
+
+    if lot_step:
+        # The tolerance keeps an exact multiple from being floored a step down
+        quantity = np.round(np.floor(quantity / lot_step + 1e-9) * lot_step, 10)
+
+    return np.where(quantity > 0, quantity, 0.0)
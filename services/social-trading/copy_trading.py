@@ -0,0 +1,81 @@
+"""
+Copy-trade fan-out for the Social Trading service.
+
+A leader's trade is expanded into one copy order per copying follower. The
+orders of one sizing cohort are queued together, split into batches, and a
+dispatcher task submits each batch as a single call to the paper trading
+batch order endpoint, with a bounded number of batches in flight, so a leader
+with tens of thousands of followers is copied in a handful of requests.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+SubmitBatch = Callable[[List[Dict[str, Any]]], Awaitable[Dict[str, Any]]]
+
+
+class CopyDispatcher:
+    """Queue of copy order batches, submitted by a background task."""
+
+    def __init__(self, submit_batch: SubmitBatch, batch_size: int = 1000, max_in_flight: int = 4):
+        self.submit_batch = submit_batch
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        self.stats = {"enqueued": 0, "batches": 0, "filled": 0, "rejected": 0, "failed": 0}
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._task = asyncio.create_task(self._run())
+
+    def enqueue(self, orders: List[Dict[str, Any]]):
+        """Queue the orders of one cohort; they are submitted in batches of their own."""
+        if self.queue is None:
+            self.start()
+        for start in range(0, len(orders), self.batch_size):
+            self.queue.put_nowait(orders[start:start + self.batch_size])
+        self.stats["enqueued"] += len(orders)
+
+    async def drain(self):
+        """Wait until every queued batch has been submitted."""
+        if self.queue is not None:
+            await self.queue.join()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        await self.drain()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.queue = None
+
+    async def _run(self):
+        while True:
+            batch = await self.queue.get()
+            await self._slots.acquire()
+            task = asyncio.create_task(self._submit(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _submit(self, batch: List[Dict[str, Any]]):
+        try:
+            result = await self.submit_batch(batch)
+            self.stats["filled"] += result.get("filled", 0)
+            self.stats["rejected"] += result.get("rejected", 0)
+        except Exception as e:
+            print(f"Error submitting copy batch of {len(batch)} orders: {e}")
+            self.stats["failed"] += len(batch)
+        finally:
+            self.stats["batches"] += 1
+            self._slots.release()
+            self.queue.task_done()
@@ -0,0 +1,186 @@
+"""
+Fill event consumption for the Social Trading service.
+
+Paper trading publishes every fill to a fill log with sequential offsets
+(its ``fill_bus`` module). The consumer here reads the log in batches from
+its last committed offset, hands each batch to a handler and commits the
+batch's last offset only once the handler has succeeded. Delivery is
+at-least-once: a failed batch is retried, and after a restart consumption
+resumes from the last commit, so a batch can be seen twice but never lost.
+Handlers drop repeats with ``RecentKeys``. A batch that keeps failing is
+split into single events, and an event that fails on its own is set aside
+as a dead letter so one poison event cannot stall the log.
+
+The consumer works with any source that has ``read``, ``wait``,
+``committed`` and ``commit``: paper trading's in-process memory bus on a
+single node, or ``SQLiteFillSource`` reading the log file paper trading
+writes when the services run as separate processes.
+"""
+
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+Event = Tuple[int, Dict[str, Any]]  # (offset, payload)
+Handler = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+
+class SQLiteFillSource:
+    """Reader side of the SQLite fill log, with consumer offsets in the same file."""
+
+    def __init__(self, path: str, poll_interval: float = 0.1):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # Same schema as paper trading's fill_bus, in case the consumer starts first
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS fills (
+                offset INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, published_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS consumer_offsets (
+                consumer TEXT PRIMARY KEY, offset INTEGER NOT NULL
+            );
+        """)
+
+    def read(self, after: int, limit: int) -> List[Event]:
+        rows = self.conn.execute(
+            "SELECT offset, payload FROM fills WHERE offset > ? ORDER BY offset LIMIT ?", (after, limit)
+        )
+        return [(offset, json.loads(payload)) for offset, payload in rows]
+
+    async def wait(self, after: int, timeout: float):
+        """Poll until an event after `after` is stored, or `timeout` seconds pass."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            row = self.conn.execute("SELECT 1 FROM fills WHERE offset > ? LIMIT 1", (after,)).fetchone()
+            if row is not None:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    def committed(self, consumer: str) -> int:
+        row = self.conn.execute("SELECT offset FROM consumer_offsets WHERE consumer = ?", (consumer,)).fetchone()
+        return row[0] if row else 0
+
+    def commit(self, consumer: str, offset: int):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO consumer_offsets VALUES (?, ?) "
+                "ON CONFLICT (consumer) DO UPDATE SET offset = excluded.offset",
+                (consumer, offset)
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+class RecentKeys:
+    """The last `max_keys` keys seen, for dropping events delivered twice."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self.keys: "OrderedDict[Hashable, None]" = OrderedDict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.keys
+
+    def add(self, key: Hashable):
+        self.keys[key] = None
+        self.keys.move_to_end(key)
+        if len(self.keys) > self.max_keys:
+            self.keys.popitem(last=False)
+
+
+class FillConsumer:
+    """Reads fills in batches and commits offsets after each handled batch."""
+
+    def __init__(self, source, name: str, handler: Handler, batch_size: int = 500,
+                 wait_timeout: float = 1.0, retry_delay: float = 1.0, max_attempts: int = 5,
+                 max_dead_letters: int = 1000):
+        self.source = source
+        self.name = name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.wait_timeout = wait_timeout
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+
+        self.offset = 0
+        self._attempts = 0  # Failed attempts of the batch after self.offset
+        self._task: Optional[asyncio.Task] = None
+        # Recent events that failed on their own: (offset, payload, error)
+        self.dead_letters: Deque[Tuple[int, Dict[str, Any], str]] = deque(maxlen=max_dead_letters)
+
+        self.stats = {"batches": 0, "events": 0, "failures": 0, "dead_lettered": 0, "missed": 0}
+
+    def start(self):
+        self.offset = self.source.committed(self.name)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def poll(self) -> int:
+        """Handle one batch if any is available; returns the number of events handled.
+
+        A batch that has failed `max_attempts` times is handled one event at a
+        time instead, and the events that still fail become dead letters.
+        """
+        batch = self.source.read(self.offset, self.batch_size)
+        if not batch:
+            return 0
+        missed = batch[0][0] - self.offset - 1
+        if missed > 0 and self._attempts == 0:
+            # The source dropped events before they were committed
+            print(f"Fill log skipped {missed} events after offset {self.offset}")
+            self.stats["missed"] += missed
+        if self._attempts >= self.max_attempts:
+            await self._handle_singly(batch)
+        else:
+            try:
+                await self.handler([payload for _, payload in batch])
+            except Exception:
+                self._attempts += 1
+                raise
+        self._attempts = 0
+        self.offset = batch[-1][0]
+        self.source.commit(self.name, self.offset)
+        self.stats["batches"] += 1
+        self.stats["events"] += len(batch)
+        return len(batch)
+
+    async def _handle_singly(self, batch: List[Event]):
+        for offset, payload in batch:
+            try:
+                await self.handler([payload])
+            except Exception as e:
+                print(f"Dead-lettering fill at offset {offset} after {self.max_attempts} failed batches: {e}")
+                self.dead_letters.append((offset, payload, str(e)))
+                self.stats["dead_lettered"] += 1
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.poll():
+                    continue
+            except Exception as e:
+                # Not committed, so the same batch is read again
+                print(f"Error handling fill batch after offset {self.offset}: {e}")
+                self.stats["failures"] += 1
+                await asyncio.sleep(self.retry_delay)
+                continue
+            await self.source.wait(self.offset, self.wait_timeout)
+
+    def status(self):
+        return {**self.stats, "consumer": self.name, "offset": self.offset,
+                "dead_letters": [offset for offset, _, _ in self.dead_letters]}
@@ -0,0 +1,143 @@
+"""
+Follow graph for the Social Trading service.
+
+Follows are indexed in both directions (trader -> followers and
+follower -> traders) with copy settings per follower/trader pair, so finding
+everyone who copies a trader is a single set lookup and one follower can copy
+several traders with different settings.
+
+With a FollowStore attached, every change is written through to SQLite and
+the sets act as an in-memory cache of the table, loaded once at startup;
+list pages are read from the table's indexes.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from follow_store import FollowStore
+
+
+class CopySettings:
+    """Copy trading settings of one follower for one trader.
+
+    `sizing` is "fixed" (copy_percentage of the trader's quantity) or
+    "equity" (additionally scaled by follower equity / trader equity).
+    `max_exposure` caps the margin one copied trade may use, in percent of
+    the follower's equity, and `symbol_limits` caps the copied quantity per
+    symbol.
+    """
+
+    __slots__ = ("enabled", "copy_percentage", "sizing", "max_exposure", "symbol_limits")
+
+    def __init__(self, enabled: bool = True, copy_percentage: float = 100.0, sizing: str = "fixed",
+                 max_exposure: Optional[float] = None, symbol_limits: Optional[Dict[str, float]] = None):
+        self.enabled = enabled
+        self.copy_percentage = copy_percentage
+        self.sizing = sizing
+        self.max_exposure = max_exposure
+        self.symbol_limits = symbol_limits or {}
+
+    def cohort_key(self, symbol: str) -> Tuple[Any, ...]:
+        """Followers with equal keys are sized by the same rule for this symbol."""
+        return (self.sizing, self.copy_percentage, self.max_exposure, self.symbol_limits.get(symbol))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "copy_percentage": self.copy_percentage,
+            "sizing": self.sizing,
+            "max_exposure": self.max_exposure,
+            "symbol_limits": self.symbol_limits,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CopySettings":
+        return cls(**data)
+
+
+class FollowGraph:
+    """Bidirectional follow index with per-pair copy settings."""
+
+    def __init__(self, store: Optional[FollowStore] = None):
+        self.store = store
+        self.followers: Dict[str, Set[str]] = {}   # trader_id -> follower_ids
+        self.following: Dict[str, Set[str]] = {}   # follower_id -> trader_ids
+        self.copy_settings: Dict[Tuple[str, str], CopySettings] = {}  # (follower_id, trader_id) -> settings
+
+    def load(self):
+        """Fill the cache from the store."""
+        for trader_id, follower_id, settings in self.store.rows():
+            self.followers.setdefault(trader_id, set()).add(follower_id)
+            self.following.setdefault(follower_id, set()).add(trader_id)
+            if settings is not None:
+                self.copy_settings[(follower_id, trader_id)] = CopySettings.from_dict(settings)
+
+    def is_following(self, follower_id: str, trader_id: str) -> bool:
+        return trader_id in self.following.get(follower_id, ())
+
+    def follow(self, follower_id: str, trader_id: str, settings: Optional[CopySettings] = None) -> bool:
+        """Add a follow; returns False if it already existed."""
+        traders = self.following.setdefault(follower_id, set())
+        if trader_id in traders:
+            return False
+        if self.store is not None:
+            self.store.add(follower_id, trader_id, settings.to_dict() if settings else None)
+        traders.add(trader_id)
+        self.followers.setdefault(trader_id, set()).add(follower_id)
+        if settings is not None:
+            self.copy_settings[(follower_id, trader_id)] = settings
+        return True
+
+    def unfollow(self, follower_id: str, trader_id: str) -> bool:
+        """Remove a follow and its copy settings; returns False if there was none."""
+        traders = self.following.get(follower_id)
+        if not traders or trader_id not in traders:
+            return False
+        if self.store is not None:
+            self.store.remove(follower_id, trader_id)
+        traders.discard(trader_id)
+        if not traders:
+            del self.following[follower_id]
+        followers = self.followers[trader_id]
+        followers.discard(follower_id)
+        if not followers:
+            del self.followers[trader_id]
+        self.copy_settings.pop((follower_id, trader_id), None)
+        return True
+
+    def set_copy_settings(self, follower_id: str, trader_id: str, settings: CopySettings):
+        if self.store is not None:
+            self.store.set_copy_settings(follower_id, trader_id, settings.to_dict())
+        self.copy_settings[(follower_id, trader_id)] = settings
+
+    def follower_count(self, trader_id: str) -> int:
+        return len(self.followers.get(trader_id, ()))
+
+    def following_count(self, follower_id: str) -> int:
+        return len(self.following.get(follower_id, ()))
+
+    def copiers(self, trader_id: str) -> Iterator[Tuple[str, CopySettings]]:
+        """Followers of a trader with copying enabled, with their settings."""
+        copy_settings = self.copy_settings
+        for follower_id in self.followers.get(trader_id, ()):
+            settings = copy_settings.get((follower_id, trader_id))
+            if settings is not None and settings.enabled:
+                yield follower_id, settings
+
+    def followers_page(self, trader_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """A page of a trader's followers in id order, and the cursor of the next page."""
+        if self.store is not None:
+            return self.store.followers_page(trader_id, limit, cursor)
+        return _page(self.followers.get(trader_id, ()), limit, cursor)
+
+    def following_page(self, follower_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """A page of the traders a user follows in id order, and the cursor of the next page."""
+        if self.store is not None:
+            return self.store.following_page(follower_id, limit, cursor)
+        return _page(self.following.get(follower_id, ()), limit, cursor)
+
+
+def _page(ids, limit: int, cursor: Optional[str]) -> Tuple[List[str], Optional[str]]:
+    ids = sorted(user_id for user_id in ids if cursor is None or user_id > cursor)
+    if len(ids) > limit:
+        return ids[:limit], ids[limit - 1]
+    return ids, None
@@ -0,0 +1,141 @@
+"""
+SQLite persistence for the Social Trading follow graph.
+
+Each follow is one row keyed by (trader_id, follower_id), with a second
+composite index on (follower_id, trader_id), so both directions are index
+range scans. Follower and following counts are kept in their own table and
+updated in the same transaction as the follow, so counting never scans, and
+lists are paged with a keyset cursor (the last id returned) instead of
+materializing every follower of a large account.
+"""
+
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS follows (
+    trader_id TEXT NOT NULL,
+    follower_id TEXT NOT NULL,
+    copy_enabled INTEGER,
+    copy_percentage REAL,
+    copy_sizing TEXT,
+    max_exposure REAL,
+    symbol_limits TEXT,
+    PRIMARY KEY (trader_id, follower_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_follows_follower ON follows (follower_id, trader_id);
+CREATE TABLE IF NOT EXISTS follow_counts (
+    user_id TEXT PRIMARY KEY,
+    followers INTEGER NOT NULL DEFAULT 0,
+    following INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# (trader_id, follower_id, copy settings or None)
+FollowRow = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+def settings_columns(settings: Optional[Dict[str, Any]]) -> Tuple[Any, ...]:
+    if settings is None:
+        return (None, None, None, None, None)
+    return (settings["enabled"], settings["copy_percentage"], settings["sizing"],
+            settings["max_exposure"], json.dumps(settings["symbol_limits"]))
+
+
+class FollowStore:
+    """Indexed follow table with maintained counts."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def _bump(self, user_id: str, column: str, delta: int):
+        self.conn.execute(
+            f"INSERT INTO follow_counts (user_id, {column}) VALUES (?, ?) "
+            f"ON CONFLICT (user_id) DO UPDATE SET {column} = {column} + excluded.{column}",
+            (user_id, delta)
+        )
+
+    def add(self, follower_id: str, trader_id: str, settings: Optional[Dict[str, Any]] = None) -> bool:
+        """Insert a follow; returns False if it already existed."""
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO follows (trader_id, follower_id, copy_enabled, copy_percentage, "
+                "copy_sizing, max_exposure, symbol_limits) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (trader_id, follower_id) + settings_columns(settings)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._bump(trader_id, "followers", 1)
+            self._bump(follower_id, "following", 1)
+        return True
+
+    def remove(self, follower_id: str, trader_id: str) -> bool:
+        """Delete a follow; returns False if there was none."""
+        with self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM follows WHERE trader_id = ? AND follower_id = ?", (trader_id, follower_id)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._bump(trader_id, "followers", -1)
+            self._bump(follower_id, "following", -1)
+        return True
+
+    def set_copy_settings(self, follower_id: str, trader_id: str, settings: Dict[str, Any]):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE follows SET copy_enabled = ?, copy_percentage = ?, copy_sizing = ?, max_exposure = ?, "
+                "symbol_limits = ? WHERE trader_id = ? AND follower_id = ?",
+                settings_columns(settings) + (trader_id, follower_id)
+            )
+
+    def rows(self) -> Iterator[FollowRow]:
+        query = ("SELECT trader_id, follower_id, copy_enabled, copy_percentage, copy_sizing, max_exposure, "
+                 "symbol_limits FROM follows")
+        for trader_id, follower_id, enabled, percentage, sizing, max_exposure, limits in self.conn.execute(query):
+            settings = None
+            if enabled is not None:
+                settings = {
+                    "enabled": bool(enabled),
+                    "copy_percentage": percentage,
+                    "sizing": sizing or "fixed",
+                    "max_exposure": max_exposure,
+                    "symbol_limits": json.loads(limits) if limits else {},
+                }
+            yield trader_id, follower_id, settings
+
+    def counts(self) -> Iterator[Tuple[str, int, int]]:
+        return self.conn.execute("SELECT user_id, followers, following FROM follow_counts")
+
+    def followers_page(self, trader_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """Followers of a trader in id order after `cursor`, and the cursor of the next page."""
+        return self._page(
+            "SELECT follower_id FROM follows WHERE trader_id = ? AND follower_id > ? ORDER BY follower_id LIMIT ?",
+            trader_id, limit, cursor
+        )
+
+    def following_page(self, follower_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """Traders a user follows in id order after `cursor`, and the cursor of the next page."""
+        return self._page(
+            "SELECT trader_id FROM follows WHERE follower_id = ? AND trader_id > ? ORDER BY trader_id LIMIT ?",
+            follower_id, limit, cursor
+        )
+
+    def _page(self, query: str, user_id: str, limit: int, cursor: Optional[str]) -> Tuple[List[str], Optional[str]]:
+        # Fetch one extra row to know whether another page follows
+        ids = [row[0] for row in self.conn.execute(query, (user_id, cursor or "", limit + 1))]
+        if len(ids) > limit:
+            return ids[:limit], ids[limit - 1]
+        return ids, None
+
+    def close(self):
+        self.conn.close()
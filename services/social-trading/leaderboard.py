@@ -0,0 +1,295 @@
+"""
+Incremental leaderboards for the Social Trading service.
+
+Trades are aggregated at ingest into per-trader hourly and daily buckets
+(pnl sum, wins, trade count, volume). Each leaderboard period keeps running
+totals per trader over its window of buckets: the last 24 hours for daily,
+the last 7 and 30 days for weekly and monthly, every trade for all time.
+When a bucket falls out of a window, its aggregates are subtracted from just
+the traders that traded in it, so period metrics never re-read or re-filter
+raw trades. Every period keeps one ranking per metric, updated in place when
+a trader's totals change, so reading the top of a leaderboard never re-sorts
+all traders.
+"""
+
+import random
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# bucket series -> bucket width in seconds
+SERIES = {"hourly": 3600, "daily": 86400}
+# period -> (bucket series, bucket count); None keeps everything
+PERIODS: Dict[str, Optional[Tuple[str, int]]] = {
+    "daily": ("hourly", 24),
+    "weekly": ("daily", 7),
+    "monthly": ("daily", 30),
+    "all_time": None,
+}
+METRICS = ("total_pnl", "win_rate", "total_trades")
+
+# Aggregate fields
+PNL, WINS, COUNT, VOLUME = range(4)
+
+
+def new_aggregate() -> List[float]:
+    return [0.0, 0, 0, 0.0]
+
+
+def add_sample(aggregate: List[float], sample: Tuple[float, int, int, float]):
+    for field, value in enumerate(sample):
+        aggregate[field] += value
+
+
+def metric_value(aggregate: List[float], metric: str) -> float:
+    if metric == "win_rate":
+        return aggregate[WINS] / aggregate[COUNT] * 100 if aggregate[COUNT] else 0.0
+    if metric == "total_trades":
+        return aggregate[COUNT]
+    return aggregate[PNL]
+
+
+def aggregate_to_dict(aggregate: List[float]) -> Dict[str, float]:
+    count = aggregate[COUNT]
+    return {
+        "total_pnl": aggregate[PNL],
+        "win_rate": metric_value(aggregate, "win_rate"),
+        "total_trades": count,
+        "volume": aggregate[VOLUME],
+        "avg_trade_size": aggregate[VOLUME] / count if count else 0.0,
+        "avg_trade_pnl": aggregate[PNL] / count if count else 0.0,
+    }
+
+
+class RankIndex:
+    """Traders ordered by one score, best first, kept sorted as scores change.
+
+    The order is a skip list keyed by (-score, trader_id), so moving a trader
+    costs O(log n) expected and reading the top `limit` walks `limit` nodes.
+    """
+
+    MAX_LEVEL = 32
+
+    def __init__(self, seed: Optional[int] = None):
+        self.scores: Dict[str, float] = {}
+        # Each node is [key, next node per level]; the head has no key
+        self.head: List = [None, [None] * self.MAX_LEVEL]
+        self.level = 1
+        self.random = random.Random(seed)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def set(self, trader_id: str, score: float):
+        old = self.scores.get(trader_id)
+        if old == score:
+            return
+        if old is not None:
+            self._unlink((-old, trader_id))
+        self.scores[trader_id] = score
+        self._link((-score, trader_id))
+
+    def remove(self, trader_id: str):
+        old = self.scores.pop(trader_id, None)
+        if old is not None:
+            self._unlink((-old, trader_id))
+
+    def top(self, limit: int) -> List[str]:
+        traders = []
+        node = self.head[1][0]
+        while node is not None and len(traders) < limit:
+            traders.append(node[0][1])
+            node = node[1][0]
+        return traders
+
+    def _predecessors(self, key: Tuple[float, str]) -> List:
+        """The last node before `key` on every level."""
+        path = [self.head] * self.MAX_LEVEL
+        node = self.head
+        for level in range(self.level - 1, -1, -1):
+            while node[1][level] is not None and node[1][level][0] < key:
+                node = node[1][level]
+            path[level] = node
+        return path
+
+    def _link(self, key: Tuple[float, str]):
+        height = 1
+        while height < self.MAX_LEVEL and self.random.random() < 0.5:
+            height += 1
+        self.level = max(self.level, height)
+        path = self._predecessors(key)
+        node = [key, [None] * height]
+        for level in range(height):
+            node[1][level] = path[level][1][level]
+            path[level][1][level] = node
+
+    def _unlink(self, key: Tuple[float, str]):
+        path = self._predecessors(key)
+        node = path[0][1][0]
+        for level in range(len(node[1])):
+            path[level][1][level] = node[1][level]
+        while self.level > 1 and self.head[1][self.level - 1] is None:
+            self.level -= 1
+
+
+class BucketSeries:
+    """Per-trader aggregates in fixed-width time buckets."""
+
+    def __init__(self, width: int):
+        self.width = width
+        self.buckets: Dict[int, Dict[str, List[float]]] = {}  # bucket -> trader_id -> aggregate
+        self.ids: List[int] = []  # bucket numbers in ascending order
+
+    def bucket_of(self, timestamp: float) -> int:
+        return int(timestamp // self.width)
+
+    def add(self, trader_id: str, bucket: int, sample: Tuple[float, int, int, float]):
+        traders = self.buckets.get(bucket)
+        if traders is None:
+            traders = self.buckets[bucket] = {}
+            insort(self.ids, bucket)
+        add_sample(traders.setdefault(trader_id, new_aggregate()), sample)
+
+    def between(self, first: int, last: int) -> List[int]:
+        """Bucket numbers in [first, last]."""
+        return self.ids[bisect_left(self.ids, first):bisect_right(self.ids, last)]
+
+    def prune(self, cutoff: int):
+        """Drop buckets numbered `cutoff` or lower."""
+        end = bisect_right(self.ids, cutoff)
+        for bucket in self.ids[:end]:
+            del self.buckets[bucket]
+        del self.ids[:end]
+
+    def remove_trader(self, trader_id: str):
+        for traders in self.buckets.values():
+            traders.pop(trader_id, None)
+
+
+class PeriodBoard:
+    """Running totals and rankings of every trader over one period's buckets."""
+
+    def __init__(self, series: Optional[BucketSeries], count: Optional[int]):
+        self.series = series
+        self.count = count
+        self.expired_through: Optional[int] = None  # last bucket subtracted from the totals
+        self.totals: Dict[str, List[float]] = {}
+        self.ranks = {metric: RankIndex() for metric in METRICS}
+
+    def cutoff(self, now: float) -> Optional[int]:
+        """Newest bucket outside the window at `now`."""
+        if self.series is None:
+            return None
+        return self.series.bucket_of(now) - self.count
+
+    def _reindex(self, trader_id: str):
+        aggregate = self.totals.get(trader_id)
+        for metric, index in self.ranks.items():
+            if aggregate is None:
+                index.remove(trader_id)
+            else:
+                index.set(trader_id, metric_value(aggregate, metric))
+
+    def add(self, trader_id: str, timestamp: float, sample: Tuple[float, int, int, float], now: float):
+        if self.series is not None and self.series.bucket_of(timestamp) <= self.cutoff(now):
+            return
+        add_sample(self.totals.setdefault(trader_id, new_aggregate()), sample)
+        self._reindex(trader_id)
+
+    def expire(self, now: float) -> bool:
+        """Subtract buckets that have left the window; returns True if any did."""
+        if self.series is None:
+            return False
+        cutoff = self.cutoff(now)
+        if self.expired_through is not None and cutoff <= self.expired_through:
+            return False
+        first = self.expired_through + 1 if self.expired_through is not None else float("-inf")
+        expired = self.series.between(first, cutoff)
+        self.expired_through = cutoff
+        for bucket in expired:
+            for trader_id, aggregate in self.series.buckets[bucket].items():
+                total = self.totals.get(trader_id)
+                if total is None:
+                    continue
+                if total[COUNT] <= aggregate[COUNT]:
+                    del self.totals[trader_id]
+                else:
+                    for field, value in enumerate(aggregate):
+                        total[field] -= value
+                self._reindex(trader_id)
+        return bool(expired)
+
+    def remove_trader(self, trader_id: str):
+        self.totals.pop(trader_id, None)
+        self._reindex(trader_id)
+
+
+class Leaderboards:
+    """Per-period boards over shared hourly and daily buckets, fed by trade events."""
+
+    def __init__(self, periods: Dict[str, Optional[Tuple[str, int]]] = PERIODS):
+        self.series = {name: BucketSeries(width) for name, width in SERIES.items()}
+        self.boards = {
+            period: PeriodBoard(self.series[window[0]], window[1]) if window else PeriodBoard(None, None)
+            for period, window in periods.items()
+        }
+        self.last_trade: Dict[str, float] = {}
+        # Bumped on every change so readers can cache what they render
+        self.version = 0
+
+    def touch(self):
+        """Mark rendered leaderboards stale after a change made outside the index."""
+        self.version += 1
+
+    def _retention(self, name: str, now: float) -> Optional[int]:
+        """Newest bucket of a series that no period needs any more."""
+        cutoffs = [board.cutoff(now) for board in self.boards.values() if board.series is self.series[name]]
+        return min(cutoffs) if cutoffs else None
+
+    def expire(self, now: float):
+        if any([board.expire(now) for board in self.boards.values()]):
+            self.version += 1
+            for name, series in self.series.items():
+                cutoff = self._retention(name, now)
+                if cutoff is not None:
+                    series.prune(cutoff)
+
+    def record_trade(self, trader_id: str, timestamp: float, pnl: float, quantity: float, now: float):
+        self.expire(now)
+        sample = (pnl, 1 if pnl > 0 else 0, 1, quantity)
+        for name, series in self.series.items():
+            bucket = series.bucket_of(timestamp)
+            retention = self._retention(name, now)
+            if retention is None or bucket > retention:
+                series.add(trader_id, bucket, sample)
+        for board in self.boards.values():
+            board.add(trader_id, timestamp, sample, now)
+        if timestamp > self.last_trade.get(trader_id, float("-inf")):
+            self.last_trade[trader_id] = timestamp
+        self.version += 1
+
+    def load_history(self, trader_id: str, trades: Iterable[Tuple[float, float, float]], now: float):
+        """Replace a trader's aggregates with their (timestamp, pnl, quantity) history."""
+        for series in self.series.values():
+            series.remove_trader(trader_id)
+        for board in self.boards.values():
+            board.remove_trader(trader_id)
+        self.last_trade.pop(trader_id, None)
+        for timestamp, pnl, quantity in trades:
+            self.record_trade(trader_id, timestamp, pnl, quantity, now)
+        self.version += 1
+
+    def top(self, period: str, metric: str, limit: int) -> List[Tuple[str, List[float]]]:
+        """The best `limit` traders of a period by metric, with their aggregates."""
+        board = self.boards[period]
+        return [(trader_id, board.totals[trader_id]) for trader_id in board.ranks[metric].top(limit)]
+
+    def ranked_count(self, period: str) -> int:
+        return len(self.boards[period].totals)
+
+    def trader_stats(self, trader_id: str, now: float) -> Dict[str, Dict[str, float]]:
+        """A trader's metrics for every period, read from the running totals."""
+        self.expire(now)
+        return {
+            period: aggregate_to_dict(board.totals.get(trader_id) or new_aggregate())
+            for period, board in self.boards.items()
+        }
@@ -3,41 +3,79 @@ Social Trading Service for DoleSe Wonderland FX
 Provides trader following, trade copying, and leaderboards functionality.
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Query
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 import asyncio
-import httpx
+import os
+import time
+
+import numpy as np
+
+from copy_sizing import group_cohorts, size_cohort
+from copy_trading import CopyDispatcher
+from fill_consumer import FillConsumer, RecentKeys, SQLiteFillSource
+from follow_graph import CopySettings, FollowGraph
+from follow_store import FollowStore
+from leaderboard import COUNT, METRICS, PERIODS, PNL, VOLUME, Leaderboards, metric_value
+from profile_cache import ProfileCache
+from refresh_scheduler import RefreshScheduler
+from service_client import ServiceClient
 
 app = FastAPI(title="Social Trading Service", version="1.0.0")
 
+# Follows are persisted in SQLite and cached in memory
+DATA_DIR = os.getenv(
+    "SOCIAL_TRADING_DATA_DIR",
+    os.path.join(os.path.dirname(__file__), "../../data/social-trading")
+)
+follow_store = FollowStore(os.path.join(DATA_DIR, "follows.db"))
+
 # In-memory storage (replace with database in production)
-trader_follows = {}  # follower_id -> [followed_trader_ids]
-trade_copies = {}    # trader_id -> copy_settings
-leaderboards = {}    # period -> leaderboard_data
-social_stats = {}    # trader_id -> social_stats
+follow_graph = FollowGraph(follow_store)  # trader <-> follower sets and per-pair copy settings
+leaderboard_index = Leaderboards()  # per-period aggregates and rankings, fed by trade events
+leaderboard_cache = {}  # (period, metric) -> (index version, rendered top entries)
+trader_details = {}  # trader_id -> risk score and verification from the last refresh
+seeded_traders = set()  # traders whose aggregates were loaded from their trade history
+LEADERBOARD_SIZE = 50
+social_stats = {}    # trader_id -> follower/following counters, restored from the store
 
 # External service URLs
 PAPER_TRADING_URL = "http://localhost:8005"
 AI_PIPELINE_URL = "http://localhost:8001"
 API_GATEWAY_URL = "http://localhost:8000"
 
+# One pooled client for every call to other services, opened at startup
+service_client = ServiceClient(
+    max_connections=int(os.getenv("SOCIAL_HTTP_MAX_CONNECTIONS", "100")),
+    max_concurrency=int(os.getenv("SOCIAL_HTTP_MAX_CONCURRENCY", "50")),
+    timeout=float(os.getenv("SOCIAL_HTTP_TIMEOUT", "10")),
+    retries=int(os.getenv("SOCIAL_HTTP_RETRIES", "2"))
+)
+
 class FollowTraderRequest(BaseModel):
     follower_id: str = Field(..., description="ID of the user who wants to follow")
     trader_id: str = Field(..., description="ID of the trader to follow")
     copy_trades: bool = Field(default=False, description="Whether to automatically copy trades")
     copy_percentage: Optional[float] = Field(default=100.0, ge=1.0, le=100.0, description="Percentage of trades to copy")
+    sizing: str = Field(default="fixed", pattern="^(fixed|equity)$", description="fixed, or equity to scale by follower/trader equity")
+    max_exposure: Optional[float] = Field(default=None, gt=0.0, le=100.0, description="Largest margin per copied trade, in percent of equity")
+    symbol_limits: Dict[str, float] = Field(default_factory=dict, description="Largest copied quantity per symbol")
 
 class UnfollowTraderRequest(BaseModel):
     follower_id: str = Field(..., description="ID of the user who wants to unfollow")
     trader_id: str = Field(..., description="ID of the trader to unfollow")
 
 class UpdateCopySettingsRequest(BaseModel):
+    follower_id: str = Field(..., description="ID of the user copying the trader")
     trader_id: str = Field(..., description="ID of the trader whose settings to update")
     copy_percentage: float = Field(..., ge=1.0, le=100.0, description="New copy percentage")
     enabled: bool = Field(default=True, description="Whether copying is enabled")
+    sizing: str = Field(default="fixed", pattern="^(fixed|equity)$", description="fixed, or equity to scale by follower/trader equity")
+    max_exposure: Optional[float] = Field(default=None, gt=0.0, le=100.0, description="Largest margin per copied trade, in percent of equity")
+    symbol_limits: Dict[str, float] = Field(default_factory=dict, description="Largest copied quantity per symbol")
 
 class GetLeaderboardRequest(BaseModel):
     period: str = Field(..., description="Time period: daily, weekly, monthly, all_time")
@@ -64,183 +102,383 @@ class LeaderboardEntry(BaseModel):
     period_return: float
 
 async def get_trader_performance(trader_id: str) -> Dict[str, Any]:
-    """Get trader performance data from paper trading service."""
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{PAPER_TRADING_URL}/api/v1/paper-trading/accounts/{trader_id}",
-                params={"include_positions": True, "include_history": True}
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return None
-        except Exception as e:
-            print(f"Error fetching trader performance: {e}")
+    """Get a trader's account summary from paper trading service."""
+    try:
+        response = await service_client.get(
+            f"{PAPER_TRADING_URL}/api/v1/paper-trading/accounts/{trader_id}",
+            params={"include_positions": True},
+            timeout=5.0
+        )
+        if response.status_code == 200:
+            return response.json()
+        else:
             return None
+    except Exception as e:
+        print(f"Error fetching trader performance: {e}")
+        return None
 
 async def get_ai_insights(trader_id: str) -> Dict[str, Any]:
     """Get AI insights for trader performance."""
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{AI_PIPELINE_URL}/api/v1/ai/analyze-performance",
-                json={"trader_id": trader_id}
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"risk_score": 5.0, "insights": []}
-        except Exception as e:
-            print(f"Error fetching AI insights: {e}")
+    try:
+        # Analysis has no side effects, so it is safe to retry
+        response = await service_client.post(
+            f"{AI_PIPELINE_URL}/api/v1/ai/analyze-performance",
+            json={"trader_id": trader_id},
+            timeout=5.0
+        )
+        if response.status_code == 200:
+            return response.json()
+        else:
             return {"risk_score": 5.0, "insights": []}
-
-async def update_leaderboards():
-    """Update leaderboards with latest trader performance data."""
-    periods = ["daily", "weekly", "monthly", "all_time"]
-
-    for period in periods:
-        leaderboard = []
-
+    except Exception as e:
+        print(f"Error fetching AI insights: {e}")
+        return {"risk_score": 5.0, "insights": []}
+
+async def get_trade_history(trader_id: str) -> Optional[List[Dict[str, Any]]]:
+    """Get a trader's full trade history from the paper trading service, page by page."""
+    trades = []
+    cursor = None
+    try:
+        while True:
+            params = {"limit": 1000}
+            if cursor is not None:
+                params["cursor"] = cursor
+            response = await service_client.get(
+                f"{PAPER_TRADING_URL}/api/v1/paper-trading/accounts/{trader_id}/trades",
+                params=params,
+                timeout=10.0
+            )
+            if response.status_code != 200:
+                return None
+            page = response.json()
+            trades.extend(page["trades"])
+            cursor = page.get("next_cursor")
+            if cursor is None:
+                return trades
+    except Exception as e:
+        print(f"Error fetching trade history: {e}")
+        return None
+
+def trade_time(trade: Dict[str, Any]) -> float:
+    """Epoch seconds of a trade's ISO timestamp (naive times are UTC); now if missing."""
+    timestamp = trade.get("timestamp")
+    if not timestamp:
+        return time.time()
+    moment = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+def to_iso(timestamp: float) -> str:
+    """Format epoch seconds as naive UTC ISO, as the paper trading service does."""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+def record_trade(trader_id: str, trade: Dict[str, Any]):
+    """Add a trade to the trader's leaderboard aggregates."""
+    leaderboard_index.record_trade(
+        trader_id, trade_time(trade), trade.get("pnl", 0) or 0, trade.get("quantity", 0) or 0, time.time()
+    )
+
+def seed_trader(trader_id: str, history: List[Dict[str, Any]]):
+    """Replace a trader's bucketed aggregates with their full trade history."""
+    leaderboard_index.load_history(
+        trader_id,
+        ((trade_time(trade), trade.get("pnl", 0) or 0, trade.get("quantity", 0) or 0) for trade in history),
+        time.time()
+    )
+    seeded_traders.add(trader_id)
+
+async def update_leaderboards(trader_ids: Optional[List[str]] = None):
+    """Refresh the details shown on the leaderboards for some or all traders.
+
+    Rankings are kept up to date from trade notifications. A trader seen for
+    the first time has their aggregates seeded from their trade history; after
+    that a refresh only updates their risk score and verification.
+    """
+    if trader_ids is None:
         # Get all trader IDs (this would come from a database in production)
         trader_ids = list(social_stats.keys())
 
-        for trader_id in trader_ids:
-            performance = await get_trader_performance(trader_id)
-            if not performance:
-                continue
-
-            account = performance["account"]
-            trades = performance.get("recent_trades", [])
-
-            # Calculate metrics based on period
-            period_trades = filter_trades_by_period(trades, period)
-
-            if not period_trades:
-                continue
-
-            total_pnl = sum(trade.get("pnl", 0) for trade in period_trades)
-            winning_trades = sum(1 for trade in period_trades if trade.get("pnl", 0) > 0)
-            win_rate = (winning_trades / len(period_trades)) * 100 if period_trades else 0
-
-            # Get AI insights
-            ai_data = await get_ai_insights(trader_id)
-
-            trader_profile = TraderProfile(
-                trader_id=trader_id,
-                username=f"Trader_{trader_id[:8]}",  # Placeholder
-                total_followers=len(trader_follows.get(trader_id, [])),
-                total_pnl=total_pnl,
-                win_rate=win_rate,
-                total_trades=len(period_trades),
-                avg_trade_size=sum(trade.get("quantity", 0) for trade in period_trades) / len(period_trades) if period_trades else 0,
-                risk_score=ai_data.get("risk_score", 5.0),
-                last_active=datetime.utcnow().isoformat(),
-                is_verified=account.get("trading_stats", {}).get("total_trades", 0) > 100,
-                specialties=["forex", "stocks", "crypto"]  # Placeholder
-            )
-
-            leaderboard.append({
-                "trader": trader_profile,
-                "score": total_pnl,  # Primary scoring metric
-                "period_return": total_pnl
-            })
-
-        # Sort by score (descending)
-        leaderboard.sort(key=lambda x: x["score"], reverse=True)
+    # Fetch every trader concurrently; the shared client bounds the fan-out
+    unseeded = [trader_id for trader_id in trader_ids if trader_id not in seeded_traders]
+    performances, insights, histories = await asyncio.gather(
+        asyncio.gather(*(get_trader_performance(trader_id) for trader_id in trader_ids)),
+        asyncio.gather(*(get_ai_insights(trader_id) for trader_id in trader_ids)),
+        asyncio.gather(*(get_trade_history(trader_id) for trader_id in unseeded))
+    )
 
-        # Add ranks
-        for i, entry in enumerate(leaderboard):
-            entry["rank"] = i + 1
+    for trader_id, history in zip(unseeded, histories):
+        if history is not None:
+            seed_trader(trader_id, history)
 
-        leaderboards[period] = leaderboard
-
-def filter_trades_by_period(trades: List[Dict], period: str) -> List[Dict]:
-    """Filter trades by time period."""
-    now = datetime.utcnow()
-    filtered_trades = []
-
-    for trade in trades:
-        trade_time = datetime.fromisoformat(trade["timestamp"].replace('Z', '+00:00'))
-
-        if period == "daily" and (now - trade_time).days <= 1:
-            filtered_trades.append(trade)
-        elif period == "weekly" and (now - trade_time).days <= 7:
-            filtered_trades.append(trade)
-        elif period == "monthly" and (now - trade_time).days <= 30:
-            filtered_trades.append(trade)
-        elif period == "all_time":
-            filtered_trades.append(trade)
-
-    return filtered_trades
-
-async def copy_trade_to_followers(trader_id: str, trade_data: Dict[str, Any]):
-    """Copy a trade to all followers who have copy trading enabled."""
-    if trader_id not in trader_follows:
-        return
-
-    followers = trader_follows[trader_id]
-
-    for follower_id in followers:
-        copy_settings = trade_copies.get(follower_id, {})
-        if not copy_settings.get("enabled", False):
+    for trader_id, performance, ai_data in zip(trader_ids, performances, insights):
+        if not performance:
             continue
-
-        copy_percentage = copy_settings.get("copy_percentage", 100.0)
-        adjusted_quantity = trade_data["quantity"] * (copy_percentage / 100.0)
-
-        # Execute copy trade via paper trading service
-        async with httpx.AsyncClient() as client:
-            try:
-                copy_trade_request = {
-                    "account_id": follower_id,  # Assuming follower has a paper trading account
-                    "symbol": trade_data["symbol"],
-                    "order_type": "market",
-                    "side": trade_data["side"],
-                    "quantity": adjusted_quantity,
-                    "stop_loss": trade_data.get("stop_loss"),
-                    "take_profit": trade_data.get("take_profit")
-                }
-
-                response = await client.post(
-                    f"{PAPER_TRADING_URL}/api/v1/paper-trading/orders",
-                    json=copy_trade_request
-                )
-
-                if response.status_code == 200:
-                    print(f"Successfully copied trade for follower {follower_id}")
-                else:
-                    print(f"Failed to copy trade for follower {follower_id}: {response.text}")
-
-            except Exception as e:
-                print(f"Error copying trade to follower {follower_id}: {e}")
+        account = performance["account"]
+        trader_details[trader_id] = {
+            "risk_score": ai_data.get("risk_score", 5.0),
+            "is_verified": account.get("trading_stats", {}).get("total_trades", 0) > 100
+        }
+    leaderboard_index.touch()
+
+# Traders to refresh are marked dirty and refreshed together, at most once per interval
+refresh_scheduler = RefreshScheduler(
+    update_leaderboards, min_interval=float(os.getenv("SOCIAL_REFRESH_MIN_INTERVAL", "5"))
+)
+
+def render_leaderboard(period: str, metric: str) -> List[Dict[str, Any]]:
+    """Top entries of a leaderboard, re-rendered only when the rankings have changed."""
+    cached = leaderboard_cache.get((period, metric))
+    if cached is not None and cached[0] == leaderboard_index.version:
+        return cached[1]
+
+    entries = []
+    for rank, (trader_id, aggregate) in enumerate(leaderboard_index.top(period, metric, LEADERBOARD_SIZE), 1):
+        details = trader_details.get(trader_id, {})
+        total_pnl = aggregate[PNL]
+        trader_profile = TraderProfile(
+            trader_id=trader_id,
+            username=f"Trader_{trader_id[:8]}",  # Placeholder
+            total_followers=follow_graph.follower_count(trader_id),
+            total_pnl=total_pnl,
+            win_rate=metric_value(aggregate, "win_rate"),
+            total_trades=aggregate[COUNT],
+            avg_trade_size=aggregate[VOLUME] / aggregate[COUNT],
+            risk_score=details.get("risk_score", 5.0),
+            last_active=to_iso(leaderboard_index.last_trade.get(trader_id, time.time())),
+            is_verified=details.get("is_verified", False),
+            specialties=["forex", "stocks", "crypto"]  # Placeholder
+        )
+        entries.append({
+            "rank": rank,
+            "trader": trader_profile,
+            "score": total_pnl,  # Primary scoring metric
+            "period_return": total_pnl
+        })
+
+    leaderboard_cache[(period, metric)] = (leaderboard_index.version, entries)
+    return entries
+
+# Copy orders are queued and sent to paper trading in batches
+COPY_BATCH_SIZE = int(os.getenv("SOCIAL_COPY_BATCH_SIZE", "1000"))
+COPY_MAX_IN_FLIGHT = int(os.getenv("SOCIAL_COPY_MAX_IN_FLIGHT", "4"))
+
+async def submit_copy_batch(orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Submit a batch of copy orders to the paper trading service."""
+    # Orders must not be submitted twice, so only unsent requests are retried
+    response = await service_client.post(
+        f"{PAPER_TRADING_URL}/api/v1/paper-trading/orders/batch",
+        json={"orders": orders, "atomic": False},
+        timeout=30.0,
+        idempotent=False
+    )
+    response.raise_for_status()
+    return response.json()
+
+copy_dispatcher = CopyDispatcher(submit_copy_batch, batch_size=COPY_BATCH_SIZE, max_in_flight=COPY_MAX_IN_FLIGHT)
+
+# Paper trading's limit on ids per account lookup
+COPY_LOOKUP_CHUNK = int(os.getenv("SOCIAL_COPY_LOOKUP_CHUNK", "10000"))
+
+async def fetch_accounts(account_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Equity and free margin of paper trading accounts, looked up in chunks."""
+    responses = await asyncio.gather(*(
+        service_client.post(
+            f"{PAPER_TRADING_URL}/api/v1/paper-trading/accounts/lookup",
+            json={"account_ids": account_ids[start:start + COPY_LOOKUP_CHUNK]}
+        )
+        for start in range(0, len(account_ids), COPY_LOOKUP_CHUNK)
+    ))
+    accounts = {}
+    for response in responses:
+        response.raise_for_status()
+        accounts.update(response.json()["accounts"])
+    return accounts
+
+# Copies are sized against this share of the follower's free margin, so a small
+# move between sizing and filling does not leave them short of margin
+COPY_MARGIN_BUFFER = float(os.getenv("SOCIAL_COPY_MARGIN_BUFFER", "0.98"))
+# Copy quantities are rounded down to a multiple of this
+COPY_LOT_STEP = float(os.getenv("SOCIAL_COPY_LOT_STEP", "0.01"))
+
+# (accounts by id, instruments by symbol) looked up once for a fill batch
+CopyContext = Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]
+
+async def fetch_instruments(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Asset type and margin per unit of symbols at their current quotes, in one call."""
+    response = await service_client.get(
+        f"{PAPER_TRADING_URL}/api/v1/paper-trading/market/instruments", params={"symbols": ",".join(symbols)}
+    )
+    response.raise_for_status()
+    return response.json()["instruments"]
+
+async def fetch_copy_context(trader_id: str, follower_ids: List[str], symbol: str,
+                             prefetched: Optional[CopyContext] = None):
+    """Accounts of the trader and followers and the symbol's instrument, or None if unavailable.
+
+    Accounts and quotes already looked up for the trade's fill batch are used as given.
+    """
+    try:
+        if prefetched is not None:
+            accounts, instruments = prefetched
+        else:
+            accounts, instruments = await asyncio.gather(
+                fetch_accounts([trader_id] + follower_ids), fetch_instruments([symbol])
+            )
+        return accounts, instruments.get(symbol)
+    except Exception as e:
+        print(f"Error fetching copy sizing data for {trader_id}: {e}")
+        return None
+
+async def build_copy_orders(trader_id: str, trade_data: Dict[str, Any],
+                            prefetched: Optional[CopyContext] = None) -> List[List[Dict[str, Any]]]:
+    """Market orders for the trader's copiers, one list per sizing cohort.
+
+    Followers are sized against their equity and free margin; those whose
+    account cannot take the trade get no order. If paper trading cannot be
+    asked, orders fall back to the plain copy percentage.
+    """
+    symbol = trade_data["symbol"]
+    cohorts = group_cohorts(follow_graph.copiers(trader_id), symbol)
+    if not cohorts:
+        return []
+
+    follower_ids = [follower_id for members in cohorts.values() for follower_id in members]
+    context = await fetch_copy_context(trader_id, follower_ids, symbol, prefetched)
+    accounts, instrument = context if context is not None else ({}, None)
+    leader_equity = accounts.get(trader_id, {}).get("equity")
+    margin_per_unit = instrument["margin_per_unit"][trade_data["side"]] if instrument else None
+
+    batches = []
+    for key, members in cohorts.items():
+        if context is not None:
+            # Only active accounts that may trade the symbol's asset type are sized
+            members = [
+                follower_id for follower_id in members
+                if accounts.get(follower_id, {}).get("status") == "active"
+                and (instrument is None or instrument["asset_type"] in accounts[follower_id]["allowed_asset_types"])
+            ]
+            equity = np.array([accounts[follower_id]["equity"] for follower_id in members], dtype=float)
+            free_margin = np.array([accounts[follower_id]["free_margin"] for follower_id in members], dtype=float)
+        else:
+            equity = free_margin = np.zeros(len(members))
+        quantities = size_cohort(key, trade_data["quantity"], equity, free_margin,
+                                 leader_equity=leader_equity, margin_per_unit=margin_per_unit,
+                                 margin_buffer=COPY_MARGIN_BUFFER, lot_step=COPY_LOT_STEP)
+
+        orders = [
+            {
+                "account_id": follower_id,
+                "symbol": symbol,
+                "order_type": "market",
+                "side": trade_data["side"],
+                "quantity": quantity,
+                "stop_loss": trade_data.get("stop_loss"),
+                "take_profit": trade_data.get("take_profit")
+            }
+            for follower_id, quantity in zip(members, quantities.tolist())
+            if quantity > 0
+        ]
+        if orders:
+            batches.append(orders)
+    return batches
+
+async def copy_trade_to_followers(trader_id: str, trade_data: Dict[str, Any],
+                                  prefetched: Optional[CopyContext] = None) -> int:
+    """Queue a trade for every follower who has copy trading enabled.
+
+    Only opening trades are copied; closes would open opposite positions on
+    the followers' accounts. Each sizing cohort is queued as its own batch.
+    Returns the number of copy orders queued.
+    """
+    if trade_data.get("type", "open") != "open":
+        return 0
+
+    queued = 0
+    for orders in await build_copy_orders(trader_id, trade_data, prefetched):
+        copy_dispatcher.enqueue(orders)
+        queued += len(orders)
+    return queued
+
+async def process_trade(trader_id: str, trade_data: Dict[str, Any],
+                        prefetched: Optional[CopyContext] = None) -> int:
+    """Copy a trader's trade and update their rankings; returns the copies queued."""
+    # Copy trade to followers if copy trading is enabled
+    queued = await copy_trade_to_followers(trader_id, trade_data, prefetched)
+
+    # Update the trader's rankings now and their risk score in the background
+    record_trade(trader_id, trade_data)
+    profile_cache.invalidate(trader_id)
+    refresh_scheduler.mark_dirty(trader_id)
+    return queued
+
+# Fills already processed, by account and ledger index, so a redelivered batch is not copied twice
+processed_fills = RecentKeys(int(os.getenv("SOCIAL_FILL_DEDUP_WINDOW", "100000")))
+
+async def fetch_batch_context(fills: List[Dict[str, Any]]) -> Optional[CopyContext]:
+    """Accounts of the traders with copiers in a fill batch and of their copiers, and the
+    current quotes of the symbols they traded, in one lookup each.
+
+    Returns None if a lookup fails, leaving each trade to look up its own.
+    """
+    account_ids: Dict[str, None] = {}
+    symbols: Dict[str, None] = {}
+    for fill in fills:
+        if fill.get("type", "open") != "open":
+            continue
+        follower_ids = [follower_id for follower_id, _ in follow_graph.copiers(fill["account_id"])]
+        if follower_ids:
+            account_ids[fill["account_id"]] = None
+            account_ids.update(dict.fromkeys(follower_ids))
+            symbols[fill["symbol"]] = None
+    if not account_ids:
+        return {}, {}
+    try:
+        return await asyncio.gather(fetch_accounts(list(account_ids)), fetch_instruments(list(symbols)))
+    except Exception as e:
+        print(f"Error fetching accounts for a batch of {len(fills)} fills: {e}")
+        return None
+
+async def handle_fill_batch(fills: List[Dict[str, Any]]):
+    """Process a batch of fills published by the paper trading service, skipping repeats."""
+    fresh = [fill for fill in fills if fill.get("id") is None or (fill["account_id"], fill["id"]) not in processed_fills]
+    prefetched = await fetch_batch_context(fresh)
+    for fill in fresh:
+        key = (fill["account_id"], fill.get("id"))
+        if key[1] is not None and key in processed_fills:
+            continue
+        await process_trade(fill["account_id"], fill, prefetched)
+        if key[1] is not None:
+            processed_fills.add(key)
+
+# Fills are read in batches from paper trading's fill log when one is configured;
+# the trade notification endpoint remains for deployments without it
+FILL_LOG = os.getenv("SOCIAL_FILL_LOG")
+fill_consumer = FillConsumer(
+    SQLiteFillSource(FILL_LOG) if FILL_LOG else None,
+    name=os.getenv("SOCIAL_FILL_CONSUMER", "social-trading"),
+    handler=handle_fill_batch,
+    batch_size=int(os.getenv("SOCIAL_FILL_BATCH_SIZE", "500")),
+    max_attempts=int(os.getenv("SOCIAL_FILL_MAX_ATTEMPTS", "5"))
+)
 
 # API Endpoints
 
 @app.post("/api/v1/social/follow")
-async def follow_trader(request: FollowTraderRequest, background_tasks: BackgroundTasks):
+async def follow_trader(request: FollowTraderRequest):
     """Follow a trader and optionally enable trade copying."""
     if request.follower_id == request.trader_id:
         raise HTTPException(status_code=400, detail="Cannot follow yourself")
 
-    # Initialize follower list if not exists
-    if request.follower_id not in trader_follows:
-        trader_follows[request.follower_id] = []
-
-    # Check if already following
-    if request.trader_id in trader_follows[request.follower_id]:
-        raise HTTPException(status_code=400, detail="Already following this trader")
-
-    # Add to followers
-    trader_follows[request.follower_id].append(request.trader_id)
-
     # Set up copy trading if requested
+    settings = None
     if request.copy_trades:
-        trade_copies[request.follower_id] = {
-            "trader_id": request.trader_id,
-            "copy_percentage": request.copy_percentage or 100.0,
-            "enabled": True
-        }
+        settings = CopySettings(enabled=True, copy_percentage=request.copy_percentage or 100.0,
+                                sizing=request.sizing, max_exposure=request.max_exposure,
+                                symbol_limits=request.symbol_limits)
+
+    if not follow_graph.follow(request.follower_id, request.trader_id, settings):
+        raise HTTPException(status_code=400, detail="Already following this trader")
 
     # Initialize social stats for both users
     if request.follower_id not in social_stats:
@@ -251,8 +489,9 @@ async def follow_trader(request: FollowTraderRequest, background_tasks: Backgrou
     social_stats[request.trader_id]["followers"] += 1
     social_stats[request.follower_id]["following"] += 1
 
-    # Background task to update leaderboards
-    background_tasks.add_task(update_leaderboards)
+    # Follower counts are shown on the leaderboards; fetch the trader's details in the background
+    leaderboard_index.touch()
+    refresh_scheduler.mark_dirty(request.trader_id)
 
     return {
         "message": "Successfully followed trader",
@@ -261,134 +500,124 @@ async def follow_trader(request: FollowTraderRequest, background_tasks: Backgrou
     }
 
 @app.post("/api/v1/social/unfollow")
-async def unfollow_trader(request: UnfollowTraderRequest, background_tasks: BackgroundTasks):
+async def unfollow_trader(request: UnfollowTraderRequest):
     """Unfollow a trader and disable trade copying."""
-    if request.follower_id not in trader_follows:
+    if follow_graph.following_count(request.follower_id) == 0:
         raise HTTPException(status_code=400, detail="Not following any traders")
 
-    if request.trader_id not in trader_follows[request.follower_id]:
+    # Removes the copy trading settings for the pair as well
+    if not follow_graph.unfollow(request.follower_id, request.trader_id):
         raise HTTPException(status_code=400, detail="Not following this trader")
 
-    # Remove from followers
-    trader_follows[request.follower_id].remove(request.trader_id)
-
-    # Remove copy trading settings
-    if request.follower_id in trade_copies:
-        del trade_copies[request.follower_id]
-
     # Update social stats
     if request.trader_id in social_stats:
         social_stats[request.trader_id]["followers"] -= 1
     if request.follower_id in social_stats:
         social_stats[request.follower_id]["following"] -= 1
 
-    # Background task to update leaderboards
-    background_tasks.add_task(update_leaderboards)
+    # Follower counts are shown on the leaderboards
+    leaderboard_index.touch()
 
     return {"message": "Successfully unfollowed trader"}
 
 @app.get("/api/v1/social/followers/{trader_id}")
-async def get_followers(trader_id: str):
-    """Get list of followers for a trader."""
-    followers = trader_follows.get(trader_id, [])
+async def get_followers(trader_id: str, limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None):
+    """Page through a trader's followers in id order."""
+    followers, next_cursor = follow_graph.followers_page(trader_id, limit, cursor)
     return {
         "trader_id": trader_id,
-        "followers_count": len(followers),
-        "followers": followers
+        "followers_count": social_stats.get(trader_id, {}).get("followers", 0),
+        "followers": followers,
+        "next_cursor": next_cursor
     }
 
 @app.get("/api/v1/social/following/{user_id}")
-async def get_following(user_id: str):
-    """Get list of traders a user is following."""
-    following = trader_follows.get(user_id, [])
+async def get_following(user_id: str, limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None):
+    """Page through the traders a user is following in id order."""
+    following, next_cursor = follow_graph.following_page(user_id, limit, cursor)
     return {
         "user_id": user_id,
-        "following_count": len(following),
-        "following": following
+        "following_count": social_stats.get(user_id, {}).get("following", 0),
+        "following": following,
+        "next_cursor": next_cursor
     }
 
 @app.post("/api/v1/social/copy-settings")
 async def update_copy_settings(request: UpdateCopySettingsRequest):
-    """Update trade copying settings."""
-    if request.trader_id not in trade_copies:
-        raise HTTPException(status_code=404, detail="No copy settings found for this trader")
+    """Update a follower's trade copying settings for one trader."""
+    if not follow_graph.is_following(request.follower_id, request.trader_id):
+        raise HTTPException(status_code=404, detail="Not following this trader")
 
-    trade_copies[request.trader_id].update({
-        "copy_percentage": request.copy_percentage,
-        "enabled": request.enabled
-    })
+    settings = CopySettings(enabled=request.enabled, copy_percentage=request.copy_percentage,
+                            sizing=request.sizing, max_exposure=request.max_exposure,
+                            symbol_limits=request.symbol_limits)
+    follow_graph.set_copy_settings(request.follower_id, request.trader_id, settings)
 
     return {
         "message": "Copy settings updated successfully",
-        "settings": trade_copies[request.trader_id]
+        "settings": {"trader_id": request.trader_id, **settings.to_dict()}
     }
 
 @app.get("/api/v1/social/copy-settings/{trader_id}")
-async def get_copy_settings(trader_id: str):
-    """Get trade copying settings for a trader."""
-    if trader_id not in trade_copies:
-        return {"enabled": False, "copy_percentage": 100.0}
+async def get_copy_settings(trader_id: str, follower_id: str):
+    """Get a follower's trade copying settings for a trader."""
+    settings = follow_graph.copy_settings.get((follower_id, trader_id))
+    if settings is None:
+        return {"trader_id": trader_id, **CopySettings(enabled=False).to_dict()}
 
-    return trade_copies[trader_id]
+    return {"trader_id": trader_id, **settings.to_dict()}
 
 @app.get("/api/v1/social/leaderboard")
 async def get_leaderboard(request: GetLeaderboardRequest):
     """Get trader leaderboard for specified period and criteria."""
-    if request.period not in leaderboards:
-        # Trigger leaderboard update if not available
-        await update_leaderboards()
-
-    if request.period not in leaderboards:
+    if request.period not in PERIODS:
         raise HTTPException(status_code=404, detail="Leaderboard not available")
+    if request.metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric {request.metric}; use one of {', '.join(METRICS)}")
+    metric = request.metric
 
-    leaderboard = leaderboards[request.period]
+    # Let buckets that have aged out of the period drop off first
+    leaderboard_index.expire(time.time())
+    leaderboard = render_leaderboard(request.period, metric)
+    total_count = leaderboard_index.ranked_count(request.period)
 
     # Filter by asset type if specified
     if request.asset_type:
         leaderboard = [
-            entry for entry in leaderboard
-            if request.asset_type in entry["trader"].specialties
+            {**entry, "rank": rank}
+            for rank, entry in enumerate(
+                (entry for entry in leaderboard if request.asset_type in entry["trader"].specialties), 1
+            )
         ]
-
-    # Sort by requested metric
-    if request.metric == "win_rate":
-        leaderboard.sort(key=lambda x: x["trader"].win_rate, reverse=True)
-    elif request.metric == "total_trades":
-        leaderboard.sort(key=lambda x: x["trader"].total_trades, reverse=True)
-    else:  # default to total_pnl
-        leaderboard.sort(key=lambda x: x["score"], reverse=True)
-
-    # Re-assign ranks after sorting
-    for i, entry in enumerate(leaderboard):
-        entry["rank"] = i + 1
+        total_count = len(leaderboard)
 
     return {
         "period": request.period,
         "metric": request.metric,
         "asset_type_filter": request.asset_type,
-        "leaderboard": leaderboard[:50],  # Top 50 traders
-        "total_count": len(leaderboard)
+        "leaderboard": leaderboard,  # Top 50 traders
+        "total_count": total_count
     }
 
-@app.get("/api/v1/social/trader/{trader_id}/profile")
-async def get_trader_profile(trader_id: str):
-    """Get detailed trader profile with performance metrics."""
-    performance = await get_trader_performance(trader_id)
-    ai_insights = await get_ai_insights(trader_id)
+async def load_trader_profile(trader_id: str) -> Dict[str, Any]:
+    """Build a trader profile from the paper trading and AI pipeline services."""
+    unseeded = trader_id not in seeded_traders
+    performance, ai_insights, history = await asyncio.gather(
+        get_trader_performance(trader_id),
+        get_ai_insights(trader_id),
+        get_trade_history(trader_id) if unseeded else asyncio.sleep(0)
+    )
 
     if not performance:
         raise HTTPException(status_code=404, detail="Trader profile not found")
 
     account = performance["account"]
-    trades = performance.get("recent_trades", [])
+    if history is not None:
+        seed_trader(trader_id, history)
 
-    # Calculate comprehensive stats
-    total_trades = len(trades)
-    winning_trades = sum(1 for trade in trades if trade.get("pnl", 0) > 0)
-    win_rate = (winning_trades / total_trades) * 100 if total_trades > 0 else 0
-
-    total_pnl = sum(trade.get("pnl", 0) for trade in trades)
-    avg_trade_pnl = total_pnl / total_trades if total_trades > 0 else 0
+    # Period metrics come from the trade buckets built at ingest
+    periods = leaderboard_index.trader_stats(trader_id, time.time())
+    all_time = periods["all_time"]
 
     # Get social stats
     social = social_stats.get(trader_id, {"followers": 0, "following": 0})
@@ -397,39 +626,73 @@ async def get_trader_profile(trader_id: str):
         "trader_id": trader_id,
         "username": f"Trader_{trader_id[:8]}",  # Placeholder
         "performance": {
-            "total_pnl": total_pnl,
-            "win_rate": win_rate,
-            "total_trades": total_trades,
-            "avg_trade_pnl": avg_trade_pnl,
+            "total_pnl": all_time["total_pnl"],
+            "win_rate": all_time["win_rate"],
+            "total_trades": all_time["total_trades"],
+            "avg_trade_pnl": all_time["avg_trade_pnl"],
             "current_balance": account["balance"],
             "total_equity": account["equity"]
         },
+        "periods": periods,
         "social": {
             "followers": social["followers"],
             "following": social["following"]
         },
         "ai_insights": ai_insights,
-        "last_active": datetime.utcnow().isoformat(),
+        "last_active": to_iso(leaderboard_index.last_trade.get(trader_id, time.time())),
         "is_verified": account.get("trading_stats", {}).get("total_trades", 0) > 100,
         "specialties": ["forex", "stocks", "crypto"]  # Placeholder
     }
 
     return profile
 
+# Profiles are served from memory and reloaded in the background once stale
+profile_cache = ProfileCache(
+    load_trader_profile,
+    ttl=float(os.getenv("SOCIAL_PROFILE_TTL", "30")),
+    stale_ttl=float(os.getenv("SOCIAL_PROFILE_STALE_TTL", "300"))
+)
+
+@app.get("/api/v1/social/trader/{trader_id}/profile")
+async def get_trader_profile(trader_id: str):
+    """Get detailed trader profile with performance metrics."""
+    profile = await profile_cache.get(trader_id)
+
+    # Social counts change with every follow, so they are always current
+    social = social_stats.get(trader_id, {"followers": 0, "following": 0})
+    return {**profile, "social": {"followers": social["followers"], "following": social["following"]}}
+
+@app.get("/api/v1/social/profile-stats")
+async def get_profile_stats():
+    """Counters of the trader profile cache."""
+    return profile_cache.status()
+
 @app.post("/api/v1/social/trade-notification")
-async def handle_trade_notification(trade_data: Dict[str, Any], background_tasks: BackgroundTasks):
+async def handle_trade_notification(trade_data: Dict[str, Any]):
     """Handle trade notifications from paper trading service for copy trading."""
     trader_id = trade_data.get("account_id")
     if not trader_id:
         raise HTTPException(status_code=400, detail="Missing trader_id in trade data")
 
-    # Copy trade to followers if copy trading is enabled
-    background_tasks.add_task(copy_trade_to_followers, trader_id, trade_data)
+    queued = await process_trade(trader_id, trade_data)
+
+    return {"message": "Trade notification processed", "copies_queued": queued}
+
+@app.get("/api/v1/social/fill-stats")
+async def get_fill_stats():
+    """Counters of the paper trading fill consumer."""
+    return {**fill_consumer.status(), "enabled": fill_consumer.source is not None}
 
-    # Update leaderboards
-    background_tasks.add_task(update_leaderboards)
+@app.get("/api/v1/social/copy-stats")
+async def get_copy_stats():
+    """Counters of the copy-trade fan-out queue."""
+    queued = copy_dispatcher.queue.qsize() if copy_dispatcher.queue is not None else 0
+    return {**copy_dispatcher.stats, "queued_batches": queued, "http": service_client.status()}
 
-    return {"message": "Trade notification processed"}
+@app.get("/api/v1/social/refresh-stats")
+async def get_refresh_stats():
+    """Counters of the leaderboard refresh scheduler."""
+    return refresh_scheduler.status()
 
 @app.get("/health")
 async def health_check():
@@ -440,8 +703,32 @@ async def health_check():
 @app.on_event("startup")
 async def startup_event():
     """Initialize service on startup."""
-    # Initial leaderboard update
-    await update_leaderboards()
+    follow_graph.load()
+    for user_id, followers, following in follow_store.counts():
+        social_stats[user_id] = {"followers": followers, "following": following}
+    print(f"Loaded {len(social_stats)} users from the follow store")
+
+    service_client.start()
+    copy_dispatcher.start()
+    refresh_scheduler.start()
+    if fill_consumer.source is not None:
+        fill_consumer.start()
+
+    # Seed the leaderboards in the background; until that refresh finishes
+    # they are served as they are, possibly empty, instead of delaying boot
+    for user_id in social_stats:
+        refresh_scheduler.mark_dirty(user_id)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Submit queued copy orders and close connections before exiting."""
+    await fill_consumer.stop()
+    await refresh_scheduler.stop()
+    await copy_dispatcher.stop()
+    await service_client.close()
+    follow_store.close()
+    if fill_consumer.source is not None and FILL_LOG:
+        fill_consumer.source.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,90 @@
+"""
+Trader profile cache for the Social Trading service.
+
+Profiles are served from memory while fresh. Once older than the TTL they are
+still served, for up to a further stale window, while a single background
+task reloads them (stale-while-revalidate), so popular profiles never wait
+on the upstream services. Concurrent misses for the same trader share one
+load, and a trade notification for a trader drops their cached profile.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+Loader = Callable[[str], Awaitable[Any]]
+
+
+class ProfileCache:
+    """TTL cache with stale-while-revalidate and single-flight loads."""
+
+    def __init__(self, loader: Loader, ttl: float = 30.0, stale_ttl: float = 300.0, max_entries: int = 10000):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+
+        self.entries: Dict[str, Tuple[float, Any]] = {}  # key -> (loaded at, value)
+        self._loads: Dict[str, asyncio.Future] = {}
+        # Bumped by invalidate() so loads started before it are not cached
+        self._generations: Dict[str, int] = {}
+
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "revalidations": 0, "invalidations": 0}
+
+    async def get(self, key: str) -> Any:
+        entry = self.entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self.stats["hits"] += 1
+                return entry[1]
+            if age < self.ttl + self.stale_ttl:
+                self.stats["stale_hits"] += 1
+                if key not in self._loads:
+                    self.stats["revalidations"] += 1
+                    self._load(key).add_done_callback(self._ignore_error)
+                return entry[1]
+
+        self.stats["misses"] += 1
+        load = self._loads.get(key) or self._load(key)
+        return await asyncio.shield(load)
+
+    def invalidate(self, key: str):
+        self._generations[key] = self._generations.get(key, 0) + 1
+        # Later lookups must not join a load that may predate the change
+        self._loads.pop(key, None)
+        if self.entries.pop(key, None) is not None:
+            self.stats["invalidations"] += 1
+
+    def _load(self, key: str) -> asyncio.Future:
+        task = asyncio.ensure_future(self._fetch(key, self._generations.get(key, 0)))
+        self._loads[key] = task
+        return task
+
+    async def _fetch(self, key: str, generation: int) -> Any:
+        try:
+            value = await self.loader(key)
+        finally:
+            if self._loads.get(key) is asyncio.current_task():
+                del self._loads[key]
+        if self._generations.get(key, 0) == generation:
+            if key not in self.entries and len(self.entries) >= self.max_entries:
+                # Evict the least recently loaded profile
+                del self.entries[next(iter(self.entries))]
+            self.entries.pop(key, None)
+            self.entries[key] = (time.monotonic(), value)
+        return value
+
+    @staticmethod
+    def _ignore_error(task: asyncio.Future):
+        # A failed revalidation keeps serving the stale value until it expires
+        if not task.cancelled():
+            task.exception()
+
+    def status(self):
+        lookups = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "hit_ratio": (self.stats["hits"] + self.stats["stale_hits"]) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,95 @@
+"""
+Leaderboard refresh scheduling for the Social Trading service.
+
+Follows and trade notifications mark the trader they concern as dirty instead
+of starting a refresh each. A single background task refreshes the dirty
+traders in one pass, at most once per minimum interval, so a burst of
+activity costs one refresh of the traders that changed, not one full refresh
+per request.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional, Set
+
+Refresh = Callable[[List[str]], Awaitable[None]]
+
+
+class RefreshScheduler:
+    """Coalesces per-trader refresh triggers into debounced batch refreshes."""
+
+    def __init__(self, refresh: Refresh, min_interval: float = 5.0):
+        self.refresh = refresh
+        self.min_interval = min_interval
+
+        self.dirty: Set[str] = set()
+        self.running = False
+        self.last_run: Optional[float] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "triggers": 0,
+            "coalesced": 0,   # trader already waiting for a refresh
+            "skipped": 0,     # trigger absorbed by a refresh already pending or running
+            "runs": 0,
+            "traders_refreshed": 0,
+            "failures": 0,
+        }
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def mark_dirty(self, trader_id: str):
+        if self._task is None:
+            self.start()
+        self.stats["triggers"] += 1
+        if trader_id in self.dirty:
+            self.stats["coalesced"] += 1
+            return
+        if self.dirty or self.running:
+            self.stats["skipped"] += 1
+        self.dirty.add(trader_id)
+        self._wake.set()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+
+            # Debounce: triggers arriving meanwhile join this refresh
+            if self.last_run is not None:
+                delay = self.last_run + self.min_interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            trader_ids, self.dirty = list(self.dirty), set()
+            if not trader_ids:
+                continue
+
+            self.running = True
+            self.last_run = time.monotonic()
+            try:
+                await self.refresh(trader_ids)
+            except Exception as e:
+                print(f"Error refreshing leaderboards: {e}")
+                self.stats["failures"] += 1
+            finally:
+                self.running = False
+            self.stats["runs"] += 1
+            self.stats["traders_refreshed"] += len(trader_ids)
+
+    def status(self):
+        return {**self.stats, "dirty": len(self.dirty), "running": self.running,
+                "min_interval": self.min_interval}
@@ -0,0 +1,115 @@
+"""
+Shared HTTP client for calls from the Social Trading service to other services.
+
+One pooled ``httpx.AsyncClient`` is opened at startup and closed at shutdown,
+so connections are kept alive and reused (over HTTP/2 when the ``h2``
+package is installed) instead of being set up for every call. Concurrency is
+bounded by a semaphore so leaderboard refreshes and copy fan-out cannot
+exhaust the pool, and failed calls are retried with exponential backoff and
+full jitter.
+
+Calls that are not idempotent, such as order submission, are only retried
+when the connection could not be made, so a request is never sent twice.
+"""
+
+import asyncio
+import random
+from typing import Any, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Safe to retry whether or not the request reached the server
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+# The request never left this process, so retrying cannot duplicate it
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class ServiceClient:
+    """Pooled, concurrency-bounded HTTP client with retries."""
+
+    def __init__(self, max_connections: int = 100, max_concurrency: int = 50,
+                 timeout: float = 10.0, retries: int = 2, backoff: float = 0.1,
+                 http2: bool = True, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.transport = transport
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    def start(self):
+        limits = httpx.Limits(max_connections=self.max_connections,
+                              max_keepalive_connections=self.max_connections)
+        self._client = httpx.AsyncClient(http2=self.http2, limits=limits,
+                                         timeout=self.timeout, transport=self.transport)
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method: str, url: str, *, timeout: Optional[float] = None,
+                      retries: Optional[int] = None, idempotent: bool = True, **kwargs: Any) -> httpx.Response:
+        """Send a request, retrying transient failures.
+
+        Returns the last response (which may be an error status) or raises the
+        last transport error once the retries are used up.
+        """
+        if self._client is None:
+            self.start()
+        retries = self.retries if retries is None else retries
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+
+        attempt = 0
+        while True:
+            self.stats["requests"] += 1
+            try:
+                async with self._slots:
+                    self.in_flight += 1
+                    try:
+                        response = await self._client.request(method, url, **kwargs)
+                    finally:
+                        self.in_flight -= 1
+            except httpx.TransportError as e:
+                retryable = idempotent or isinstance(e, NOT_SENT_ERRORS)
+                if not retryable or attempt >= retries:
+                    self.stats["failures"] += 1
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or not idempotent or attempt >= retries:
+                    return response
+
+            self.stats["retries"] += 1
+            # Full jitter, so callers that failed together do not retry together
+            await asyncio.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+            attempt += 1
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def status(self):
+        return {
+            **self.stats,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+        }
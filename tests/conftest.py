@@ -0,0 +1,31 @@
+"""
+Shared fixtures for the service tests.
+"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+PAPER_TRADING_DIR = os.path.join(os.path.dirname(__file__), '..', 'services', 'paper-trading')
+
+
+@pytest.fixture
+def load_paper_trading(monkeypatch):
+    """Import fresh copies of the paper trading service; its environment is restored after the test."""
+    if PAPER_TRADING_DIR not in sys.path:
+        sys.path.append(PAPER_TRADING_DIR)
+
+    def load(data_dir, **env):
+        monkeypatch.setenv("PAPER_TRADING_DATA_DIR", str(data_dir))
+        # Keep the simulated feed from moving prices underneath assertions
+        monkeypatch.setenv("PAPER_TRADING_TICK_INTERVAL", os.environ.get("PAPER_TRADING_TICK_INTERVAL", "3600"))
+        for key, value in env.items():
+            monkeypatch.setenv(key, str(value))
+        spec = importlib.util.spec_from_file_location("paper_trading_main", os.path.join(PAPER_TRADING_DIR, "main.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    return load
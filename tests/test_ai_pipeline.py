@@ -0,0 +1,337 @@
+"""
+Tests for the AI Pipeline service's compute modules.
+Run with: python -m pytest tests/test_ai_pipeline.py -v
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+from pydantic import BaseModel
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), '..', 'services', 'ai-pipeline')
+sys.path.insert(0, SERVICE_DIR)
+
+from batch_runner import BatchModel, stream_batch  # noqa: E402
+from chart_patterns import detect_patterns, scan_symbols  # noqa: E402
+from market_analytics import backtest_trades, grid_search, portfolio_insights, predict  # noqa: E402
+from portfolio_optimizer import OBJECTIVES, CovarianceCache, ledoit_wolf, optimize  # noqa: E402
+from result_cache import ResultCache  # noqa: E402
+from sentiment_lexicon import NEWS_LEXICON, SOCIAL_LEXICON, Lexicon, sentiment_score  # noqa: E402
+
+
+class Item(BaseModel):
+    value: float
+
+
+async def collect(model, items, concurrency=4):
+    return [json.loads(line) async for line in stream_batch(model, items, concurrency)]
+
+
+class TestBatchRunner:
+    """Test cases for streamed batch execution."""
+
+    def test_item_errors_do_not_fail_the_batch(self):
+        """Invalid and failing items get error lines; the rest succeed concurrently."""
+        state = {"active": 0, "peak": 0}
+
+        async def process(data):
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.01)
+            state["active"] -= 1
+            if data["value"] < 0:
+                raise ValueError("negative value")
+            return {"double": data["value"] * 2}
+
+        items = [{"value": index} for index in range(20)] + [{"value": "x"}, {"value": -1}, "not an object"]
+        lines = asyncio.run(collect(BatchModel(Item, process), items))
+
+        results = {line["index"]: line for line in lines[:-1]}
+        assert len(results) == len(items)
+        assert results[3] == {"index": 3, "status": "ok", "result": {"double": 6.0}}
+        assert results[20]["status"] == "error" and results[20]["error"].startswith("value:")
+        assert results[21] == {"index": 21, "status": "error", "error": "negative value"}
+        assert results[22] == {"index": 22, "status": "error", "error": "item must be an object"}
+        assert lines[-1] == {"summary": {"total": 23, "succeeded": 20, "failed": 3}}
+        assert state["peak"] <= 4
+
+    def test_vectorized_models_process_items_in_one_call(self):
+        calls = []
+
+        async def process_many(batch):
+            calls.append(len(batch))
+            return [ValueError("zero") if data["value"] == 0 else data["value"] for data in batch]
+
+        async def process(data):
+            raise AssertionError("vectorized models are not run item by item")
+
+        lines = asyncio.run(collect(BatchModel(Item, process, process_many=process_many),
+                                    [{"value": 1}, {"value": 0}, {"value": 2}]))
+        assert calls == [3]
+        assert [line.get("status") for line in lines[:-1]] == ["ok", "error", "ok"]
+        assert lines[-1]["summary"]["failed"] == 1
+
+
+def swings(*levels, bars=20):
+    """A series moving in straight lines between the given levels."""
+    points = [np.linspace(start, end, bars, endpoint=False) for start, end in zip(levels[:-1], levels[1:])]
+    return np.append(np.concatenate(points), levels[-1])
+
+
+def found(close, **params):
+    params = {"order": 3, "threshold": 0.02, **params}
+    return [(pattern["pattern"], pattern["pivots"]) for pattern in detect_patterns(close, close, close, **params)]
+
+
+class TestChartPatterns:
+    """Test cases for the vectorized chart pattern detector."""
+
+    def test_templates_are_found_with_positions(self):
+        assert ("head_and_shoulders", [20, 40, 60, 80, 100]) in found(swings(100, 110, 104, 120, 104, 110, 95))
+        assert ("inverse_head_and_shoulders", [20, 40, 60, 80, 100]) in found(
+            swings(110, 100, 106, 90, 106, 100, 115))
+        assert found(swings(100, 110, 102, 110.5, 90)) == [("double_top", [20, 40, 60])]
+        assert ("ascending_triangle", [20, 40, 60, 80, 100]) in found(swings(100, 90, 110, 100, 110, 103, 110.2))
+        assert found(swings(120, 100, 112, 104, 108, 105, 106)) == [("symmetrical_triangle", [20, 40, 60, 80, 100])]
+
+    def test_flag_after_a_quick_move(self):
+        close = np.concatenate([swings(110, 100, 115, bars=6), 115 - np.linspace(0, 3, 12), swings(112, 125)[1:]])
+        assert found(close) == [("bull_flag", [6, 12])]
+
+    def test_flat_series_and_bad_settings(self):
+        """Runs without height match nothing and raise no warnings; invalid settings raise ValueError."""
+        flat = np.full(50, 100.0)
+        with np.errstate(all="raise"):
+            assert detect_patterns(flat, flat, flat, order=2) == []
+        close = swings(100, 110, 102, 110.5, 90)
+        for params in ({"order": -2}, {"tolerance": 0}, {"threshold": -0.1}):
+            with pytest.raises(ValueError):
+                found(close, **params)
+        with pytest.raises(ValueError):
+            found(np.append(close, 0.0))
+
+    def test_large_series_and_many_symbols(self):
+        """All occurrences in 100k bars come back quickly, for each symbol scanned."""
+        rng = np.random.default_rng(7)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, 100000)))
+        series = {"EURUSD": {"close": close.tolist()}, "GBPUSD": {"close": (close[::-1] * 1.2).tolist()}}
+
+        started = time.perf_counter()
+        patterns = detect_patterns(close * 1.001, close * 0.999, close)
+        elapsed = time.perf_counter() - started
+
+        assert len(patterns) > 100
+        assert all(0 <= pattern["start_index"] < pattern["end_index"] < len(close) for pattern in patterns)
+        assert elapsed < 1
+        assert set(scan_symbols(series)) == {"EURUSD", "GBPUSD"}
+
+
+class TestSentimentLexicon:
+    """Test cases for the compiled sentiment lexicon."""
+
+    def test_whole_words_phrases_and_weights(self):
+        lexicon = Lexicon({"rally": 0.5, "record high": 0.25, "weak": -0.5})
+        assert lexicon.score("Stocks RALLY to a record  high") == 0.75
+        assert lexicon.score("Rallying stocks, weakness elsewhere") == 0.0
+        assert lexicon.score("rally rally rally rally") == 1.0  # Clipped
+
+    def test_negation_stops_at_window_and_clause(self):
+        assert NEWS_LEXICON.score("The outlook is not bullish") == -1.0
+        assert NEWS_LEXICON.score("No gains; bearish week ahead") == -1.0
+        assert NEWS_LEXICON.score("Not that anyone expected the rally") == 1.0
+
+    def test_emoji_and_batches(self):
+        posts = ["to the moon 🚀🚀", "this will crash📉", "never going to dump", "lunch"]
+        assert SOCIAL_LEXICON.score_many(posts).tolist() == [1.0, -1.0, 1.0, 0.0]
+        scores = sentiment_score(NEWS_LEXICON.score_many(["strong rally", "weak"]), SOCIAL_LEXICON.score_many(posts))
+        assert scores["news"] == 0.25
+        assert scores["overall"] == 0.25 * 0.7 + 0.25 * 0.3
+
+
+def factor_returns(assets, periods, seed=3):
+    """Daily returns driven by a few shared factors plus asset noise."""
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0, 0.01, (periods, 4)) @ rng.normal(0, 0.5, (4, assets))
+    return factors + rng.normal(0, 0.01, (periods, assets)) + rng.normal(0.0004, 0.0003, assets)
+
+
+class TestPortfolioOptimizer:
+    """Test cases for the mean-variance portfolio optimizer."""
+
+    def test_shrinkage_grows_with_fewer_observations(self):
+        returns = factor_returns(50, 1000)
+        _, plenty = ledoit_wolf(returns)
+        covariance, scarce = ledoit_wolf(returns[:60])
+        assert 0 <= plenty < scarce <= 1
+        assert np.linalg.eigvalsh(covariance)[0] > 0
+
+    def test_objectives_match_their_definitions(self):
+        returns = factor_returns(8, 500)
+        symbols = [f"A{i}" for i in range(8)]
+        covariance, _ = ledoit_wolf(returns)
+        covariance *= 252
+
+        # Unconstrained minimum variance has a closed form
+        result = optimize(symbols, returns, "min_variance", min_weight=-5, max_weight=5)
+        weights = np.array(list(result["weights"].values()))
+        inverse = np.linalg.solve(covariance, np.ones(8))
+        assert np.allclose(weights, inverse / inverse.sum(), atol=1e-4)
+
+        # Risk contributions are equal
+        weights = np.array(list(optimize(symbols, returns, "risk_parity")["weights"].values()))
+        contributions = weights * (covariance @ weights)
+        assert np.allclose(contributions, contributions.mean(), rtol=1e-4)
+
+        # Max-Sharpe beats the other portfolios and respects the bounds
+        results = {objective: optimize(symbols, returns, objective, max_weight=0.3) for objective in OBJECTIVES}
+        weights = np.array(list(results["max_sharpe"]["weights"].values()))
+        assert abs(weights.sum() - 1) < 1e-9 and weights.min() >= 0 and weights.max() <= 0.3 + 1e-9
+        best = results["max_sharpe"]["sharpe_ratio"]
+        assert all(best >= result["sharpe_ratio"] - 1e-6 for result in results.values())
+
+    def test_bounded_risk_parity_equalizes_the_free_assets(self):
+        """Assets inside the bounds share one contribution; capped assets contribute less."""
+        returns = factor_returns(8, 500)
+        covariance, _ = ledoit_wolf(returns)
+        covariance *= 252
+        weights = np.array(list(optimize([f"A{i}" for i in range(8)], returns, "risk_parity",
+                                         max_weight=0.14)["weights"].values()))
+        contributions = weights * (covariance @ weights)
+        capped = weights >= 0.14 - 1e-9
+        assert abs(weights.sum() - 1) < 1e-9 and capped.any() and not capped.all()
+        assert np.allclose(contributions[~capped], contributions[~capped].mean(), rtol=1e-4)
+        assert contributions[capped].max() < contributions[~capped].min()
+
+    def test_degenerate_inputs(self):
+        """Constant series are regularized, all-constant or repeated symbols are refused."""
+        returns = factor_returns(3, 200)
+        returns[:, 1] = 0.001
+        for objective in OBJECTIVES:
+            weights = np.array(list(optimize(["A", "B", "C"], returns, objective)["weights"].values()))
+            assert np.isfinite(weights).all() and abs(weights.sum() - 1) < 1e-9
+        with pytest.raises(ValueError):
+            optimize(["A", "B"], np.full((20, 2), 0.001), "risk_parity")
+        with pytest.raises(ValueError):
+            optimize(["A", "A"], returns[:, :2], "min_variance")
+
+    def test_large_universe_and_covariance_cache(self):
+        """500 assets optimize in under a second, and the covariance is estimated once per window."""
+        returns = factor_returns(500, 756)
+        symbols = [f"A{i}" for i in range(500)]
+        cache = CovarianceCache()
+
+        for objective in OBJECTIVES:
+            started = time.perf_counter()
+            result = optimize(symbols, returns, objective, max_weight=0.05, cache=cache)
+            assert time.perf_counter() - started < 1
+            assert abs(sum(result["weights"].values()) - 1) < 1e-9
+
+        optimize(symbols, returns[1:], "min_variance", cache=cache)
+        assert cache.status()["hits"] == 2 and cache.status()["misses"] == 2
+
+
+class TestMarketAnalytics:
+    """Test cases for the price-series analytics behind the model endpoints."""
+
+    def test_trades_exit_at_stop_or_target_and_wait_for_the_signal(self):
+        # Above the 2-bar average at bar 2; +5% hits the target, then the drop stops the next trade out
+        prices = np.array([100, 100, 101, 103, 106.05, 107, 104, 100, 99, 99])
+        returns = backtest_trades(prices, stop_loss=0.02, take_profit=0.04, ma_period=2)
+        assert np.allclose(returns, [106.05 / 101 - 1, 104 / 107 - 1])
+
+        results = grid_search(prices, [0.02, 0.1], [0.04], "total_return", ma_period=2)
+        assert results[0]["fitness_score"] >= results[1]["fitness_score"]
+        assert {result["parameters"]["stop_loss"] for result in results} == {0.02, 0.1}
+
+    def test_prediction_follows_the_trend(self):
+        rising = 100 * np.exp(np.linspace(0, 0.2, 100))
+        up = predict(rising, ["RSI"])
+        assert up["prediction"] == "bullish" and up["price_target"] > rising[-1]
+        assert any("RSI" in factor for factor in up["key_factors"])
+        assert predict(rising[::-1], [])["prediction"] == "bearish"
+
+    def test_insights_from_positions(self):
+        insights = portfolio_insights(
+            [{"symbol": "EUR/USD", "position": "long", "size": 1000},
+             {"symbol": "EURGBP", "position": "long", "size": 500},
+             {"symbol": "USD/JPY", "position": "short", "size": 100}],
+            {"trend": "bearish", "volatility": 0.1},
+        )
+        titles = {insight["title"]: insight for insight in insights}
+        assert "long EUR" in titles["Portfolio Concentration"]["description"]
+        assert titles["Positions Against the Trend"]["description"].endswith("EUR/USD, EURGBP")
+        assert "Elevated Volatility" not in titles
+
+
+class TestResultCache:
+    """Test cases for the content-addressed model result cache."""
+
+    def test_repeats_are_served_from_memory_until_the_ttl(self):
+        calls = []
+
+        async def model(data):
+            calls.append(data)
+            await asyncio.sleep(0.01)
+            if data["symbol"] == "bad":
+                raise ValueError("no data")
+            return {"symbol": data["symbol"]}
+
+        async def run():
+            cache = ResultCache(model, ttl=60, max_entries=2)
+            # Concurrent identical requests share one computation; key order does not matter
+            first, second = await asyncio.gather(cache({"symbol": "EUR", "timeframe": "1h"}),
+                                                 cache({"timeframe": "1h", "symbol": "EUR"}))
+            assert first is second and len(calls) == 1
+            assert await cache({"symbol": "EUR", "timeframe": "1h"}) is first
+            assert len(calls) == 1
+
+            # Failures are not cached
+            for _ in range(2):
+                try:
+                    await cache({"symbol": "bad"})
+                except ValueError:
+                    pass
+            assert len(calls) == 3
+
+            # Full: the oldest result is evicted
+            await cache({"symbol": "GBP"})
+            await cache({"symbol": "JPY"})
+            assert cache.stats["evictions"] == 1
+            await cache({"symbol": "EUR", "timeframe": "1h"})
+            assert len(calls) == 6
+
+            cache.ttl = 0
+            await cache({"symbol": "JPY"})
+            return cache.status()
+
+        status = asyncio.run(run())
+        assert status["expirations"] == 1
+        assert status["hits"] == 1 and status["shared"] == 1
+        assert 0 < status["hit_ratio"] < 1
+
+    def test_batches_compute_only_uncached_items(self):
+        batches = []
+
+        async def model(data):
+            return data["value"]
+
+        async def model_many(items):
+            batches.append([data["value"] for data in items])
+            return [ValueError("zero") if data["value"] == 0 else data["value"] * 10 for data in items]
+
+        async def run():
+            cache = ResultCache(model)
+            await cache({"value": 1})
+            results = await cache.many([{"value": 1}, {"value": 2}, {"value": 2}, {"value": 0}], model_many)
+            again = await cache.many([{"value": 2}, {"value": 0}], model_many)
+            return results, again
+
+        results, again = asyncio.run(run())
+        assert results[:3] == [1, 20, 20] and isinstance(results[3], ValueError)
+        assert again[0] == 20 and isinstance(again[1], ValueError)
+        assert batches == [[2, 0], [0]]
@@ -0,0 +1,724 @@
+"""
+Tests for the Paper Trading service.
+Run with: python -m pytest tests/test_paper_trading.py -v
+"""
+
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), '..', 'services', 'paper-trading')
+sys.path.insert(0, SERVICE_DIR)
+
+
+@pytest.fixture
+def service(tmp_path, load_paper_trading):
+    return load_paper_trading(tmp_path)
+
+
+def create_account(client, **overrides):
+    payload = {"user_id": 1, "initial_balance": 10000.0}
+    payload.update(overrides)
+    response = client.post("/api/v1/paper-trading/accounts", json=payload)
+    assert response.status_code == 200
+    return response.json()["account_id"]
+
+
+def publish_price(client, service, symbol, mid_price):
+    """Publish a tick on the service's event loop and wait for the stop-outs it queued."""
+    async def publish():
+        service.publish_price(symbol, mid_price)
+        await service.shards.drain()
+    client.portal.call(publish)
+
+
+def place_order(client, account_id, symbol="EUR/USD", side="buy", quantity=0.1, **extra):
+    payload = {
+        "account_id": account_id,
+        "symbol": symbol,
+        "order_type": "market",
+        "side": side,
+        "quantity": quantity,
+    }
+    payload.update(extra)
+    return client.post("/api/v1/paper-trading/orders", json=payload)
+
+
+class TestPersistence:
+    """Test cases for the write-ahead log and snapshots."""
+
+    def test_state_survives_restart(self, tmp_path, load_paper_trading):
+        """Accounts, positions and trades are recovered from the log."""
+        service = load_paper_trading(tmp_path)
+        with TestClient(service.app) as client:
+            account_id = create_account(client)
+            position_id = place_order(client, account_id).json()["position_id"]
+            client.post(f"/api/v1/paper-trading/positions/{position_id}/close",
+                        json={"position_id": position_id})
+
+        restarted = load_paper_trading(tmp_path)
+        with TestClient(restarted.app) as client:
+            response = client.get(f"/api/v1/paper-trading/accounts/{account_id}",
+                                  params={"include_history": True})
+            assert response.status_code == 200
+            body = response.json()
+            assert body["account"]["trading_stats"]["total_trades"] == 1
+            assert [trade["type"] for trade in body["recent_trades"]] == ["open", "close"]
+            assert restarted.paper_positions[int(position_id)].status == "closed"
+
+    def test_recovery_replays_only_events_after_snapshot(self, tmp_path, load_paper_trading):
+        """A snapshot bounds the number of events replayed on startup."""
+        service = load_paper_trading(tmp_path, PAPER_TRADING_SNAPSHOT_EVERY=3)
+        with TestClient(service.app) as client:
+            account_id = create_account(client)
+            for _ in range(5):
+                assert place_order(client, account_id).status_code == 200
+
+        restarted = load_paper_trading(tmp_path, PAPER_TRADING_SNAPSHOT_EVERY=3)
+        replayed = restarted.event_log.recover(restarted.restore_snapshot, restarted.apply_event)
+        assert replayed < 3
+        assert len(restarted.trade_history[int(account_id)]) == 5
+
+    def test_netting_lots_are_logged_as_deltas(self, tmp_path, load_paper_trading):
+        """Fills log the lot they add or take, and recovery rebuilds the queue from them."""
+        service = load_paper_trading(tmp_path)
+        with TestClient(service.app) as client:
+            account_id = create_account(client, position_mode="netting")
+            for quantity in (0.1, 0.2, 0.3):
+                position_id = place_order(client, account_id, quantity=quantity).json()["position_id"]
+            place_order(client, account_id, side="sell", quantity=0.25)
+            lots = service.paper_positions[int(position_id)].lots.to_state()
+
+        events = []
+        for name in sorted(os.listdir(tmp_path)):
+            if name.startswith("wal-"):
+                with open(tmp_path / name) as f:
+                    events.extend(json.loads(line) for line in f)
+        positions = [event["data"] for event in events if event["type"] == "position"]
+        assert [state[-1] is not None for state in positions] == [True, False, False, False]
+        assert [list(event["data"]) for event in events if event["type"] == "lots"] == [
+            ["position_id", "push"], ["position_id", "push"], ["position_id", "consume"]]
+
+        restarted = load_paper_trading(tmp_path)
+        restarted.event_log.recover(restarted.restore_snapshot, restarted.apply_event)
+        position = restarted.paper_positions[int(position_id)]
+        assert position.lots.to_state() == lots
+        assert position.lots.average_price() == pytest.approx(position.entry_price)
+
+    def test_events_appended_during_snapshot_flush_are_not_duplicated(self, tmp_path):
+        """Events appended while a snapshot's flush is in flight are replayed exactly once."""
+        from persistence import EventLog
+
+        async def run():
+            applied = []
+            log = EventLog(str(tmp_path / "log"), flush_interval=0.001, snapshot_every=10)
+            write_batch = log._write_batch
+
+            def slow_write(batch):
+                time.sleep(0.02)
+                write_batch(batch)
+
+            log._write_batch = slow_write
+            await log.start(lambda: {"applied": list(applied)})
+            for n in range(25):
+                applied.append(n)
+                log.append("event", {"n": n})
+                await asyncio.sleep(0.005)
+            # Crash once everything is flushed, without a final snapshot
+            await asyncio.sleep(0.1)
+            log._writer_task.cancel()
+            log._segment.close()
+            return applied
+
+        applied = asyncio.run(run())
+        recovered = []
+        EventLog(str(tmp_path / "log")).recover(lambda state: recovered.extend(state["applied"]),
+                                                lambda event_type, data: recovered.append(data["n"]))
+        assert recovered == applied
+
+    def test_torn_write_is_truncated_before_new_appends(self, tmp_path):
+        """Events written after recovering from a torn line survive the next recovery."""
+        from persistence import EventLog
+
+        async def write(log, first, count):
+            await log.start(dict)
+            for n in range(first, first + count):
+                log.append("event", {"n": n})
+            await log.stop()
+
+        def recover():
+            log = EventLog(str(tmp_path))
+            recovered = []
+            log.recover(dict, lambda event_type, data: recovered.append(data["n"]))
+            return log, recovered
+
+        log, _ = recover()
+        asyncio.run(write(log, 0, 3))
+        # Crash halfway through the fourth event, which is in the segment the restart reopens
+        log, _ = recover()
+        with open(tmp_path / "wal-00000000000000000004.log", "w") as f:
+            f.write('{"seq": 4, "type": "ev')
+        log, recovered = recover()
+        assert recovered == [0, 1, 2]
+        asyncio.run(write(log, 3, 2))
+        assert recover()[1] == [0, 1, 2, 3, 4]
+
+
+class TestOrderValidation:
+    """Test cases for orders refused before they change any state."""
+
+    def test_unknown_side_or_type_is_refused(self, service):
+        """Sides and order types outside the supported ones leave the account untouched."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client)
+            assert place_order(client, account_id, side="BUY").status_code == 422
+            assert place_order(client, account_id, order_type="trailing").status_code == 422
+            assert service.paper_orders == {}
+            assert service.paper_accounts[int(account_id)].margin_used == 0.0
+
+    def test_non_positive_quantity_is_refused(self, service):
+        """Zero and negative quantities never reach the order book."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client)
+            assert place_order(client, account_id, quantity=0).status_code == 422
+            assert place_order(client, account_id, quantity=-1).status_code == 422
+            assert service.paper_orders == {}
+
+
+class TestIncrementalValuation:
+    """Test cases for tick-driven account equity and margin."""
+
+    def test_tick_revalues_account(self, service):
+        """A price tick updates equity and free margin of accounts holding the symbol."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client)
+            place_order(client, account_id, symbol="EUR/USD", side="buy", quantity=1)
+            position = next(iter(service.paper_positions.values()))
+
+            publish_price(client, service, "EUR/USD", 1.1000)
+            bid = service.latest_quotes["EUR/USD"]["bid"]
+            expected_pnl = (bid - position.entry_price) * 100000
+
+            account = client.get(f"/api/v1/paper-trading/accounts/{account_id}").json()["account"]
+            assert account["unrealized_pnl"] == pytest.approx(expected_pnl)
+            assert account["equity"] == pytest.approx(10000.0 + expected_pnl)
+            assert account["free_margin"] == pytest.approx(account["equity"] - account["margin_used"])
+
+    def test_close_realizes_pnl_and_flattens_exposure(self, service):
+        """Closing the last position leaves equity equal to balance."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client)
+            first = place_order(client, account_id, symbol="AAPL", quantity=10).json()["position_id"]
+            place_order(client, account_id, symbol="EUR/USD", side="sell", quantity=0.1)
+            client.post(f"/api/v1/paper-trading/positions/{first}/close", json={"position_id": first})
+
+            body = client.get(f"/api/v1/paper-trading/accounts/{account_id}").json()
+            assert set(body["exposure"]) == {"EUR/USD"}
+            assert body["exposure"]["EUR/USD"] == pytest.approx(-10000.0)
+            assert len(body["positions"]) == 1
+            assert service.symbol_holders["AAPL"] == set()
+
+
+class TestStopOut:
+    """Test cases for margin calls and stop-outs on price ticks."""
+
+    def test_margin_call_then_stop_out(self, service):
+        """Falling margin level first flags a margin call, then liquidates."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client, initial_balance=1000.0)
+            position_id = place_order(client, account_id, quantity=0.5).json()["position_id"]
+
+            publish_price(client, service, "EUR/USD", 1.0740)
+            account = service.paper_accounts[int(account_id)]
+            assert account.margin_call is True
+            assert service.paper_positions[int(position_id)].status == "open"
+
+            publish_price(client, service, "EUR/USD", 1.0600)
+            assert service.paper_positions[int(position_id)].close_reason == "stop_out"
+            assert account.margin_used == pytest.approx(0.0)
+            assert account.margin_call is False
+
+    def test_largest_loss_is_liquidated_first(self, service):
+        """Only as many positions are closed as needed, worst first."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client, initial_balance=1000.0)
+            losing = place_order(client, account_id, side="buy", quantity=0.4).json()["position_id"]
+            hedge = place_order(client, account_id, symbol="AAPL", side="buy", quantity=1).json()["position_id"]
+
+            publish_price(client, service, "EUR/USD", 1.0650)
+            assert service.paper_positions[int(losing)].status == "closed"
+            assert service.paper_positions[int(hedge)].status == "open"
+            assert service.trade_history[int(account_id)].recent(1)[0]["reason"] == "stop_out"
+
+
+class TestBatchEndpoints:
+    """Test cases for bulk order placement and bulk closes."""
+
+    def test_batch_orders_are_atomic_per_account(self, service):
+        """A rejected order rejects its account's batch but not other accounts'."""
+        with TestClient(service.app) as client:
+            rich = create_account(client)
+            poor = create_account(client, initial_balance=100.0)
+            orders = [
+                {"account_id": rich, "symbol": "EUR/USD", "order_type": "market", "side": "buy", "quantity": 0.1},
+                {"account_id": poor, "symbol": "AAPL", "order_type": "market", "side": "buy", "quantity": 1},
+                {"account_id": rich, "symbol": "AAPL", "order_type": "market", "side": "sell", "quantity": 2},
+                {"account_id": poor, "symbol": "EUR/USD", "order_type": "market", "side": "buy", "quantity": 1},
+            ]
+            body = client.post("/api/v1/paper-trading/orders/batch", json={"orders": orders}).json()
+
+            assert [result["status"] for result in body["results"]] == ["filled", "rejected", "filled", "rejected"]
+            assert body["results"][3]["error"] == "Insufficient margin"
+            assert body["filled"] == 2
+            assert service.open_positions.get(int(poor), set()) == set()
+            assert len(service.open_positions[int(rich)]) == 2
+
+    def test_batch_margin_is_reserved_across_items(self, service):
+        """Orders in one batch cannot spend the same free margin twice."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client, initial_balance=1000.0)
+            order = {"account_id": account_id, "symbol": "EUR/USD", "order_type": "market",
+                     "side": "buy", "quantity": 0.5}
+            body = client.post("/api/v1/paper-trading/orders/batch",
+                               json={"orders": [order, order], "atomic": False}).json()
+            assert [result["status"] for result in body["results"]] == ["filled", "rejected"]
+
+    def test_malformed_item_is_rejected_alone(self, service):
+        """An order that fails validation is rejected without failing the rest of the batch."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client)
+            order = {"account_id": account_id, "symbol": "EUR/USD", "order_type": "market", "side": "buy",
+                     "quantity": 0.1}
+            orders = [order, {**order, "side": "short"}, {**order, "quantity": 0}, "not an order", order,
+                      {**order, "account_id": "abc"}]
+            response = client.post("/api/v1/paper-trading/orders/batch", json={"orders": orders, "atomic": False})
+            assert response.status_code == 200
+            body = response.json()
+            assert [result["status"] for result in body["results"]] == [
+                "filled", "rejected", "rejected", "rejected", "filled", "rejected"]
+            assert body["results"][1]["error"].startswith("side:")
+            assert body["results"][2]["error"].startswith("quantity:")
+            assert body["results"][5]["error"] == "Paper trading account not found"
+            assert len(service.open_positions[int(account_id)]) == 2
+
+    def test_fill_failure_is_not_reported_as_a_rejection(self, service, monkeypatch):
+        """An error while filling, after state may have changed, fails the request."""
+        def execute_order(request, pricing):
+            raise RuntimeError("fill failed")
+
+        monkeypatch.setattr(service, "execute_order", execute_order)
+        with TestClient(service.app, raise_server_exceptions=False) as client:
+            account_id = create_account(client)
+            order = {"account_id": account_id, "symbol": "EUR/USD", "order_type": "market", "side": "buy",
+                     "quantity": 0.1}
+            response = client.post("/api/v1/paper-trading/orders/batch", json={"orders": [order]})
+            assert response.status_code == 500
+
+    def test_batch_close(self, service):
+        """Closes report per-item results and reject unknown or repeated positions."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client)
+            first = place_order(client, account_id).json()["position_id"]
+            second = place_order(client, account_id, symbol="AAPL", quantity=1).json()["position_id"]
+            closes = [{"position_id": first}, {"position_id": second}, {"position_id": "missing"}]
+            body = client.post("/api/v1/paper-trading/positions/close-batch", json={"positions": closes}).json()
+
+            assert [result["status"] for result in body["results"]] == ["closed", "closed", "rejected"]
+            assert service.paper_accounts[int(account_id)].margin_used == pytest.approx(0.0)
+
+    def test_lookup_margin_matches_order_validation(self, service):
+        """A quantity sized from the lookup and instrument margin is accepted; more is not."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client, initial_balance=1000.0)
+            accounts = client.post("/api/v1/paper-trading/accounts/lookup",
+                                   json={"account_ids": [account_id, "999999", "bad"]}).json()["accounts"]
+            assert list(accounts) == [account_id]
+            instruments = client.get("/api/v1/paper-trading/market/instruments",
+                                     params={"symbols": "EUR/USD,NOPE"}).json()["instruments"]
+            assert list(instruments) == ["EUR/USD"]
+
+            quantity = accounts[account_id]["free_margin"] / instruments["EUR/USD"]["margin_per_unit"]["buy"]
+            assert place_order(client, account_id, quantity=round(quantity * 1.01, 4)).status_code == 400
+            assert place_order(client, account_id, quantity=round(quantity * 0.99, 4)).status_code == 200
+
+
+class TestTradeLedger:
+    """Test cases for the columnar trade history."""
+
+    def test_cursor_pagination(self, service):
+        """Pages walk the history newest first without overlap."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client)
+            for _ in range(5):
+                place_order(client, account_id)
+
+            url = f"/api/v1/paper-trading/accounts/{account_id}/trades"
+            first = client.get(url, params={"limit": 3}).json()
+            second = client.get(url, params={"limit": 3, "cursor": first["next_cursor"]}).json()
+
+            assert [trade["id"] for trade in first["trades"]] == [4, 3, 2]
+            assert [trade["id"] for trade in second["trades"]] == [1, 0]
+            assert second["next_cursor"] is None
+            assert first["trades"][0]["asset_type"] == "forex"
+
+    def test_time_range_and_aggregates(self, tmp_path):
+        """Range filters bisect the timestamp column and aggregates group closed trades."""
+        ledger_module = sys.modules["ledger"]
+        ledger = ledger_module.TradeLedger(ledger_module.SymbolTable())
+        day = 86400.0
+        for timestamp, symbol, pnl in [(day, "EUR/USD", 10.0), (day + 60, "AAPL", -4.0), (3 * day, "EUR/USD", 6.0)]:
+            ledger.append({"timestamp": timestamp, "type": "close", "side": "buy", "symbol": symbol,
+                           "quantity": 1.0, "price": 1.0, "pnl": pnl, "order_id": 1, "position_id": 1})
+
+        assert [trade["id"] for trade in ledger.page(start=day, end=2 * day)["trades"]] == [1, 0]
+
+        by_day = ledger.aggregate("day")
+        assert [(group["date"], group["total_pnl"]) for group in by_day] == [
+            ("1970-01-02", 6.0), ("1970-01-04", 6.0)
+        ]
+        by_symbol = {group["symbol"]: group for group in ledger.aggregate("symbol", start=day, end=2 * day)}
+        assert by_symbol["EUR/USD"]["win_rate"] == 100.0
+        assert by_symbol["AAPL"]["total_pnl"] == -4.0
+
+
+class TestCompactRecords:
+    """Test cases for the slotted account, order and position records."""
+
+    def test_records_round_trip_through_state(self, service):
+        """Records serialize to flat lists and back without losing fields."""
+        models = sys.modules["models"]
+        account = models.Account(7, 1, 500.0, "USD", 100, ["forex", "stock"], 0.0)
+        account.stats.record(12.5)
+
+        restored = models.Account.from_state(account.to_state())
+        assert restored.to_dict() == account.to_dict()
+        assert restored.allowed_asset_types is account.allowed_asset_types
+        assert not hasattr(restored, "__dict__")
+
+    def test_api_ids_are_integer_strings(self, service):
+        """Ids are allocated sequentially and unknown ids are 404s."""
+        with TestClient(service.app) as client:
+            first = create_account(client)
+            second = create_account(client)
+            assert int(second) == int(first) + 1
+
+            position = place_order(client, first).json()
+            body = client.get(f"/api/v1/paper-trading/accounts/{first}").json()
+            assert body["positions"][0]["id"] == position["position_id"]
+            assert client.get("/api/v1/paper-trading/accounts/not-an-id").status_code == 404
+
+
+class TestBenchmark:
+    """Test cases for the order-flow replay benchmark."""
+
+    def test_replay_reports_per_endpoint_latency(self, tmp_path, monkeypatch):
+        """A small generated workload runs in-process and feeds the regression gate."""
+        spec = importlib.util.spec_from_file_location("paper_trading_benchmark", os.path.join(SERVICE_DIR, "benchmark.py"))
+        benchmark = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(benchmark)
+
+        workload = benchmark.generate_workload(300, 5, ["EUR/USD", "AAPL"], benchmark.DEFAULT_MIX, seed=1)
+        assert workload == benchmark.generate_workload(300, 5, ["EUR/USD", "AAPL"], benchmark.DEFAULT_MIX, seed=1)
+
+        # The benchmark sets the service's environment itself; register it so it is restored
+        monkeypatch.setenv("PAPER_TRADING_DATA_DIR", str(tmp_path))
+        monkeypatch.setenv("PAPER_TRADING_TICK_INTERVAL", os.environ.get("PAPER_TRADING_TICK_INTERVAL", "3600"))
+        service = benchmark.load_service(str(tmp_path))
+        report = asyncio.run(benchmark.run_workload(service, workload, accounts=5, concurrency=4))
+
+        assert set(report["endpoints"]) == {"place_order", "close_position", "account_summary", "price_tick"}
+        assert all(stats["errors"] == 0 for stats in report["endpoints"].values())
+        assert report["memory"]["samples"]
+        assert benchmark.compare(report, report, 0.2) == []
+
+        slower = {**report, "throughput_ops": report["throughput_ops"] * 2}
+        assert benchmark.compare(report, slower, 0.2)
+
+
+class TestVectorizedValuation:
+    """Test cases for the NumPy position book and the risk report."""
+
+    def test_book_matches_position_pnl(self, service):
+        """Vectorized marks agree with per-position P&L, also after removals."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client)
+            ids = [place_order(client, account_id, symbol=symbol, side=side, quantity=1).json()["position_id"]
+                   for symbol, side in [("EUR/USD", "buy"), ("AAPL", "sell"), ("BTC/USD", "buy"), ("EUR/USD", "sell")]]
+            client.post(f"/api/v1/paper-trading/positions/{ids[1]}/close", json={"position_id": ids[1]})
+            publish_price(client, service, "EUR/USD", 1.0900)
+
+            book = service.position_book
+            open_ids = [int(position_id) for position_id in ids if position_id != ids[1]]
+            pnls = book.pnls(book.rows(open_ids))
+            expected = [service.paper_positions[position_id].pnl_at(service.mark_price(service.paper_positions[position_id]))
+                        for position_id in open_ids]
+            assert pnls.tolist() == pytest.approx(expected)
+
+            positions = client.get(f"/api/v1/paper-trading/accounts/{account_id}").json()["positions"]
+            assert sum(position["unrealized_pnl"] for position in positions) == pytest.approx(sum(expected))
+
+    def test_risk_report_ranks_accounts_by_margin_level(self, service):
+        """The report agrees with the incrementally maintained account equity."""
+        with TestClient(service.app) as client:
+            safe = create_account(client)
+            risky = create_account(client, initial_balance=1000.0)
+            create_account(client)
+            place_order(client, safe, quantity=0.1)
+            place_order(client, risky, quantity=0.5)
+            publish_price(client, service, "EUR/USD", 1.0760)
+
+            report = client.get("/api/v1/paper-trading/risk/report").json()
+            assert [account["account_id"] for account in report["accounts"]] == [risky, safe]
+            assert report["accounts"][0]["equity"] == pytest.approx(service.paper_accounts[int(risky)].equity)
+            assert report["symbol_exposure"] == {"EUR/USD": pytest.approx(60000.0)}
+
+            at_risk = client.get("/api/v1/paper-trading/risk/report", params={"max_margin_level": 500}).json()
+            assert [account["account_id"] for account in at_risk["accounts"]] == [risky]
+
+
+class TestPartialCloseAndNetting:
+    """Test cases for partial closes and netting accounts."""
+
+    def test_partial_close_releases_proportional_margin(self, service):
+        """The rest of a partly closed position stays open with its share of margin."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client)
+            position_id = place_order(client, account_id, quantity=1.0).json()["position_id"]
+            margin = service.paper_accounts[int(account_id)].margin_used
+
+            body = client.post(f"/api/v1/paper-trading/positions/{position_id}/close",
+                               json={"position_id": position_id, "quantity": 0.4}).json()
+            assert body["remaining_quantity"] == pytest.approx(0.6)
+
+            position = service.paper_positions[int(position_id)]
+            account = service.paper_accounts[int(account_id)]
+            assert position.status == "open"
+            assert account.margin_used == pytest.approx(margin * 0.6)
+            assert client.get(f"/api/v1/paper-trading/accounts/{account_id}").json()["exposure"]["EUR/USD"] == \
+                pytest.approx(60000.0)
+
+            too_much = client.post(f"/api/v1/paper-trading/positions/{position_id}/close",
+                                   json={"position_id": position_id, "quantity": 1.0})
+            assert too_much.status_code == 400
+
+            client.post(f"/api/v1/paper-trading/positions/{position_id}/close", json={"position_id": position_id})
+            assert position.status == "closed"
+            assert account.margin_used == pytest.approx(0.0)
+
+    def test_netting_reduces_fifo_and_flips(self, service):
+        """Netting orders share one position per symbol and realize P&L lot by lot."""
+        with TestClient(service.app) as client:
+            account_id = create_account(client, position_mode="netting")
+            first = place_order(client, account_id, quantity=0.2).json()
+            publish_price(client, service, "EUR/USD", 1.0900)
+            second = place_order(client, account_id, quantity=0.3).json()
+            assert second["position_id"] == first["position_id"]
+
+            position = service.paper_positions[int(first["position_id"])]
+            assert position.quantity == pytest.approx(0.5)
+            assert len(position.lots) == 2
+
+            # Selling 0.3 consumes the first lot and 0.1 of the second
+            publish_price(client, service, "EUR/USD", 1.1000)
+            sell = place_order(client, account_id, side="sell", quantity=0.3).json()
+            bid = service.latest_quotes["EUR/USD"]["bid"]
+            expected = ((bid - first["execution_price"]) * 0.2 + (bid - second["execution_price"]) * 0.1) * 100000
+            assert sell["realized_pnl"] == pytest.approx(expected)
+            assert sell["required_margin"] == 0.0
+            assert position.entry_price == pytest.approx(second["execution_price"])
+
+            # Selling past the remaining 0.2 closes it and opens a short with the rest
+            flip = place_order(client, account_id, side="sell", quantity=0.5).json()
+            assert position.status == "closed"
+            short = service.paper_positions[int(flip["position_id"])]
+            assert (short.side, short.quantity) == ("sell", pytest.approx(0.3))
+            assert service.paper_accounts[int(account_id)].margin_used == pytest.approx(short.margin_used)
+            assert service.position_book.quantities[service.position_book.rows([short.id])].tolist() == [pytest.approx(0.3)]
+
+    def test_lot_totals_track_the_remaining_lots(self):
+        """The running totals behind the average price survive consumption, compaction and state."""
+        from lots import LotQueue
+
+        lots = LotQueue()
+        for index in range(100):
+            lots.push(1.0, 1.0 + index / 100, 0.1)
+        replayed = LotQueue.from_state(lots.to_state())
+        _, delta = lots.consume(60.5)
+        assert delta == [60, [0.5, pytest.approx(0.05)]]
+        replayed.drop(*delta)
+        assert replayed.to_state() == lots.to_state()
+        remaining = [(0.5, 1.6)] + [(1.0, 1.0 + index / 100) for index in range(61, 100)]
+        expected = sum(q * p for q, p in remaining) / sum(q for q, _ in remaining)
+        assert lots.average_price() == pytest.approx(expected)
+        assert LotQueue.from_state(lots.to_state()).average_price() == pytest.approx(expected)
+        lots.consume(1000)
+        assert (len(lots), lots.average_price()) == (0, 0.0)
+
+
+class TestSharding:
+    """Test cases for account shards and worker partitioning."""
+
+    def test_concurrent_orders_on_one_account_do_not_overspend(self, service):
+        """Orders racing on one account are serialized by its shard."""
+        import httpx
+
+        async def run():
+            async with service.app.router.lifespan_context(service.app):
+                transport = httpx.ASGITransport(app=service.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    response = await client.post("/api/v1/paper-trading/accounts",
+                                                 json={"user_id": 1, "initial_balance": 1000.0})
+                    account_id = response.json()["account_id"]
+                    order = {"account_id": account_id, "symbol": "EUR/USD", "order_type": "market",
+                             "side": "buy", "quantity": 0.1}
+                    responses = await asyncio.gather(*(
+                        client.post("/api/v1/paper-trading/orders", json=order) for _ in range(20)
+                    ))
+                    return account_id, [r.status_code for r in responses]
+
+        account_id, statuses = asyncio.run(run())
+        account = service.paper_accounts[int(account_id)]
+        assert statuses.count(200) == len(service.open_positions[int(account_id)])
+        assert account.margin_used <= account.equity
+        assert account.margin_used == pytest.approx(sum(
+            service.paper_positions[position_id].margin_used for position_id in service.open_positions[int(account_id)]
+        ))
+        assert sum(shard["processed"] for shard in service.shards.stats()) >= 20
+
+    def test_stop_outs_run_on_the_owning_shard(self, service, monkeypatch):
+        """A tick racing with orders liquidates each breached account on that account's shard."""
+        import httpx
+
+        liquidations = []
+        liquidate = service.liquidate_account
+
+        def liquidate_account(account):
+            liquidations.append((account.id, asyncio.current_task()))
+            liquidate(account)
+
+        monkeypatch.setattr(service, "liquidate_account", liquidate_account)
+
+        async def run():
+            async with service.app.router.lifespan_context(service.app):
+                transport = httpx.ASGITransport(app=service.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    account_ids = []
+                    for _ in range(8):
+                        response = await client.post("/api/v1/paper-trading/accounts",
+                                                     json={"user_id": 1, "initial_balance": 1000.0})
+                        account_ids.append(int(response.json()["account_id"]))
+                        await client.post("/api/v1/paper-trading/orders", json={
+                            "account_id": str(account_ids[-1]), "symbol": "EUR/USD", "order_type": "market",
+                            "side": "buy", "quantity": 0.5})
+
+                    async def tick():
+                        await asyncio.sleep(0)
+                        service.publish_price("EUR/USD", 1.0600)
+
+                    await asyncio.gather(tick(), *(
+                        client.post("/api/v1/paper-trading/orders", json={
+                            "account_id": str(account_id), "symbol": "AAPL", "order_type": "market",
+                            "side": "buy", "quantity": 1})
+                        for account_id in account_ids
+                    ))
+                    await service.shards.drain()
+                    owners = {account_id: service.shards.shard_task(account_id) for account_id in account_ids}
+                    return account_ids, owners
+
+        account_ids, owners = asyncio.run(run())
+        assert len({service.shards.shard_of(account_id) for account_id in account_ids}) > 1
+        assert sorted(account_id for account_id, _ in liquidations) == account_ids
+        assert all(task is owners[account_id] for account_id, task in liquidations)
+        for account_id in account_ids:
+            account = service.paper_accounts[account_id]
+            assert account.margin_level is None or account.margin_level > service.STOP_OUT_LEVEL
+            assert account.margin_used == pytest.approx(sum(
+                service.paper_positions[position_id].margin_used for position_id in service.open_positions[account_id]
+            ))
+
+    def test_worker_owns_a_stripe_of_ids(self, tmp_path, load_paper_trading):
+        """Each worker allocates its own ids and refuses ids of other workers."""
+        service = load_paper_trading(tmp_path, PAPER_TRADING_WORKERS=3, PAPER_TRADING_WORKER_INDEX=1)
+        with TestClient(service.app) as client:
+            first = create_account(client)
+            second = create_account(client)
+            assert (int(first), int(second)) == (2, 5)
+            assert client.get("/api/v1/paper-trading/accounts/3").status_code == 421
+            assert client.get(f"/api/v1/paper-trading/accounts/{second}").status_code == 200
+        assert service.DATA_DIR.endswith("worker-1")
+
+
+class TestPriceReplay:
+    """Test cases for historical price replay."""
+
+    def test_bars_replay_open_extremes_and_close(self, tmp_path):
+        """Bars are streamed as open, intrabar extremes and close."""
+        replay = sys.modules["replay"]
+        path = tmp_path / "bars.csv"
+        path.write_text("timestamp,symbol,open,high,low,close\n"
+                        "2024-01-02T00:00:00,EUR/USD,1.10,1.12,1.09,1.11\n"
+                        "2024-01-02T00:01:00,EUR/USD,1.11,1.115,1.10,1.10\n")
+        prices = [price for _, _, price, _ in replay.iter_ticks(str(path))]
+        assert prices == [1.10, 1.09, 1.12, 1.11, 1.11, 1.115, 1.10, 1.10]
+        assert replay.parse_speed("100x") == 100.0
+        assert replay.parse_speed("max") == 0.0
+
+    def test_replay_errors_are_reported(self, tmp_path, caplog):
+        """A missing file or a failing publish ends the replay with the error in its status."""
+        replay = sys.modules["replay"]
+        missing = replay.PriceReplay(str(tmp_path / "missing.csv"), 0, lambda *tick: True)
+        asyncio.run(missing.run())
+        assert missing.status()["finished"] and "missing.csv" in missing.status()["error"]
+
+        def publish(timestamp, symbol, bid, ask):
+            raise KeyError(symbol)
+
+        path = tmp_path / "ticks.csv"
+        path.write_text("timestamp,symbol,bid,ask\n1704153600,EUR/USD,1.0800,1.0801\n")
+        failing = replay.PriceReplay(str(path), 0, publish)
+        asyncio.run(failing.run())
+        assert failing.status()["error"] == "KeyError: 'EUR/USD'"
+        assert len([record for record in caplog.records if record.name == "replay"]) == 2
+
+    def test_replay_drives_quotes_and_stop_outs(self, tmp_path, load_paper_trading):
+        """Recorded ticks go through the same path as live prices."""
+        replay_dir = tmp_path / "replay"
+        replay_dir.mkdir()
+        (replay_dir / "ticks.csv").write_text(
+            "timestamp,symbol,bid,ask\n"
+            "1704153600,EUR/USD,1.0800,1.0801\n"
+            "1704153601,XYZ,1.0,1.1\n"
+            "1704153602,EUR/USD,1.0600,1.0601\n"
+        )
+        service = load_paper_trading(tmp_path / "data", PAPER_TRADING_REPLAY_DIR=replay_dir)
+        with TestClient(service.app) as client:
+            account_id = create_account(client, initial_balance=1000.0)
+            position_id = place_order(client, account_id, quantity=0.5).json()["position_id"]
+
+            assert client.post("/api/v1/paper-trading/replay",
+                               json={"file": "../ticks.csv", "speed": "max"}).status_code == 404
+            client.post("/api/v1/paper-trading/replay", json={"file": "ticks.csv", "speed": "max"})
+            for _ in range(100):
+                status = client.get("/api/v1/paper-trading/replay").json()
+                if status["replay"]["finished"]:
+                    break
+                time.sleep(0.01)
+
+            assert status["replay"]["published"] == 2
+            assert status["replay"]["skipped"] == 1
+            assert service.latest_quotes["EUR/USD"]["bid"] == 1.0600
+            assert service.latest_quotes["EUR/USD"]["timestamp"] == "2024-01-02T00:00:02"
+            client.portal.call(service.shards.drain)
+            position = service.paper_positions[int(position_id)]
+            assert position.close_reason == "stop_out"
+            # Fills during a replay happen at market time, not wall-clock time
+            assert position.closed_at == 1704153602
+
+            client.delete("/api/v1/paper-trading/replay")
+            assert client.get("/api/v1/paper-trading/replay").json()["source"] == "simulated"
@@ -0,0 +1,691 @@
+"""
+Tests for the Social Trading service.
+Run with: python -m pytest tests/test_social_trading.py -v
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), '..', 'services', 'social-trading')
+PAPER_TRADING_DIR = os.path.join(os.path.dirname(__file__), '..', 'services', 'paper-trading')
+sys.path.insert(0, SERVICE_DIR)
+
+
+@pytest.fixture
+def load_service(monkeypatch):
+    """Import fresh copies of the social trading service; its environment is restored after the test."""
+    def load(data_dir, **env):
+        monkeypatch.setenv("SOCIAL_TRADING_DATA_DIR", str(data_dir))
+        for key, value in env.items():
+            monkeypatch.setenv(key, str(value))
+        spec = importlib.util.spec_from_file_location("social_trading_main", os.path.join(SERVICE_DIR, "main.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    return load
+
+
+@pytest.fixture
+def service(tmp_path, load_service):
+    return load_service(tmp_path)
+
+
+def follow(client, follower_id, trader_id, **extra):
+    payload = {"follower_id": follower_id, "trader_id": trader_id}
+    payload.update(extra)
+    return client.post("/api/v1/social/follow", json=payload)
+
+
+class TestFollowGraph:
+    """Test cases for the bidirectional follow graph."""
+
+    def test_follow_is_indexed_both_ways_with_pair_settings(self, service):
+        """A follower can copy two traders with different settings."""
+        with TestClient(service.app) as client:
+            follow(client, "f1", "t1", copy_trades=True, copy_percentage=50)
+            follow(client, "f1", "t2", copy_trades=True, copy_percentage=20)
+            follow(client, "f2", "t1")
+            assert follow(client, "f1", "t1").status_code == 400
+
+            assert client.get("/api/v1/social/followers/t1").json()["followers"] == ["f1", "f2"]
+            assert client.get("/api/v1/social/following/f1").json()["following"] == ["t1", "t2"]
+            settings = client.get("/api/v1/social/copy-settings/t2", params={"follower_id": "f1"}).json()
+            assert settings["copy_percentage"] == 20
+
+            client.post("/api/v1/social/unfollow", json={"follower_id": "f1", "trader_id": "t1"})
+            assert client.get("/api/v1/social/followers/t1").json()["followers"] == ["f2"]
+            assert ("f1", "t1") not in service.follow_graph.copy_settings
+
+    def test_follows_persist_and_page_by_cursor(self, tmp_path, load_service):
+        """Follows, settings and counts survive a restart and lists page in id order."""
+        service = load_service(tmp_path)
+        with TestClient(service.app) as client:
+            for index in range(25):
+                follow(client, f"f{index:02d}", "star", copy_trades=index % 2 == 0, copy_percentage=30,
+                       sizing="equity", max_exposure=10, symbol_limits={"AAPL": 5})
+            follow(client, "f00", "other")
+            client.post("/api/v1/social/unfollow", json={"follower_id": "f01", "trader_id": "star"})
+
+        service = load_service(tmp_path)
+        with TestClient(service.app) as client:
+            pages, cursor = [], None
+            while True:
+                params = {"limit": 10}
+                if cursor:
+                    params["cursor"] = cursor
+                body = client.get("/api/v1/social/followers/star", params=params).json()
+                pages.append(body["followers"])
+                cursor = body["next_cursor"]
+                if cursor is None:
+                    break
+
+            assert body["followers_count"] == 24
+            assert [len(page) for page in pages] == [10, 10, 4]
+            assert sum(pages, []) == [f"f{index:02d}" for index in range(25) if index != 1]
+            assert client.get("/api/v1/social/following/f00").json()["following"] == ["other", "star"]
+            settings = client.get("/api/v1/social/copy-settings/star", params={"follower_id": "f02"}).json()
+            assert settings == {"trader_id": "star", "enabled": True, "copy_percentage": 30, "sizing": "equity",
+                                "max_exposure": 10, "symbol_limits": {"AAPL": 5}}
+
+
+class TestCopyFanOut:
+    """Test cases for the batched copy-trade queue."""
+
+    def test_large_fan_out_is_batched(self, service):
+        """Every copying follower gets an order, delivered in a few batch calls."""
+        batches = []
+
+        async def submit(orders):
+            batches.append(orders)
+            return {"filled": len(orders), "rejected": 0}
+
+        service.copy_dispatcher.submit_batch = submit
+        accounts = {"leader": {"equity": 10000.0, "free_margin": 10000.0, "status": "active",
+                               "allowed_asset_types": ["forex"]}}
+        for index in range(50000):
+            service.follow_graph.follow(f"f{index}", "leader",
+                                        service.CopySettings(enabled=index % 10 != 0, copy_percentage=50))
+            accounts[f"f{index}"] = accounts["leader"]
+
+        async def context(trader_id, follower_ids, symbol, *args):
+            return accounts, {"asset_type": "forex", "margin_per_unit": {"buy": 1.1, "sell": 1.1}}
+
+        service.fetch_copy_context = context
+
+        async def run():
+            service.copy_dispatcher.start()
+            started = time.perf_counter()
+            queued = await service.copy_trade_to_followers(
+                "leader", {"symbol": "EUR/USD", "side": "buy", "quantity": 1.0, "type": "open"})
+            await service.copy_dispatcher.stop()
+            return queued, time.perf_counter() - started
+
+        queued, elapsed = asyncio.run(run())
+        assert queued == 45000
+        assert sum(len(batch) for batch in batches) == 45000
+        assert len(batches) <= 45000 // service.COPY_BATCH_SIZE + service.COPY_MAX_IN_FLIGHT
+        assert batches[0][0]["quantity"] == 0.5
+        assert service.copy_dispatcher.stats["filled"] == 45000
+        assert elapsed < 5
+
+    def test_closing_trades_are_not_copied(self, service):
+        service.follow_graph.follow("f1", "leader", service.CopySettings())
+        assert asyncio.run(service.copy_trade_to_followers(
+            "leader", {"symbol": "EUR/USD", "side": "buy", "quantity": 1.0, "type": "close"})) == 0
+
+    def test_cohorts_are_sized_to_follower_margin(self, service):
+        """Each cohort is one batch, sized to equity and capped by margin, exposure and symbol limits."""
+        batches = []
+
+        async def submit(orders):
+            batches.append(orders)
+            return {"filled": len(orders), "rejected": 0}
+
+        def account(equity, free_margin, status="active"):
+            return {"equity": equity, "free_margin": free_margin, "status": status,
+                    "allowed_asset_types": ["forex"]}
+
+        accounts = {
+            "leader": account(10000, 10000),
+            "rich": account(20000, 20000),
+            "poor": account(1000, 500),
+            "broke": account(1000, 0),
+            "closed": account(5000, 5000, status="closed"),
+            "scaled": account(5000, 5000),
+            "capped": account(100000, 100000),
+        }
+
+        async def context(trader_id, follower_ids, symbol, *args):
+            return accounts, {"asset_type": "forex", "margin_per_unit": {"buy": 1000.0, "sell": 1000.0}}
+
+        service.copy_dispatcher.submit_batch = submit
+        service.fetch_copy_context = context
+        fixed = service.CopySettings(copy_percentage=50)
+        for follower_id in ("rich", "poor", "broke", "closed"):
+            service.follow_graph.follow(follower_id, "leader", fixed)
+        service.follow_graph.follow("scaled", "leader", service.CopySettings(sizing="equity"))
+        service.follow_graph.follow("capped", "leader", service.CopySettings(
+            sizing="equity", max_exposure=5, symbol_limits={"EUR/USD": 3}))
+
+        async def run():
+            queued = await service.copy_trade_to_followers(
+                "leader", {"symbol": "EUR/USD", "side": "buy", "quantity": 2.0, "type": "open"})
+            await service.copy_dispatcher.stop()
+            return queued
+
+        assert asyncio.run(run()) == 4
+        sized = [{order["account_id"]: order["quantity"] for order in batch} for batch in batches]
+        # Half the leader's size, cut to 98% of free margin; no order without margin or for closed accounts
+        assert {"rich": 1.0, "poor": 0.49} in sized
+        # Equity sizing halves the size for half the equity
+        assert {"scaled": 1.0} in sized
+        # 20 lots by equity, 5 by exposure, 3 by the symbol limit
+        assert {"capped": 3.0} in sized
+
+    def test_fill_batches_share_one_lookup(self, service):
+        """Accounts and quotes are looked up once per fill batch, and copies sized at the current quote."""
+        requests = []
+
+        async def post(url, json=None, **kwargs):
+            if not url.endswith("/accounts/lookup"):
+                return httpx.Response(404, request=httpx.Request("POST", url))
+            requests.append(("accounts", sorted(json["account_ids"])))
+            accounts = {account_id: {"equity": 10000.0, "free_margin": 1000.0, "status": "active",
+                                     "allowed_asset_types": ["forex"]} for account_id in json["account_ids"]}
+            return httpx.Response(200, json={"accounts": accounts}, request=httpx.Request("POST", url))
+
+        async def get(url, params=None, **kwargs):
+            if not url.endswith("/market/instruments"):
+                return httpx.Response(404, request=httpx.Request("GET", url))
+            requests.append(("instruments", params["symbols"]))
+            instruments = {symbol: {"asset_type": "forex", "margin_per_unit": {"buy": 300.0, "sell": 300.0}}
+                           for symbol in params["symbols"].split(",")}
+            return httpx.Response(200, json={"instruments": instruments}, request=httpx.Request("GET", url))
+
+        batches = []
+
+        async def submit(orders):
+            batches.append(orders)
+            return {"filled": len(orders), "rejected": 0}
+
+        service.service_client.post = post
+        service.service_client.get = get
+        service.copy_dispatcher.submit_batch = submit
+        service.follow_graph.follow("f1", "leader1", service.CopySettings())
+        service.follow_graph.follow("f2", "leader2", service.CopySettings())
+        fills = [
+            {"account_id": trader_id, "id": index, "symbol": symbol, "side": "buy",
+             "quantity": 10.0, "price": 1.0, "type": "open"}
+            for index, (trader_id, symbol) in enumerate([("leader1", "EUR/USD"), ("leader2", "GBP/USD"),
+                                                        ("leader1", "EUR/USD")])
+        ]
+
+        async def run():
+            await service.handle_fill_batch(fills)
+            await service.copy_dispatcher.stop()
+
+        asyncio.run(run())
+        assert sorted(requests) == [("accounts", ["f1", "f2", "leader1", "leader2"]), ("instruments", "EUR/USD,GBP/USD")]
+        # 98% of 1000 free margin at 300 per unit is 3.2667 lots, rounded down to the lot step
+        assert [order["quantity"] for batch in batches for order in batch] == [3.26, 3.26, 3.26]
+
+
+class TestServiceClient:
+    """Test cases for the pooled service client."""
+
+    def test_retries_transient_failures_with_bounded_concurrency(self, service):
+        """Concurrent calls never exceed the limit and transient errors are retried."""
+        state = {"active": 0, "peak": 0, "calls": 0}
+
+        async def handler(request):
+            state["calls"] += 1
+            call = state["calls"]
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.01)
+            state["active"] -= 1
+            if call <= 3:
+                return httpx.Response(503)
+            return httpx.Response(200, json={"ok": True})
+
+        client = service.ServiceClient(max_concurrency=4, backoff=0.001,
+                                       transport=httpx.MockTransport(handler))
+
+        async def run():
+            responses = await asyncio.gather(*(client.get("http://paper/x") for _ in range(20)))
+            await client.close()
+            return responses
+
+        responses = asyncio.run(run())
+        assert all(response.status_code == 200 for response in responses)
+        assert state["peak"] <= 4
+        assert client.stats["retries"] == 3
+
+    def test_orders_are_not_resent_after_reaching_the_server(self, service):
+        """A non-idempotent call is retried only if it never left the client."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                raise httpx.ConnectError("refused", request=request)
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        client = service.ServiceClient(backoff=0.001, transport=httpx.MockTransport(handler))
+
+        async def run():
+            try:
+                await client.post("http://paper/orders/batch", json={}, idempotent=False)
+            finally:
+                await client.close()
+
+        with pytest.raises(httpx.ReadTimeout):
+            asyncio.run(run())
+        assert len(calls) == 2
+
+
+class TestLeaderboards:
+    """Test cases for the incremental leaderboards."""
+
+    def test_rankings_follow_trade_notifications(self, service):
+        """Trade notifications update every metric's ranking without a refresh."""
+        service.service_client.retries = 0
+        trades = {
+            "alice": [50.0, -10.0, 20.0],
+            "bob": [100.0],
+            "carol": [5.0, 5.0, 5.0, 5.0],
+        }
+        with TestClient(service.app) as client:
+            for trader_id, pnls in trades.items():
+                for pnl in pnls:
+                    client.post("/api/v1/social/trade-notification", json={
+                        "account_id": trader_id, "symbol": "EUR/USD", "side": "buy",
+                        "quantity": 1.0, "pnl": pnl, "type": "close"
+                    })
+
+            def ranking(metric, period="daily"):
+                body = client.request("GET", "/api/v1/social/leaderboard",
+                                      json={"period": period, "metric": metric}).json()
+                return [entry["trader"]["trader_id"] for entry in body["leaderboard"]]
+
+            assert ranking("total_pnl") == ["bob", "alice", "carol"]
+            assert ranking("total_trades") == ["carol", "alice", "bob"]
+            assert ranking("win_rate") == ["bob", "carol", "alice"]
+            assert ranking("total_pnl", "all_time") == ["bob", "alice", "carol"]
+
+            client.post("/api/v1/social/trade-notification", json={
+                "account_id": "carol", "symbol": "EUR/USD", "side": "buy",
+                "quantity": 1.0, "pnl": 200.0, "type": "close"
+            })
+            assert ranking("total_pnl")[0] == "carol"
+
+    def test_unknown_metric_is_rejected(self, service):
+        with TestClient(service.app) as client:
+            response = client.request("GET", "/api/v1/social/leaderboard",
+                                      json={"period": "daily", "metric": "sharpe"})
+            assert response.status_code == 400
+
+    def test_startup_seeds_leaderboards_in_the_background(self, tmp_path, load_service):
+        """Boot does not wait for the first refresh; boards are served empty until it finishes."""
+        service = load_service(tmp_path)
+        with TestClient(service.app) as client:
+            follow(client, "f1", "t1")
+
+        service = load_service(tmp_path)
+        refreshing = []
+
+        async def slow_refresh(trader_ids):
+            refreshing.extend(trader_ids)
+            await asyncio.Event().wait()
+
+        service.refresh_scheduler.refresh = slow_refresh
+        with TestClient(service.app) as client:
+            body = client.request("GET", "/api/v1/social/leaderboard",
+                                  json={"period": "daily", "metric": "total_pnl"}).json()
+            assert body["leaderboard"] == []
+            assert sorted(refreshing) == ["f1", "t1"]
+            assert client.get("/api/v1/social/refresh-stats").json()["running"] is True
+
+    def test_old_buckets_expire_from_rolling_periods(self, service):
+        """A trade leaves the daily board after a day but stays on longer periods."""
+        boards = service.Leaderboards()
+        now = 1_700_000_000.0
+        boards.record_trade("alice", now, 10.0, 1.0, now)
+        boards.record_trade("bob", now - 3600 * 12, 5.0, 1.0, now)
+
+        later = now + 3600 * 14
+        boards.expire(later)
+        assert [trader for trader, _ in boards.top("daily", "total_pnl", 10)] == ["alice"]
+        assert [trader for trader, _ in boards.top("weekly", "total_pnl", 10)] == ["alice", "bob"]
+
+        boards.expire(now + 86400 * 2)
+        assert boards.ranked_count("daily") == 0
+        assert boards.ranked_count("monthly") == 2
+
+    def test_rank_index_matches_a_full_sort(self, service):
+        """Moving and removing traders keeps the index in sorted order."""
+        from leaderboard import RankIndex
+
+        index = RankIndex(seed=7)
+        scores = {}
+        for step in range(5000):
+            trader_id = f"trader-{step * 37 % 300}"
+            if step % 11 == 0:
+                index.remove(trader_id)
+                scores.pop(trader_id, None)
+            else:
+                scores[trader_id] = float(step * 53 % 97)
+                index.set(trader_id, scores[trader_id])
+
+        expected = [trader_id for _, trader_id in sorted((-score, trader_id) for trader_id, score in scores.items())]
+        assert len(index) == len(scores)
+        assert index.top(len(scores) + 10) == expected
+        assert index.top(5) == expected[:5]
+
+
+class TestTradeBuckets:
+    """Test cases for period metrics served from ingest-time buckets."""
+
+    def test_profile_periods_come_from_buckets(self, service):
+        """History is loaded once; later trades update the period metrics incrementally."""
+        now = time.time()
+        history_calls = []
+
+        def iso(seconds_ago):
+            return service.to_iso(now - seconds_ago)
+
+        async def performance(trader_id):
+            return {"account": {"balance": 10000.0, "equity": 10100.0, "trading_stats": {}}}
+
+        async def insights(trader_id):
+            return {"risk_score": 3.0, "insights": []}
+
+        async def history(trader_id):
+            history_calls.append(trader_id)
+            return [
+                {"timestamp": iso(3600), "pnl": 40.0, "quantity": 1.0},
+                {"timestamp": iso(3 * 86400), "pnl": -10.0, "quantity": 2.0},
+                {"timestamp": iso(20 * 86400), "pnl": 25.0, "quantity": 1.0},
+                {"timestamp": iso(90 * 86400), "pnl": 5.0, "quantity": 1.0},
+            ]
+
+        service.get_trader_performance = performance
+        service.get_ai_insights = insights
+        service.get_trade_history = history
+        with TestClient(service.app) as client:
+            periods = client.get("/api/v1/social/trader/t1/profile").json()["periods"]
+            assert [periods[name]["total_trades"] for name in ("daily", "weekly", "monthly", "all_time")] == [1, 2, 3, 4]
+            assert periods["weekly"]["total_pnl"] == 30.0
+            assert periods["monthly"]["win_rate"] == pytest.approx(200 / 3)
+
+            client.post("/api/v1/social/trade-notification", json={
+                "account_id": "t1", "symbol": "EUR/USD", "side": "buy", "quantity": 3.0, "pnl": 10.0, "type": "close"
+            })
+            profile = client.get("/api/v1/social/trader/t1/profile").json()
+            assert profile["periods"]["daily"]["total_trades"] == 2
+            assert profile["periods"]["daily"]["avg_trade_size"] == 2.0
+            assert profile["performance"]["total_pnl"] == 70.0
+        assert history_calls == ["t1"]
+
+
+class TestRefreshScheduler:
+    """Test cases for the debounced leaderboard refresh scheduler."""
+
+    def test_bursts_coalesce_into_few_non_overlapping_refreshes(self, service):
+        """A burst of triggers refreshes each dirty trader once, one refresh at a time."""
+        runs = []
+        state = {"active": 0, "peak": 0}
+
+        async def refresh(trader_ids):
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            runs.append(sorted(trader_ids))
+            await asyncio.sleep(0.02)
+            state["active"] -= 1
+
+        scheduler = service.RefreshScheduler(refresh, min_interval=0.05)
+
+        async def run():
+            for index in range(300):
+                scheduler.mark_dirty(f"t{index % 3}")
+                if index % 100 == 99:
+                    await asyncio.sleep(0.01)
+            await asyncio.sleep(0.3)
+            await scheduler.stop()
+
+        asyncio.run(run())
+        assert state["peak"] == 1
+        assert len(runs) <= 3
+        assert all(run == ["t0", "t1", "t2"] for run in runs)
+        assert scheduler.stats["triggers"] == 300
+        # Only the very first trigger found the scheduler idle
+        assert scheduler.stats["coalesced"] + scheduler.stats["skipped"] == 299
+        assert scheduler.stats["traders_refreshed"] == 3 * len(runs)
+
+
+class TestProfileCache:
+    """Test cases for the trader profile cache."""
+
+    def test_concurrent_misses_share_one_load_and_stale_values_are_served(self, service):
+        """Misses are single-flight; stale hits return at once and reload in the background."""
+        loads = []
+
+        async def loader(trader_id):
+            loads.append(trader_id)
+            await asyncio.sleep(0.02)
+            return {"trader_id": trader_id, "version": len(loads)}
+
+        cache = service.ProfileCache(loader, ttl=0.05, stale_ttl=10)
+
+        async def run():
+            first = await asyncio.gather(*(cache.get("t1") for _ in range(50)))
+            await asyncio.sleep(0.06)
+            stale = await cache.get("t1")
+            await asyncio.sleep(0.05)
+            fresh = await cache.get("t1")
+            return first, stale, fresh
+
+        first, stale, fresh = asyncio.run(run())
+        assert all(profile["version"] == 1 for profile in first)
+        assert stale["version"] == 1
+        assert fresh["version"] == 2
+        assert loads == ["t1", "t1"]
+        assert cache.stats["misses"] == 50 and cache.stats["revalidations"] == 1
+
+    def test_trade_notification_invalidates_profile(self, service):
+        """The next profile read after a trade reloads from the upstream services."""
+        calls = []
+
+        async def load(trader_id):
+            calls.append(trader_id)
+            return {"trader_id": trader_id, "social": {}, "loads": len(calls)}
+
+        service.profile_cache.loader = load
+        with TestClient(service.app) as client:
+            assert client.get("/api/v1/social/trader/t1/profile").json()["loads"] == 1
+            assert client.get("/api/v1/social/trader/t1/profile").json()["loads"] == 1
+            client.post("/api/v1/social/trade-notification", json={
+                "account_id": "t1", "symbol": "EUR/USD", "side": "buy", "quantity": 1.0, "pnl": 5.0
+            })
+            assert client.get("/api/v1/social/trader/t1/profile").json()["loads"] == 2
+            assert client.get("/api/v1/social/profile-stats").json()["hits"] == 1
+
+
+class TestFillConsumer:
+    """Test cases for consuming paper trading fills from the fill log."""
+
+    def test_fills_flow_from_paper_trading_and_offsets_survive_restart(self, tmp_path, load_service,
+                                                                      load_paper_trading):
+        """Fills written by paper trading are consumed once, in batches, across restarts."""
+        log_path = tmp_path / "events" / "fills.db"
+        paper = load_paper_trading(tmp_path / "paper", PAPER_TRADING_FILL_BUS="sqlite",
+                                   PAPER_TRADING_FILL_LOG=log_path)
+        with TestClient(paper.app) as client:
+            account_id = client.post("/api/v1/paper-trading/accounts",
+                                     json={"user_id": 1, "initial_balance": 10000.0}).json()["account_id"]
+            for _ in range(3):
+                client.post("/api/v1/paper-trading/orders", json={
+                    "account_id": account_id, "symbol": "EUR/USD", "order_type": "market",
+                    "side": "buy", "quantity": 0.1
+                })
+
+        social = load_service(tmp_path / "social", SOCIAL_FILL_LOG=log_path)
+        batches = []
+
+        async def submit(orders):
+            batches.append(orders)
+            return {"filled": len(orders), "rejected": 0}
+
+        social.copy_dispatcher.submit_batch = submit
+        social.follow_graph.follow("copier", account_id, social.CopySettings(copy_percentage=50))
+        with TestClient(social.app) as client:
+            deadline = time.monotonic() + 5
+            while social.fill_consumer.stats["events"] < 3 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            stats = client.get("/api/v1/social/fill-stats").json()
+            board = client.request("GET", "/api/v1/social/leaderboard",
+                                   json={"period": "daily", "metric": "total_trades"}).json()
+        assert stats["events"] == 3 and stats["offset"] == 3
+        assert board["leaderboard"][0]["trader"]["total_trades"] == 3
+        assert sum(len(batch) for batch in batches) == 3
+        assert batches[0][0]["quantity"] == 0.05
+
+        social = load_service(tmp_path / "social", SOCIAL_FILL_LOG=log_path)
+        with TestClient(social.app):
+            time.sleep(0.3)
+        assert social.fill_consumer.offset == 3
+        assert social.fill_consumer.stats["events"] == 0
+
+    def test_failed_batch_is_redelivered(self, service):
+        """A batch is committed only after its handler succeeds."""
+        sys.path.append(PAPER_TRADING_DIR)
+        from fill_bus import MemoryFillBus
+
+        bus = MemoryFillBus()
+        for index in range(5):
+            bus.publish({"account_id": "t1", "n": index})
+        seen = []
+
+        async def handler(fills):
+            seen.append([fill["n"] for fill in fills])
+            if len(seen) == 1:
+                raise RuntimeError("downstream unavailable")
+
+        consumer = service.FillConsumer(bus, "test", handler, batch_size=3)
+
+        async def run():
+            with pytest.raises(RuntimeError):
+                await consumer.poll()
+            await consumer.poll()
+            await consumer.poll()
+
+        asyncio.run(run())
+        assert seen == [[0, 1, 2], [0, 1, 2], [3, 4]]
+        assert bus.committed("test") == 5
+
+    def test_poison_event_is_dead_lettered(self, service):
+        """After repeated batch failures the good events are handled and the bad one set aside."""
+        sys.path.append(PAPER_TRADING_DIR)
+        from fill_bus import MemoryFillBus
+
+        bus = MemoryFillBus()
+        for index in range(4):
+            bus.publish({"account_id": "t1", "n": index})
+        handled = []
+
+        async def handler(fills):
+            for fill in fills:
+                if fill["n"] == 2:
+                    raise ValueError("malformed fill")
+                handled.append(fill["n"])
+
+        consumer = service.FillConsumer(bus, "test", handler, batch_size=10, max_attempts=2)
+
+        async def run():
+            for _ in range(2):
+                with pytest.raises(ValueError):
+                    await consumer.poll()
+            return await consumer.poll()
+
+        assert asyncio.run(run()) == 4
+        assert bus.committed("test") == 4
+        assert consumer.status()["dead_letters"] == [3]
+        assert consumer.stats["dead_lettered"] == 1
+        assert handled[-3:] == [0, 1, 3]
+
+    def test_redelivered_fills_are_processed_once(self, service):
+        """Fills seen before, by account and ledger id, are skipped."""
+        processed = []
+
+        async def process_trade(trader_id, trade_data, accounts=None):
+            processed.append((trader_id, trade_data["id"]))
+            return 0
+
+        service.process_trade = process_trade
+        fills = [{"account_id": "t1", "id": 0}, {"account_id": "t1", "id": 1}, {"account_id": "t2", "id": 0}]
+        asyncio.run(service.handle_fill_batch(fills[:2]))
+        asyncio.run(service.handle_fill_batch(fills))
+        assert processed == [("t1", 0), ("t1", 1), ("t2", 0)]
+
+    def test_sqlite_writers_share_offsets_and_retry_failed_writes(self, tmp_path, monkeypatch):
+        """Two workers append to one log without offset clashes, and a failed write is retried."""
+        sys.path.append(PAPER_TRADING_DIR)
+        import sqlite3
+        from fill_bus import SQLiteFillBus
+
+        path = str(tmp_path / "fills.db")
+        first, second = SQLiteFillBus(path), SQLiteFillBus(path)
+        write = first._write
+        calls = []
+
+        def flaky_write(rows):
+            calls.append(len(rows))
+            if len(calls) == 1:
+                raise sqlite3.OperationalError("database is locked")
+            write(rows)
+
+        monkeypatch.setattr(first, "_write", flaky_write)
+
+        async def run():
+            first.publish({"worker": 1, "n": 0})
+            assert await first.flush() is False
+            second.publish({"worker": 2, "n": 0})
+            await second.flush()
+            first.publish({"worker": 1, "n": 1})
+            assert await first.flush() is True
+            events = first.read(0, 10)
+            await first.stop()
+            await second.stop()
+            return events
+
+        events = asyncio.run(run())
+        assert [offset for offset, _ in events] == [1, 2, 3]
+        assert [(fill["worker"], fill["n"]) for _, fill in events] == [(2, 0), (1, 0), (1, 1)]
+        assert calls == [1, 2]
+
+    def test_dropped_events_are_reported_as_missed(self, service):
+        """Events the memory bus evicts before they are consumed show up as a gap."""
+        sys.path.append(PAPER_TRADING_DIR)
+        from fill_bus import MemoryFillBus
+
+        bus = MemoryFillBus(max_events=3)
+        for index in range(5):
+            bus.publish({"account_id": "t1", "n": index})
+        handled = []
+
+        async def handler(fills):
+            handled.extend(fill["n"] for fill in fills)
+
+        consumer = service.FillConsumer(bus, "test", handler)
+        assert asyncio.run(consumer.poll()) == 3
+        assert handled == [2, 3, 4]
+        assert bus.dropped == 2
+        assert consumer.stats["missed"] == 2